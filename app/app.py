@@ -186,22 +186,16 @@ def display_cf_recommendations(model, selected_user_id):
     Based on the rated books of the selected user,
     recommendations are calculated using collaborative
     filtering methods and a layout of recommended books
-    is created and displayed.
+    is created and displayed. Users without ratings get
+    the most popular books.
     """
 
     if model is None or selected_user_id is None:
         return html.Div()
 
-    user_ratings = resources.USER_DATA[
-        resources.USER_DATA['user_id'] == selected_user_id
-    ].sort_values(by='rating', ascending=False)
-
-    book_ratings = {row['book_id']: row['rating']
-                    for _, row in user_ratings.iterrows()}
-
     recommended_books = resources.CF_MODELS[model].recommend(
         selected_user_id, 20
-    ) if book_ratings and model else list()
+    )
 
     return components.create_books_layout(
         resources.BOOK_DATA,
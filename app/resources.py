@@ -2,6 +2,7 @@ import pandas as pd
 
 from os.path import dirname, join, realpath, splitext, basename
 from booksuggest.models.load_models import load_model
+from booksuggest.models.cf_serving_models import SERVING_MODEL_EXTENSION
 from glob import glob
 
 _MINI_LOGO = 'http://sfinks.fizyka.pw.edu.pl/img/logo_mini.png'
@@ -21,8 +22,11 @@ def get_model(filename: str) -> str:
 
 
 def read_models_from_dir(models_dir: str):
-    pkl_files = glob(join(models_dir, '*.pkl'))
-    return {splitext(basename(path))[0]: get_model(path) for path in pkl_files}
+    # serving models take precedence over pickled models with the same name
+    model_paths = (glob(join(models_dir, '*.pkl')) +
+                   glob(join(models_dir, f'*{SERVING_MODEL_EXTENSION}')))
+    model_paths = {splitext(basename(path))[0]: path for path in model_paths}
+    return {name: get_model(path) for name, path in model_paths.items()}
 
 
 CB_MODELS = read_models_from_dir(join(CURRENT_DIR, 'assets/models/cb'))
@@ -5,30 +5,29 @@ from typing import List, Tuple
 import click
 import pandas as pd
 
-from lxml import etree
+from .extract_book_xml import MISSING_VALUE
 
-from .xml_parser import extract_all_book_xml_roots
 
-
-def extract_book_extra_info(xmls_dir: str) -> List[Tuple[int, str, str]]:
-    """Extracts extra information about books from .xml files in given directory.
+def read_book_extra_info(filepath: str) -> List[Tuple[int, str, str]]:
+    """Reads extra information about books created by
+    the ``extract_book_xml`` script, empty values are kept
+    as empty strings.
 
     Args:
-        xmls_dir (str): Directory with .xml files.
+        filepath (str): Books extra info filepath.
 
     Returns:
         List[Tuple[int, str, str]]:
-            List of ``(work_id, isbn13, description)`` book data.
+            List of ``(work_id, isbn13, description)`` book data,
+            missing values are None.
     """
-    return [_extract_book_info(book)
-            for book in extract_all_book_xml_roots(xmls_dir)]
-
-
-def _extract_book_info(book: etree.Element) -> Tuple[int, str, str]:
-    book_work_id = book.find("work").findtext("id")
-    book_info = (int(book_work_id), book.findtext(
-        "isbn13"), book.findtext("description"))
-    return book_info
+    book_extra_info_df = pd.read_csv(
+        filepath, dtype={'isbn13': str, 'description': str},
+        keep_default_na=False,
+        na_values={'isbn13': [MISSING_VALUE], 'description': [MISSING_VALUE]})
+    book_extra_info_df = book_extra_info_df.astype(object).where(
+        book_extra_info_df.notna(), None)
+    return list(book_extra_info_df.itertuples(index=False, name=None))
 
 
 def process_book_extra_info(
@@ -80,19 +79,21 @@ def merge_book_data(
 
 @click.command()
 @click.argument('book_filepath', type=click.Path(exists=True))
-@click.argument('books_xml_dir', type=click.Path(exists=True))
+@click.argument('book_extra_info_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
-def main(book_filepath: str, books_xml_dir: str, output_filepath: str):
+def main(book_filepath: str, book_extra_info_filepath: str,
+         output_filepath: str):
     """
-    Extracts additional data about books from .xml files
-    and joins it with previous data.
+    Joins additional data about books extracted from .xml files
+    with previous data.
 
     Args:
         book_filepath (str): Book data frame.
-        books_xml_dir (str): Directory with books .xml files.
+        book_extra_info_filepath (str): Books extra info extracted
+            by the ``extract_book_xml`` script.
         output_filepath (str): Output filepath.
     """
-    book_extra_info_rows = extract_book_extra_info(books_xml_dir)
+    book_extra_info_rows = read_book_extra_info(book_extra_info_filepath)
     book_extra_info_df = process_book_extra_info(book_extra_info_rows)
 
     book_df = pd.read_csv(book_filepath)
@@ -0,0 +1,80 @@
+"""Persistent cache of cleaned descriptions.
+
+Cleaned descriptions are stored in an SQLite database under a hash of
+the raw description and of the cleaning options, together with the
+detected language. The database uses write-ahead logging, so many
+processes can read it and write to it at the same time.
+"""
+import hashlib
+import json
+import sqlite3
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+CachedDescription = Tuple[str, Optional[str]]
+
+
+class DescriptionCache():
+    """Key-value store mapping description keys to
+    ``(language, cleaned_description)`` pairs, the cleaned description
+    of a description not written in English is None.
+
+    Args:
+        path: Path to the SQLite database, created if it does not exist.
+        timeout: Defaults to 60. How many seconds to wait for other
+            processes writing to the database.
+    """
+
+    _BATCH_SIZE = 500
+
+    def __init__(self, path: str, timeout: float = 60):
+        self._connection = sqlite3.connect(path, timeout=timeout)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS descriptions ('
+                'key TEXT PRIMARY KEY, language TEXT, cleaned TEXT)')
+
+    def __enter__(self) -> 'DescriptionCache':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Closes the database connection.
+        """
+        self._connection.close()
+
+    @staticmethod
+    def key(description: str, options: Dict[str, Any]) -> str:
+        """Creates a key of the description cleaned with the given options.
+        """
+        options_json = json.dumps(options, sort_keys=True)
+        content = f'{options_json}\0{description}'.encode('utf-8')
+        return hashlib.sha256(content).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, CachedDescription]:
+        """Reads cached descriptions stored under the given keys,
+        missing keys are omitted.
+        """
+        keys = list(keys)
+        cached = dict()
+        for start in range(0, len(keys), self._BATCH_SIZE):
+            batch = keys[start:start + self._BATCH_SIZE]
+            rows = self._connection.execute(
+                'SELECT key, language, cleaned FROM descriptions '
+                f'WHERE key IN ({",".join("?" * len(batch))})', batch)
+            cached.update((key, (language, cleaned))
+                          for key, language, cleaned in rows)
+
+        return cached
+
+    def put_many(self, entries: List[Tuple[str, str, Optional[str]]]):
+        """Stores ``(key, language, cleaned_description)`` entries
+        in a single transaction.
+        """
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO descriptions (key, language, cleaned) '
+                'VALUES (?, ?, ?)', entries)
@@ -0,0 +1,101 @@
+import logging
+
+from typing import List, Tuple
+
+import click
+import pandas as pd
+
+from .xml_parser import extract_all_book_fields
+
+BOOK_EXTRA_INFO_COLUMNS = ['work_id', 'isbn13', 'description']
+SIMILAR_BOOKS_COLUMNS = ['work_id', 'similar_book_work_id']
+
+# marks missing elements, so that they differ from empty ones in .csv files
+MISSING_VALUE = r'\N'
+
+
+def extract_book_xml_data(
+        xmls_path: str,
+        jobs: int = None,
+        cache_path: str = None
+) -> Tuple[List[Tuple[int, str, str]], List[Tuple[int, int]]]:
+    """Extracts extra information about books and similar books
+    from .xml files in given directory or zip archive, parsing each
+    file once.
+
+    Args:
+        xmls_path (str): Directory or zip archive with .xml files.
+        jobs (int): Number of parsing processes.
+        cache_path (str): Path to the cache of extracted fields.
+
+    Returns:
+        Tuple[List[Tuple[int, str, str]], List[Tuple[int, int]]]:
+            Lists of ``(work_id, isbn13, description)`` book data and
+            ``(work_id, similar_book_work_id)`` pairs.
+    """
+    book_extra_info_rows = list()
+    similar_books_rows = list()
+    for work_id, isbn13, description, similar_work_ids in \
+            extract_all_book_fields(xmls_path, jobs, cache_path):
+        book_extra_info_rows.append((work_id, isbn13, description))
+        similar_books_rows.extend((work_id, similar_work_id)
+                                  for similar_work_id in similar_work_ids)
+
+    return book_extra_info_rows, similar_books_rows
+
+
+def save_book_extra_info(
+        book_extra_info_rows: List[Tuple[int, str, str]],
+        filepath: str
+):
+    """Saves extra information about books in a .csv file, missing
+    values are written as `MISSING_VALUE` and empty ones as empty fields.
+
+    Args:
+        book_extra_info_rows (List[Tuple[int, str, str]]):
+            List of ``(work_id, isbn13, description)`` book data.
+        filepath (str): Output filepath.
+    """
+    pd.DataFrame.from_records(
+        book_extra_info_rows, columns=BOOK_EXTRA_INFO_COLUMNS
+    ).to_csv(filepath, index=False, na_rep=MISSING_VALUE)
+
+
+@click.command()
+@click.argument('books_xml_path', type=click.Path(exists=True))
+@click.argument('book_extra_info_filepath', type=click.Path())
+@click.argument('similar_books_filepath', type=click.Path())
+@click.option('--jobs', type=int, default=None,
+              help='Number of processes parsing .xml files.')
+@click.option('--cache', 'cache_path', type=click.Path(), default=None,
+              help='Cache of fields extracted from .xml files, only new '
+              'or changed files are parsed.')
+def main(books_xml_path: str, book_extra_info_filepath: str,
+         similar_books_filepath: str, jobs: int, cache_path: str):
+    """Extracts extra information about books and similar books
+    from .xml files in a single pass.
+
+    Args:
+        books_xml_path (str): Directory or zip archive with books
+            .xml files.
+        book_extra_info_filepath (str): Output filepath of books extra info.
+        similar_books_filepath (str): Output filepath of similar books
+            work ids pairs.
+        jobs (int): Number of processes parsing .xml files.
+        cache_path (str): Path to the .npz cache of extracted fields.
+    """
+    book_extra_info_rows, similar_books_rows = extract_book_xml_data(
+        books_xml_path, jobs, cache_path)
+
+    save_book_extra_info(book_extra_info_rows, book_extra_info_filepath)
+    logging.info('Created: %s', book_extra_info_filepath)
+
+    pd.DataFrame.from_records(
+        similar_books_rows, columns=SIMILAR_BOOKS_COLUMNS
+    ).to_csv(similar_books_filepath, index=False)
+    logging.info('Created: %s', similar_books_filepath)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()  # pylint: disable=no-value-for-parameter
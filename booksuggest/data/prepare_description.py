@@ -5,16 +5,118 @@ The main script is responsible for preparing descriptions that will
 be later used for feature extraction.
 """
 
+import concurrent.futures as cf
 import logging
+from typing import Any, Dict, List, Optional, Tuple
+
 import click
-import nltk
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 from nltk.stem.snowball import SnowballStemmer
+from nltk.tag.perceptron import PerceptronTagger
 import numpy as np
 import pandas as pd
 
-from langdetect import detect
+from langdetect import DetectorFactory, detect
+
+from .description_cache import DescriptionCache
+from .token_normalizer import TokenNormalizer, load_vocabulary
+
+# version of the cleaning procedure, changing it invalidates
+# cached cleaned descriptions and normalized words
+CLEANING_VERSION = 1
+
+NORMALIZATION_KEY = f'snowball-wordnet-{CLEANING_VERSION}'
+
+_worker_cleaner = None
+_worker_cache = None
+
+
+class DescriptionCleaner():
+    """Prepares descriptions for the tf-idf method.
+
+    Stopwords, the stemmer, the lemmatizer and the part of speech tagger
+    are loaded once and reused for all cleaned descriptions. Stemmed and
+    lemmatized forms of words are memoized by a `TokenNormalizer`.
+
+    Args:
+        remove_proper_nouns: Whether to remove proper nouns from text.
+        vocabulary: Defaults to None. Previously normalized words.
+        vocabulary_size: Defaults to 100000. Maximal number of memoized
+            words.
+    """
+
+    def __init__(
+            self,
+            remove_proper_nouns: bool,
+            vocabulary: Dict[str, str] = None,
+            vocabulary_size: int = 100000
+    ):
+        self.remove_proper_nouns = remove_proper_nouns
+        self._stopwords = set(stopwords.words('english'))
+        self._stemmer = SnowballStemmer('english')
+        self._lemmatizer = WordNetLemmatizer()
+        self._tagger = PerceptronTagger() if remove_proper_nouns else None
+        self.normalizer = TokenNormalizer(self._stem_and_lemmatize,
+                                          vocabulary_size, vocabulary)
+
+    @property
+    def options(self) -> Dict[str, Any]:
+        """Options affecting cleaned descriptions.
+        """
+        return cleaning_options(self.remove_proper_nouns)
+
+    def clean(self, description: str) -> str:
+        """Cleans a single description.
+
+        Args:
+            description: Book description.
+
+        Returns:
+            Description with removed punctuation, stopwords and stemmed,
+            lemmatized vocabulary or NaN if it is not written in English.
+        """
+        language, cleaned = self.detect_and_clean(description)
+        return cleaned if language == 'en' else np.nan
+
+    def detect_and_clean(
+            self,
+            description: str
+    ) -> Tuple[str, Optional[str]]:
+        """Detects the language of a single description and cleans it
+        if it is written in English.
+
+        Returns:
+            Detected language and the cleaned description or None.
+        """
+        logging.debug('Cleaning description...')
+        language = detect(description)
+        if language != 'en':
+            return language, None
+
+        word_list = description.split()
+
+        if self.remove_proper_nouns:
+            logging.debug('Removing proper nouns...')
+            tagged_words = self._tagger.tag(word_list)
+            word_list = [word for word, tag in tagged_words
+                         if tag not in {'NNP', 'NNPS'}]
+
+        word_list = [word.lower() for word in word_list
+                     if word.isalpha() and word not in self._stopwords]
+        word_list = [self.normalizer.normalize(word) for word in word_list]
+
+        return language, " ".join(word_list)
+
+    def _stem_and_lemmatize(self, word: str) -> str:
+        return self._lemmatizer.lemmatize(self._stemmer.stem(word))
+
+
+def cleaning_options(remove_proper_nouns: bool) -> Dict[str, Any]:
+    """Options identifying descriptions cleaned by `DescriptionCleaner`.
+    """
+    return {'remove_proper_nouns': remove_proper_nouns,
+            'version': CLEANING_VERSION}
 
 
 def clean_single_description(
@@ -31,33 +133,130 @@ def clean_single_description(
         str: Description with removed punctuation, stopwords and stemmed,
         lemmatized vocabulary.
     """
-    logging.debug('Cleaning description...')
-    if detect(description) != 'en':
-        return np.nan
+    return DescriptionCleaner(remove_proper_nouns).clean(description)
+
 
-    word_list = description.split()
+def clean_description_list(
+        descriptions: List[str],
+        remove_proper_nouns: bool,
+        jobs: int = None,
+        chunk_size: int = 100,
+        cache_path: str = None,
+        vocabulary_path: str = None
+) -> List[str]:
+    """Cleans descriptions in chunks using a process pool, each
+    worker creates its own `DescriptionCleaner`.
 
-    if remove_proper_nouns:
-        logging.debug('Removing proper nouns...')
-        tagged_words = nltk.tag.pos_tag(word_list)
-        word_list = [word for word, tag in tagged_words
-                     if tag not in {'NNP', 'NNPS'}]
+    With a cache only descriptions which were not cleaned before with
+    the same options are processed, workers store their results in the
+    cache as soon as a chunk is cleaned.
 
-    word_list = [word.lower() for word in word_list
-                 if word.isalpha() and word not in stopwords.words('english')]
+    With a vocabulary file all workers start with the saved normalized
+    words, words normalized by the workers are merged and saved back.
 
-    stemmer = SnowballStemmer('english')
-    word_list = [stemmer.stem(word) for word in word_list]
+    Args:
+        descriptions (List[str]): Book descriptions.
+        remove_proper_nouns (bool): Whether to remove proper nouns from text.
+        jobs (int): Number of cleaning processes, defaults to the number
+            of processors.
+        chunk_size (int): Number of descriptions sent to a worker at once.
+        cache_path (str): Path to the SQLite cache of cleaned descriptions,
+            defaults to no caching.
+        vocabulary_path (str): Path to the json file with normalized
+            words, defaults to no persistence.
+
+    Returns:
+        List[str]: Cleaned descriptions in the order of the input ones,
+        NaN for descriptions not written in English.
+    """
+    options = cleaning_options(remove_proper_nouns)
+    keys = [DescriptionCache.key(description, options)
+            for description in descriptions]
+    cached = dict()
+    if cache_path is not None:
+        with DescriptionCache(cache_path) as cache:
+            cached = cache.get_many(set(keys))
 
-    lemmatizer = WordNetLemmatizer()
-    word_list = [lemmatizer.lemmatize(word) for word in word_list]
+    missing = dict()
+    for key, description in zip(keys, descriptions):
+        if key not in cached:
+            missing.setdefault(key, description)
+    logging.info('Cleaning %d new descriptions, %d found in cache...',
+                 len(missing), len(descriptions) - len(missing))
 
-    return " ".join(word_list)
+    missing_descriptions = list(missing.values())
+    chunks = [missing_descriptions[start:start + chunk_size]
+              for start in range(0, len(missing_descriptions), chunk_size)]
+    if chunks:
+        vocabulary = dict()
+        if vocabulary_path is not None:
+            vocabulary = load_vocabulary(vocabulary_path, NORMALIZATION_KEY)
+
+        cleaned = list()
+        # only merges words normalized by the workers
+        normalized = TokenNormalizer(None, vocabulary=vocabulary)
+        with cf.ProcessPoolExecutor(
+                max_workers=jobs, initializer=_init_worker,
+                initargs=(remove_proper_nouns, cache_path, vocabulary)
+        ) as executor:
+            for results, new_words, hits, misses in executor.map(
+                    _clean_chunk, chunks):
+                cleaned.extend(results)
+                normalized.update(new_words)
+                normalized.hits += hits
+                normalized.misses += misses
+
+        logging.info('Normalized %d words, %.1f%% found in the vocabulary...',
+                     normalized.hits + normalized.misses,
+                     100 * normalized.hit_rate)
+        if vocabulary_path is not None:
+            normalized.save(vocabulary_path, NORMALIZATION_KEY)
+        cached.update(zip(missing.keys(), cleaned))
+
+    return [cached[key][1] if cached[key][0] == 'en' else np.nan
+            for key in keys]
+
+
+def _init_worker(
+        remove_proper_nouns: bool,
+        cache_path: str,
+        vocabulary: Dict[str, str]
+):
+    global _worker_cleaner, _worker_cache  # pylint: disable=global-statement
+    # language detection is randomized, a fixed seed makes it deterministic
+    DetectorFactory.seed = 0
+    _worker_cleaner = DescriptionCleaner(remove_proper_nouns, vocabulary)
+    if cache_path is not None:
+        _worker_cache = DescriptionCache(cache_path)
+
+
+def _clean_chunk(
+        descriptions: List[str]
+) -> Tuple[List[Tuple[str, Optional[str]]], Dict[str, str], int, int]:
+    """Cleans descriptions, additionally returns newly normalized words
+    and numbers of vocabulary hits and misses.
+    """
+    normalizer = _worker_cleaner.normalizer
+    hits, misses = normalizer.hits, normalizer.misses
+    results = [_worker_cleaner.detect_and_clean(description)
+               for description in descriptions]
+    if _worker_cache is not None:
+        _worker_cache.put_many([
+            (DescriptionCache.key(description, _worker_cleaner.options),
+             language, cleaned)
+            for description, (language, cleaned) in zip(descriptions, results)
+        ])
+
+    return (results, normalizer.pop_new_words(),
+            normalizer.hits - hits, normalizer.misses - misses)
 
 
 def clean_descriptions(
         input_filepath: str,
-        remove_proper_nouns: bool
+        remove_proper_nouns: bool,
+        jobs: int = None,
+        cache_path: str = None,
+        vocabulary_path: str = None
 ) -> pd.DataFrame:
     """Cleans all descriptions in the data from the input
     file.
@@ -67,6 +266,9 @@ def clean_descriptions(
             Filepath to the data containing a ``description`` column that
             will be cleaned.
         remove_proper_nouns (bool): Whether to remove proper nouns from text.
+        jobs (int): Number of cleaning processes.
+        cache_path (str): Path to the cache of cleaned descriptions.
+        vocabulary_path (str): Path to the file with normalized words.
 
     Returns:
         pd.DataFrame:
@@ -75,9 +277,11 @@ def clean_descriptions(
     """
     data = pd.read_csv(input_filepath, index_col='book_id')
     descriptions = data['description'].dropna()
-    data['description'] = descriptions.apply(
-        lambda x: clean_single_description(x, remove_proper_nouns)
-    )
+    data['description'] = pd.Series(
+        clean_description_list(descriptions.tolist(), remove_proper_nouns,
+                               jobs, cache_path=cache_path,
+                               vocabulary_path=vocabulary_path),
+        index=descriptions.index, dtype=object)
 
     return data.dropna()
 
@@ -86,16 +290,30 @@ def clean_descriptions(
 @click.argument('input_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
 @click.option('--remove_nouns', is_flag=True)
-def main(input_filepath: str, output_filepath: str, remove_nouns: bool):
+@click.option('--jobs', type=int, default=None,
+              help='Number of processes cleaning descriptions.')
+@click.option('--cache', 'cache_path', type=click.Path(), default=None,
+              help='SQLite cache of cleaned descriptions, only new or '
+              'changed descriptions are cleaned.')
+@click.option('--vocabulary', 'vocabulary_path', type=click.Path(),
+              default=None, help='File with stemmed and lemmatized words '
+              'reused between runs.')
+def main(input_filepath: str, output_filepath: str, remove_nouns: bool,
+         jobs: int, cache_path: str, vocabulary_path: str):
     """Cleans books descriptions.
 
     Args:
         input_filepath (str): Input file to clean descriptions in.
         output_filepath (str): Filepath where the results should be saved.
         remove_nouns (bool): Whether to remove proper nouns from text.
+        jobs (int): Number of processes cleaning descriptions.
+        cache_path (str): Path to the SQLite cache of cleaned descriptions.
+        vocabulary_path (str): Path to the json file with normalized words.
     """
     logging.info('Cleaning descriptions...')
-    cleaned_descriptions = clean_descriptions(input_filepath, remove_nouns)
+    cleaned_descriptions = clean_descriptions(input_filepath, remove_nouns,
+                                              jobs, cache_path,
+                                              vocabulary_path)
 
     logging.info('Saving results to %s...', output_filepath)
     cleaned_descriptions.to_csv(output_filepath)
@@ -0,0 +1,149 @@
+"""Memoized normalization of words.
+
+Natural language text is repetitive at the word level, so normalized
+forms of words (e.g. stemmed and lemmatized) are kept in a bounded
+least recently used cache instead of being recomputed for every token.
+"""
+import json
+import os
+import tempfile
+
+from collections import OrderedDict
+from typing import Callable, Dict
+
+
+class TokenNormalizer():
+    """Normalizes words using the given function, results are memoized.
+
+    Args:
+        normalize_word: Function computing the normalized form of a word.
+        max_size: Defaults to 100000. Maximal number of cached words,
+            least recently used words are evicted first.
+        vocabulary: Defaults to None. Initial mapping from words to their
+            normalized forms, e.g. a previously saved one.
+    """
+
+    def __init__(
+            self,
+            normalize_word: Callable[[str], str],
+            max_size: int = 100000,
+            vocabulary: Dict[str, str] = None
+    ):
+        self._normalize_word = normalize_word
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._new_words = dict()
+        self.hits = 0
+        self.misses = 0
+        self.update(vocabulary or dict())
+
+    def normalize(self, word: str) -> str:
+        """Returns the normalized form of the word.
+        """
+        try:
+            normalized = self._cache[word]
+        except KeyError:
+            self.misses += 1
+            normalized = self._normalize_word(word)
+            self._new_words[word] = normalized
+            self._store(word, normalized)
+            return normalized
+
+        self.hits += 1
+        self._cache.move_to_end(word)
+        return normalized
+
+    def update(self, vocabulary: Dict[str, str]):
+        """Adds normalized forms of words computed elsewhere,
+        e.g. by another process.
+        """
+        for word, normalized in vocabulary.items():
+            self._store(word, normalized)
+
+    def pop_new_words(self) -> Dict[str, str]:
+        """Returns words normalized since the previous call.
+        """
+        new_words, self._new_words = self._new_words, dict()
+        return new_words
+
+    @property
+    def vocabulary(self) -> Dict[str, str]:
+        """Cached words and their normalized forms, from the least
+        to the most recently used.
+        """
+        return dict(self._cache)
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of normalized words found in the cache.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def save(self, path: str, key: str = None):
+        """Saves cached words in a json file, merged with words
+        already saved there, see `save_vocabulary`.
+
+        Args:
+            path: Output filepath.
+            key: Defaults to None. Identifier of the normalization
+                function, checked when loading the vocabulary.
+        """
+        save_vocabulary(path, self.vocabulary, key, self.max_size)
+
+    def _store(self, word: str, normalized: str):
+        self._cache[word] = normalized
+        self._cache.move_to_end(word)
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+
+def save_vocabulary(
+        path: str,
+        vocabulary: Dict[str, str],
+        key: str = None,
+        max_size: int = None
+):
+    """Saves words and their normalized forms in a json file.
+
+    Words saved in the file with the same key, e.g. by another process,
+    are read just before the file is replaced and merged with the given
+    ones, so concurrent runs do not discard each other's words. Each save
+    writes its own temporary file, which then atomically replaces the file.
+
+    Args:
+        path: Output filepath.
+        vocabulary: Words and their normalized forms.
+        key: Defaults to None. Identifier of the normalization function,
+            checked when loading the vocabulary.
+        max_size: Defaults to None. Maximal number of saved words, words
+            already in the file are dropped first.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temporary_path = tempfile.mkstemp(
+        dir=directory, suffix='.tmp')
+    try:
+        merged = load_vocabulary(path, key)
+        merged.update(vocabulary)
+        if max_size is not None and len(merged) > max_size:
+            merged = dict(list(merged.items())[-max_size:])
+        with os.fdopen(file_descriptor, 'w') as save_file:
+            json.dump({'key': key, 'vocabulary': merged}, save_file)
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def load_vocabulary(path: str, key: str = None) -> Dict[str, str]:
+    """Loads words saved with `save_vocabulary`, returns an empty
+    vocabulary if the file does not exist or was saved with a different key.
+    """
+    if not os.path.isfile(path):
+        return dict()
+
+    with open(path) as read_file:
+        data = json.load(read_file)
+
+    return data['vocabulary'] if data['key'] == key else dict()
@@ -0,0 +1,132 @@
+"""Columnar cache of fields extracted from books .xml files.
+
+The cache is a single uncompressed .npz file. Strings are stored as
+utf-8 encoded bytes concatenated into one array together with offsets
+and masks of missing values, lists of similar books work ids are stored
+in the same way. Each cached file is described by a key built from its
+size and modification time (size and checksum for archive members),
+so only new or changed files need parsing.
+"""
+import os
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+CACHE_VERSION = 1
+
+BookFields = Tuple[int, str, str, List[int]]
+
+
+def read_book_fields_cache(
+        cache_path: str,
+        manifest: Dict[str, str]
+) -> Dict[str, List[BookFields]]:
+    """Reads cached fields of books from files whose keys did not change.
+
+    Args:
+        cache_path: Path to the cache file, it may not exist.
+        manifest: Keys of the current files.
+
+    Returns:
+        Fields of books of each file which is up to date in the cache.
+    """
+    if not os.path.isfile(cache_path):
+        return dict()
+
+    with np.load(cache_path) as cache:
+        if int(cache['version']) != CACHE_VERSION:
+            return dict()
+        arrays = {name: cache[name] for name in cache.files}
+
+    files = _decode_strings(arrays, 'files')
+    keys = _decode_strings(arrays, 'keys')
+    work_ids = arrays['work_ids'].tolist()
+    isbns = _decode_strings(arrays, 'isbn13')
+    descriptions = _decode_strings(arrays, 'description')
+    similar_offsets = arrays['similar_offsets']
+    similar_work_ids = arrays['similar_work_ids']
+    file_offsets = arrays['file_offsets']
+
+    files_book_fields = dict()
+    for i, (filename, key) in enumerate(zip(files, keys)):
+        if manifest.get(filename) != key:
+            continue
+
+        books = range(file_offsets[i], file_offsets[i + 1])
+        files_book_fields[filename] = [
+            (work_ids[book], isbns[book], descriptions[book],
+             similar_work_ids[
+                 similar_offsets[book]:similar_offsets[book + 1]].tolist())
+            for book in books
+        ]
+
+    return files_book_fields
+
+
+def save_book_fields_cache(
+        cache_path: str,
+        manifest: Dict[str, str],
+        files_book_fields: Dict[str, List[BookFields]]
+):
+    """Saves fields of books of all files from the manifest, the file
+    is replaced atomically.
+
+    Args:
+        cache_path: Path to the cache file.
+        manifest: Keys of the files.
+        files_book_fields: Fields of books of each file.
+    """
+    files = sorted(manifest)
+    books = [book_fields for filename in files
+             for book_fields in files_book_fields[filename]]
+    work_ids, isbns, descriptions, similar_work_ids = (
+        zip(*books) if books else ([], [], [], []))
+
+    arrays = {
+        'version': np.array(CACHE_VERSION),
+        'file_offsets': _offsets(
+            len(files_book_fields[filename]) for filename in files),
+        'work_ids': np.array(work_ids, dtype=np.int64),
+        'similar_offsets': _offsets(len(ids) for ids in similar_work_ids),
+        'similar_work_ids': np.array(
+            [work_id for ids in similar_work_ids for work_id in ids],
+            dtype=np.int64)
+    }
+    arrays.update(_encode_strings('files', files))
+    arrays.update(_encode_strings('keys', [manifest[name] for name in files]))
+    arrays.update(_encode_strings('isbn13', isbns))
+    arrays.update(_encode_strings('description', descriptions))
+
+    temporary_path = cache_path + '.tmp'
+    with open(temporary_path, 'wb') as cache_file:
+        np.savez(cache_file, **arrays)
+    os.replace(temporary_path, cache_path)
+
+
+def _offsets(lengths) -> np.ndarray:
+    return np.concatenate(([0], np.cumsum(list(lengths), dtype=np.int64)))
+
+
+def _encode_strings(
+        name: str,
+        values: List[Optional[str]]
+) -> Dict[str, np.ndarray]:
+    encoded = [(value or '').encode('utf-8') for value in values]
+    return {
+        f'{name}_data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        f'{name}_offsets': _offsets(len(value) for value in encoded),
+        f'{name}_missing': np.array([value is None for value in values],
+                                    dtype=bool)
+    }
+
+
+def _decode_strings(
+        arrays: Dict[str, np.ndarray],
+        name: str
+) -> List[Optional[str]]:
+    data = arrays[f'{name}_data'].tobytes()
+    offsets = arrays[f'{name}_offsets'].tolist()
+    missing = arrays[f'{name}_missing'].tolist()
+    return [None if is_missing else data[start:end].decode('utf-8')
+            for start, end, is_missing in zip(offsets, offsets[1:], missing)]
@@ -1,35 +1,209 @@
 import logging
 import os
+import re
+import zipfile
 
-from typing import Iterable
+from typing import BinaryIO, Dict, Iterable, Iterator, List
 
 import concurrent.futures as cf
 from glob import glob
 from lxml import etree
 
+from .xml_cache import (
+    BookFields,
+    read_book_fields_cache,
+    save_book_fields_cache
+)
 
-def extract_all_book_xml_roots(xmls_dir: str) -> Iterable[etree.Element]:
-    """Extracts ``book`` element from .xml files located in given directory.
+# children of ``book`` elements which are not used, they are cleared
+# as soon as they are parsed
+_DISCARDED_TAGS = ('authors', 'reviews_widget', 'popular_shelves',
+                   'book_links', 'buy_links', 'series_works')
+
+_worker_archive = None
+
+
+def extract_all_book_fields(
+        xmls_path: str,
+        jobs: int = None,
+        cache_path: str = None
+) -> Iterable[BookFields]:
+    """Extracts fields of ``book`` elements from .xml files located
+    in given directory or zip archive.
+
+    Files are parsed in a process pool, workers return only the extracted
+    fields instead of whole xml trees. Members of an archive are read
+    without extracting it, each worker opens its own archive handle.
+    A file may contain many books, see `iter_book_fields`.
+
+    If a cache is given, only files which are not in the cache or whose
+    size or modification time changed are parsed. The cache is then
+    updated to contain exactly the current files.
+
+    Args:
+        xmls_path (str): Directory or zip archive with .xml files.
+        jobs (int): Number of parsing processes, defaults to the number
+            of processors.
+        cache_path (str): Path to the .npz cache of extracted fields,
+            defaults to no caching.
+
+    Yields:
+        Iterable[BookFields]: Iterable of
+            ``(work_id, isbn13, description, similar_work_ids)`` in order
+            of sorted file names and of books within files.
+    """
+    logging.info("Processing xml files in %s...", xmls_path)
+
+    archive_path = xmls_path if zipfile.is_zipfile(xmls_path) else None
+    manifest = _xml_files_manifest(xmls_path, archive_path)
+    xml_files = sorted(manifest)
+    if cache_path is None:
+        for file_book_fields in _parse_files(xml_files, archive_path, jobs):
+            yield from file_book_fields
+        return
+
+    files_book_fields = read_book_fields_cache(cache_path, manifest)
+    changed_files = [filename for filename in xml_files
+                     if filename not in files_book_fields]
+    logging.info("Parsing %d new or changed xml files...",
+                 len(changed_files))
+    files_book_fields.update(zip(
+        changed_files, _parse_files(changed_files, archive_path, jobs)))
+    if changed_files or not os.path.isfile(cache_path):
+        save_book_fields_cache(cache_path, manifest, files_book_fields)
+
+    for filename in xml_files:
+        yield from files_book_fields[filename]
+
+
+def _xml_files_manifest(xmls_path: str, archive_path: str) -> Dict[str, str]:
+    """Maps names of .xml files to keys changing with their contents.
+    """
+    if archive_path is not None:
+        with zipfile.ZipFile(archive_path) as archive:
+            return {info.filename: f'{info.file_size}:{info.CRC}'
+                    for info in archive.infolist()
+                    if info.filename.endswith('.xml')}
+
+    manifest = dict()
+    for filename in glob(os.path.join(xmls_path, '*.xml')):
+        stat = os.stat(filename)
+        manifest[filename] = f'{stat.st_size}:{stat.st_mtime_ns}'
+    return manifest
+
+
+def _parse_files(
+        xml_files: List[str],
+        archive_path: str,
+        jobs: int
+) -> Iterator[List[BookFields]]:
+    if not xml_files:
+        return
+
+    with cf.ProcessPoolExecutor(max_workers=jobs,
+                                initializer=_init_worker,
+                                initargs=(archive_path,)) as executor:
+        yield from executor.map(_read_book_fields, xml_files, chunksize=64)
+
+
+def iter_book_fields(
+        stream: BinaryIO,
+        chunk_size: int = 65536
+) -> Iterator[BookFields]:
+    """Incrementally extracts fields of ``book`` elements from a binary
+    stream of one or many concatenated xml documents.
+
+    Processed subtrees are cleared as parsing goes, so memory usage does
+    not depend on the size of the stream. Books nested in
+    ``similar_books`` elements contribute only their work ids.
 
     Args:
-        xmls_dir (str): Directory with .xml files.
+        stream (BinaryIO): Binary stream of xml documents.
+        chunk_size (int): Number of bytes read from the stream at once.
 
     Yields:
-        Iterable[etree.Element]: Iterable of `book` elements.
+        Iterator[BookFields]:
+            ``(work_id, isbn13, description, similar_work_ids)``
     """
-    logging.info("Processing xml files in %s...", xmls_dir)
+    depth = 0
+    similar_work_ids = list()
+    events = etree.iterparse(_DocumentsStream(stream, chunk_size),
+                             events=('start', 'end'),
+                             tag=('book',) + _DISCARDED_TAGS)
+    for event, element in events:
+        if element.tag != 'book':
+            if event == 'end':
+                element.clear()
+        elif event == 'start':
+            depth += 1
+        else:
+            depth -= 1
+            work_id = int(element.find("work").findtext("id"))
+            if depth > 0:
+                similar_work_ids.append(work_id)
+                element.clear()
+                continue
+
+            yield (work_id, element.findtext("isbn13"),
+                   element.findtext("description"), similar_work_ids)
+            similar_work_ids = list()
+            element.clear()
+            for ancestor in element.iterancestors():
+                while ancestor.getprevious() is not None:
+                    del ancestor.getparent()[0]
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
+class _DocumentsStream():
+    """Binary stream joining concatenated xml documents under a common
+    root element, xml declarations of the documents are removed.
+    """
+
+    _DECLARATION = re.compile(rb'<\?xml[^>]*\?>')
+
+    def __init__(self, stream: BinaryIO, chunk_size: int):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buffer = b'<documents>'
+        self._tail = b''
+        self._finished = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._finished and (size < 0 or len(self._buffer) < size):
+            chunk = self._stream.read(self._chunk_size)
+            if not chunk:
+                self._buffer += self._DECLARATION.sub(b'', self._tail)
+                self._buffer += b'</documents>'
+                self._finished = True
+                break
+
+            data = self._tail + chunk
+            # a declaration split between chunks is kept until it ends
+            split = data.rfind(b'<?')
+            if split == -1 or data.find(b'?>', split) != -1:
+                split = max(len(data) - 1, 0) if data.endswith(b'<') \
+                    else len(data)
+            self._tail = data[split:]
+            self._buffer += self._DECLARATION.sub(b'', data[:split])
+
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _init_worker(archive_path: str):
+    global _worker_archive  # pylint: disable=global-statement
+    if archive_path is not None:
+        _worker_archive = zipfile.ZipFile(archive_path)
 
-    with cf.ThreadPoolExecutor() as executor:
-        xml_files = glob(os.path.join(xmls_dir, '*.xml'))
-        for xml_file, book_root in zip(
-                xml_files, executor.map(_extract_book_element, xml_files)):
-            yield book_root
 
+def _read_book_fields(filename: str) -> List[BookFields]:
+    if _worker_archive is not None:
+        with _worker_archive.open(filename) as data_file:
+            return list(iter_book_fields(data_file))
 
-def _extract_book_element(filename: str) -> etree.Element:
-    with open(filename, 'r') as data_file:
-        data = data_file.read()
+    with open(filename, 'rb') as data_file:
+        return list(iter_book_fields(data_file))
 
-    data_bytes = bytes(bytearray(data, encoding='utf-8'))
-    root = etree.fromstring(data_bytes)
-    return root.find("book")
@@ -1,24 +1,37 @@
 """Functions used for calculating recommendation models scores.
 Main script is responsible for summarizing all created models.
 """
+import concurrent.futures as cf
+import hashlib
+import json
 import logging
+import math
+import os
 from os.path import basename, join
-from typing import Dict, List, Union
-from statistics import mean
+from typing import Dict, List, Tuple, Union
 from glob import glob
 import click
+import numpy as np
 import pandas as pd
+from scipy import sparse
 
-from .metrics import precision, recall
+from .metrics import hits_by_rank
 
 from ..utils.csv_utils import save_csv
+from ..utils.ranking import ranks_within_groups
+
+Score = Dict[str, Union[str, float, int]]
+
+_worker_ground_truth = None
 
 
 def calculate_scores(
         dir_path: str,
         test_cases: Dict[int, List[int]],
-        rec_count: int
-) -> pd.DataFrame:
+        rec_count: int,
+        jobs: int = None,
+        cache_dir: str = None
+) -> List[Score]:
     """Evaluates the precision and accuracy_score for all models
     present in the input directory.
 
@@ -26,23 +39,64 @@ def calculate_scores(
         dir_path: Directory in which calculated similar books predictions
         are saved for each model.
         test_cases: Similar books ground truth.
+        rec_count: Number of recommendations taken into account.
+        jobs: Defaults to None. Number of worker processes,
+            the number of processors is used if None.
+        cache_dir: Defaults to None. Directory with cached scores.
 
     Returns:
         Data frame containing presicion and recall scores for all models.
     """
-    prediction_files = glob(join(dir_path, '*.csv'))
+    curves = calculate_score_curves(dir_path, test_cases, rec_count, jobs,
+                                    cache_dir)
+    return [_without_rec_count(curve[-1]) for curve in curves]
+
 
-    scores = [calculate_single_score(prediction_file, test_cases, rec_count)
-              for prediction_file in prediction_files]
+def calculate_score_curves(
+        dir_path: str,
+        test_cases: Dict[int, List[int]],
+        max_rec_count: int,
+        jobs: int = None,
+        cache_dir: str = None
+) -> List[List[Score]]:
+    """Evaluates scores of all models present in the input directory
+    for every number of recommendations up to `max_rec_count`.
 
-    return scores
+    Prediction files are evaluated in parallel. If the cache directory
+    is given, scores are cached by the hash of the prediction file content
+    and the ground truth, so only new or changed files are evaluated.
+
+    Args:
+        dir_path: Directory in which calculated similar books predictions
+            are saved for each model.
+        test_cases: Similar books ground truth.
+        max_rec_count: Maximal number of recommendations.
+        jobs: Defaults to None. Number of worker processes,
+            the number of processors is used if None.
+        cache_dir: Defaults to None. Directory with cached scores.
+
+    Returns:
+        Scores of each prediction file, one for every number
+        of recommendations from 1 to `max_rec_count`.
+    """
+    prediction_files = sorted(glob(join(dir_path, '*.csv')))
+    ground_truth = _ground_truth_arrays(test_cases)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    args = (prediction_files, [max_rec_count] * len(prediction_files),
+            [cache_dir] * len(prediction_files))
+    with cf.ProcessPoolExecutor(max_workers=jobs,
+                                initializer=_init_worker,
+                                initargs=(ground_truth,)) as executor:
+        return list(executor.map(_cached_score_curve, *args))
 
 
 def calculate_single_score(
         prediction_file: str,
         test_cases: Dict[int, List[int]],
         rec_count: int
-) -> Dict[str, Union[str, float, int]]:
+) -> Score:
     """Calculates precision, accuracy scores and the amount of correct hits
     for a single prediction file.
 
@@ -50,28 +104,138 @@ def calculate_single_score(
         prediction_file: Path to a file containing similar books predictions.
         test_cases: Similar books ground truth.
     """
-    predictions = read_similar_books(prediction_file)
-    precision_score = mean([
-        precision(similar_book_ids[:rec_count], test_cases[book_id])
-        for book_id, similar_book_ids in predictions.items()
-    ])
-
-    recall_score = mean([
-        recall(similar_book_ids[:rec_count], test_cases[book_id])
-        for book_id, similar_book_ids in predictions.items()
-    ])
-
-    correct_hits_score = sum([
-        len(set(similar_book_ids[:rec_count]) & set(test_cases[book_id]))
-        for book_id, similar_book_ids in predictions.items()
-    ])
+    curve = calculate_score_curve(prediction_file,
+                                  _ground_truth_arrays(test_cases),
+                                  rec_count)
+    return _without_rec_count(curve[-1])
 
-    return {
-        'model': basename(prediction_file),
-        'precision': round(precision_score, 3),
-        'recall': round(recall_score, 3),
-        'correct_hits': correct_hits_score
-    }
+
+def calculate_score_curve(
+        prediction_file: str,
+        ground_truth: Tuple[np.ndarray, np.ndarray],
+        max_rec_count: int
+) -> List[Score]:
+    """Calculates precision, recall and the amount of correct hits of a single
+    prediction file for every number of recommendations up to `max_rec_count`.
+
+    The file is read once and hits of all recommendations are found with
+    a single sparse product, the scores for all numbers of recommendations
+    are obtained with cumulative sums.
+
+    Args:
+        prediction_file: Path to a file containing similar books predictions.
+        ground_truth: Book ids and their similar books ids,
+            see `_ground_truth_arrays`.
+        max_rec_count: Maximal number of recommendations.
+    """
+    predictions = pd.read_csv(prediction_file)
+    order = np.argsort(predictions['book_id'].values, kind='mergesort')
+    book_ids = predictions['book_id'].values[order]
+    similar_book_ids = predictions['similar_book_id'].values[order]
+    ranks = ranks_within_groups(book_ids) + 1
+
+    books, rows = np.unique(book_ids, return_inverse=True)
+    truth_books, truth_similar_books = ground_truth
+    truth_rows = np.searchsorted(books, truth_books)
+    truth_rows[truth_rows == len(books)] = 0
+    evaluated = books[truth_rows] == truth_books
+    truth_rows = truth_rows[evaluated]
+    truth_similar_books = truth_similar_books[evaluated]
+
+    _, columns = np.unique(
+        np.concatenate((similar_book_ids, truth_similar_books)),
+        return_inverse=True)
+    shape = (len(books), columns.max(initial=-1) + 1)
+    # a repeated similar book must keep its own ranks, csr would add them up
+    recommended = sparse.coo_matrix(
+        (ranks, (rows, columns[:len(rows)])), shape=shape)
+    relevant = sparse.csr_matrix(
+        (np.ones(len(truth_rows)), (truth_rows, columns[len(rows):])),
+        shape=shape)
+
+    hits, _ = hits_by_rank(recommended, relevant, max_rec_count)
+    hits_count = np.cumsum(hits, axis=1)
+    retrieved = np.minimum(np.bincount(rows, minlength=len(books))[:, None],
+                           np.arange(1, max_rec_count + 1))
+    relevant_count = np.asarray(relevant.sum(axis=1))
+
+    precisions = _exact_column_means(np.divide(
+        hits_count, retrieved, out=np.zeros(hits_count.shape),
+        where=retrieved != 0))
+    recalls = _exact_column_means(np.divide(
+        hits_count, relevant_count, out=np.zeros(hits_count.shape),
+        where=relevant_count != 0))
+    correct_hits = hits_count.sum(axis=0)
+
+    model = basename(prediction_file)
+    return [{'model': model,
+             'rec_count': rec_count,
+             'precision': round(float(precisions[rec_count - 1]), 3),
+             'recall': round(float(recalls[rec_count - 1]), 3),
+             'correct_hits': int(correct_hits[rec_count - 1])}
+            for rec_count in range(1, max_rec_count + 1)]
+
+
+def _exact_column_means(matrix: np.ndarray) -> List[float]:
+    # exact sums keep the rounded scores independent of the order of books
+    return [math.fsum(column) / len(column) if len(column) else 0.0
+            for column in matrix.T]
+
+
+def _init_worker(ground_truth: Tuple[np.ndarray, np.ndarray]):
+    global _worker_ground_truth  # pylint: disable=global-statement
+    _worker_ground_truth = ground_truth
+
+
+def _cached_score_curve(
+        prediction_file: str,
+        max_rec_count: int,
+        cache_dir: str
+) -> List[Score]:
+    if not cache_dir:
+        return calculate_score_curve(prediction_file, _worker_ground_truth,
+                                     max_rec_count)
+
+    content_hash = hashlib.sha256()
+    with open(prediction_file, 'rb') as f:
+        content_hash.update(f.read())
+    for array in _worker_ground_truth:
+        content_hash.update(array.tobytes())
+    content_hash.update(str(max_rec_count).encode())
+    cache_filepath = join(cache_dir, content_hash.hexdigest() + '.json')
+
+    if os.path.exists(cache_filepath):
+        with open(cache_filepath) as f:
+            curve = json.load(f)
+        # the same content may be saved under a different name
+        return [dict(score, model=basename(prediction_file))
+                for score in curve]
+
+    curve = calculate_score_curve(prediction_file, _worker_ground_truth,
+                                  max_rec_count)
+    tmp_filepath = cache_filepath + f'.{os.getpid()}.tmp'
+    with open(tmp_filepath, 'w') as f:
+        json.dump(curve, f)
+    os.replace(tmp_filepath, cache_filepath)
+    return curve
+
+
+def _ground_truth_arrays(
+        test_cases: Dict[int, List[int]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Converts the similar books ground truth to arrays of book ids
+    and similar book ids sorted by book ids.
+    """
+    books = sorted(test_cases)
+    book_ids = np.repeat(books, [len(test_cases[book]) for book in books])
+    similar_book_ids = np.array([similar_book for book in books
+                                 for similar_book in test_cases[book]],
+                                dtype=np.int64)
+    return book_ids.astype(np.int64), similar_book_ids
+
+
+def _without_rec_count(score: Score) -> Score:
+    return {key: value for key, value in score.items() if key != 'rec_count'}
 
 
 def read_similar_books(similar_books_filepath: str) -> Dict[int, List[int]]:
@@ -90,9 +254,15 @@ def read_similar_books(similar_books_filepath: str) -> Dict[int, List[int]]:
             are lists of books that are similar to the book_id key.
     """
     similar_books = pd.read_csv(similar_books_filepath)
+    order = np.argsort(similar_books['book_id'].values, kind='mergesort')
+    book_ids = similar_books['book_id'].values[order]
+    similar_book_ids = similar_books['similar_book_id'].values[order]
+
+    books, starts = np.unique(book_ids, return_index=True)
     return {
-        book_id: list(table['similar_book_id'])
-        for book_id, table in similar_books.groupby('book_id')
+        book_id: similar.tolist()
+        for book_id, similar in zip(books.tolist(),
+                                    np.split(similar_book_ids, starts[1:]))
     }
 
 
@@ -100,11 +270,20 @@ def read_similar_books(similar_books_filepath: str) -> Dict[int, List[int]]:
 @click.argument('input_directory', type=click.Path(exists=True))
 @click.argument('similar_books_input', type=click.Path(exists=True))
 @click.option('--rec_count', default=1)
+@click.option('--jobs', type=int, default=None,
+              help='Number of worker processes.')
+@click.option('--cache-dir', type=click.Path(), default=None,
+              help='Directory with cached scores of prediction files.')
+@click.option('--curve-output', type=click.Path(), default=None,
+              help='File in which scores for every rec_count are stored.')
 @click.argument('output_filepath', type=click.Path())
 def main(
         input_directory: str,
         similar_books_input: str,
         rec_count: int,
+        jobs: int,
+        cache_dir: str,
+        curve_output: str,
         output_filepath: str
 ):
     """Main function used for summarizing prediction scores.
@@ -116,6 +295,13 @@ def main(
             Path to file containing similar books ground truth.
         rec_count:
             Top k recommendations to consider.
+        jobs:
+            Number of worker processes.
+        cache_dir:
+            Directory with cached scores of prediction files.
+        curve_output:
+            Path to file in which scores for every number of
+            recommendations up to rec_count should be stored.
         output_filepath:
             Path to file in which results should be stored.
     """
@@ -127,12 +313,21 @@ def main(
         'Evaluating scores for predictions from %s...',
         input_directory
     )
-    scores = calculate_scores(input_directory, test_cases, rec_count)
+    curves = calculate_score_curves(input_directory, test_cases, rec_count,
+                                    jobs, cache_dir)
+    scores = [_without_rec_count(curve[-1]) for curve in curves]
 
     logger.info('Saving results to %s...', output_filepath)
     save_csv(scores, output_filepath,
              ['model', 'precision', 'recall', 'correct_hits'])
 
+    if curve_output:
+        logger.info('Saving score curves to %s...', curve_output)
+        save_csv([score for curve in curves for score in curve],
+                 curve_output,
+                 ['model', 'rec_count', 'precision', 'recall',
+                  'correct_hits'])
+
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
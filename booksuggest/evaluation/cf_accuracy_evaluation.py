@@ -1,50 +1,197 @@
+import concurrent.futures as cf
 import logging
 from os import listdir
 from os.path import join
+from typing import List, Tuple
 
 import click
+import numpy as np
 import pandas as pd
-from surprise import Reader, Dataset, accuracy
 
 from ..utils.serialization import read_object
 from ..models.cf_recommend_models import ICfRecommendationModel
 
+Testset = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+_worker_testset = None
+
 
 def test_accuracy(
         model: ICfRecommendationModel,
         testset_filepath: str
-) -> float:
-    """Calculates RMSE value for the given model and testset.
+) -> Tuple[float, float, float]:
+    """Calculates RMSE, MAE and FCP values for the given model and testset.
 
     Args:
         model (ICfRecommendationModel): Model to test.
         testset_filepath (str): Path to a file containing testset.
 
     Returns:
-        float: Value of the Root Mean Squared Error metric.
+        Tuple[float, float, float]: Values of the Root Mean Squared Error,
+            Mean Absolute Error and Fraction of Concordant Pairs metrics.
+    """
+    return evaluate_accuracy(model, read_testset(testset_filepath))
+
+
+def read_testset(testset_filepath: str) -> Testset:
+    """Reads users, books and ratings arrays of the testset.
     """
     ratings_df = pd.read_csv(testset_filepath)
-    reader = Reader(rating_scale=(1, 5))
-    dataset = Dataset.load_from_df(
-        ratings_df[['user_id', 'book_id', 'rating']], reader)
-    testset = dataset.build_full_trainset().build_testset()
-    est_ratings = model.test(testset)
-    return (accuracy.rmse(est_ratings, verbose=False),
-            accuracy.mae(est_ratings, verbose=False),
-            accuracy.fcp(est_ratings, verbose=False))
+    return (ratings_df['user_id'].values,
+            ratings_df['book_id'].values,
+            ratings_df['rating'].values.astype(np.float64))
+
+
+def evaluate_accuracy(
+        model: ICfRecommendationModel,
+        testset: Testset
+) -> Tuple[float, float, float]:
+    """Calculates RMSE, MAE and FCP values for the given model and testset
+    arrays, see `read_testset`.
+    """
+    users, books, ratings = testset
+    cases = list(zip(users.tolist(), books.tolist(), ratings.tolist()))
+    predictions = model.test(cases)
+    estimations = np.fromiter((prediction.est for prediction in predictions),
+                              dtype=np.float64, count=len(predictions))
+    return (rmse(ratings, estimations),
+            mae(ratings, estimations),
+            fcp(users, ratings, estimations))
+
+
+def rmse(ratings: np.ndarray, estimations: np.ndarray) -> float:
+    """Calculates the Root Mean Squared Error of estimated ratings.
+    """
+    return float(np.sqrt(np.mean((estimations - ratings) ** 2)))
+
+
+def mae(ratings: np.ndarray, estimations: np.ndarray) -> float:
+    """Calculates the Mean Absolute Error of estimated ratings.
+    """
+    return float(np.mean(np.abs(estimations - ratings)))
+
+
+def fcp(
+        users: np.ndarray,
+        ratings: np.ndarray,
+        estimations: np.ndarray
+) -> float:
+    """Calculates the Fraction of Concordant Pairs of estimated ratings,
+    giving the same result as `surprise.accuracy.fcp`.
+
+    Ratings of each user are sorted by estimations once. For every rating,
+    cumulative counts of ratings of each level with lower (or not higher)
+    estimations give the numbers of concordant (or discordant) pairs,
+    so no pairs are enumerated explicitly.
+
+    Args:
+        users: User of each rating.
+        ratings: True ratings.
+        estimations: Estimated ratings.
+
+    Raises:
+        ValueError: Raised when there are no ratings or no concordant
+            nor discordant pairs.
+    """
+    if len(users) == 0:
+        raise ValueError('Prediction list is empty.')
+
+    users_codes = np.unique(users, return_inverse=True)[1]
+    levels, ratings_codes = np.unique(ratings, return_inverse=True)
+    order = np.lexsort((estimations, users_codes))
+    users_codes = users_codes[order]
+    ratings_codes = ratings_codes[order]
+    estimations = estimations[order]
+
+    one_hot = np.zeros((len(order) + 1, len(levels)), dtype=np.int64)
+    one_hot[np.arange(1, len(order) + 1), ratings_codes] = 1
+    counts = np.cumsum(one_hot, axis=0)
+
+    # positions where runs of users and of equal estimations start and end
+    run_break = np.append(True, (users_codes[1:] != users_codes[:-1]) |
+                          (estimations[1:] != estimations[:-1]))
+    user_break = np.append(True, users_codes[1:] != users_codes[:-1])
+    run_start = np.maximum.accumulate(
+        np.where(run_break, np.arange(len(order)), 0))
+    user_start = np.maximum.accumulate(
+        np.where(user_break, np.arange(len(order)), 0))
+    run_end = np.append(np.flatnonzero(run_break)[1:], len(order))
+    run_end = np.repeat(run_end, np.diff(np.append(
+        np.flatnonzero(run_break), len(order))))
+
+    # ratings of the same user with lower / not higher estimations
+    lower = counts[run_start] - counts[user_start]
+    not_higher = counts[run_end] - counts[user_start]
+
+    lower_levels = np.cumsum(lower, axis=1)
+    not_higher_levels = np.cumsum(not_higher, axis=1)
+    rows = np.arange(len(order))
+    concordant = np.where(ratings_codes > 0,
+                          lower_levels[rows, ratings_codes - 1], 0)
+    discordant = (not_higher_levels[:, -1] -
+                  not_higher_levels[rows, ratings_codes])
+
+    users_count = users_codes.max(initial=-1) + 1
+    concordant = np.bincount(users_codes, concordant, minlength=users_count)
+    discordant = np.bincount(users_codes, discordant, minlength=users_count)
+    # surprise averages only over users having any pairs of the given kind
+    nc = concordant[concordant > 0].mean() if concordant.any() else 0
+    nd = discordant[discordant > 0].mean() if discordant.any() else 0
+    if nc + nd == 0:
+        raise ValueError('cannot compute fcp on this list of prediction. '
+                         'Does every user have at least two predictions?')
+
+    return float(nc / (nc + nd))
+
+
+def evaluate_models(
+        models_filepaths: List[str],
+        testset: Testset,
+        jobs: int = None
+) -> List[Tuple[float, float, float]]:
+    """Evaluates models in parallel processes, each model is read
+    by a worker and the testset is passed to every worker once.
+
+    Args:
+        models_filepaths: Paths to files containing models.
+        testset: Testset arrays, see `read_testset`.
+        jobs: Defaults to None. Number of worker processes,
+            the number of processors is used if None.
+
+    Returns:
+        RMSE, MAE and FCP values of each model.
+    """
+    with cf.ProcessPoolExecutor(max_workers=jobs,
+                                initializer=_init_worker,
+                                initargs=(testset,)) as executor:
+        return list(executor.map(_evaluate_model_file, models_filepaths))
+
+
+def _init_worker(testset: Testset):
+    global _worker_testset  # pylint: disable=global-statement
+    _worker_testset = testset
+
+
+def _evaluate_model_file(model_filepath: str) -> Tuple[float, float, float]:
+    logging.getLogger(__name__).info('Evaluating %s...', model_filepath)
+    return evaluate_accuracy(read_object(model_filepath), _worker_testset)
 
 
 @click.command()
 @click.argument('models_dir', type=click.Path(exists=True))
 @click.argument('testset_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
-def main(models_dir: str, testset_filepath: str, output_filepath: str):
+@click.option('--jobs', type=int, default=None,
+              help='Number of worker processes.')
+def main(models_dir: str, testset_filepath: str, output_filepath: str,
+         jobs: int):
     """Evaluates RMSE, MAE and FCP metrics of models on the given testset.
 
     Args:
         models_dir (str): Directory with models to test.
         testset_filepath (str): Path to a file with test data.
         output_filepath (str): Output filepath.
+        jobs (int): Number of worker processes.
     """
     logger = logging.getLogger(__name__)
 
@@ -53,11 +200,12 @@ def main(models_dir: str, testset_filepath: str, output_filepath: str):
                     if filename.endswith('.pkl')]
 
     logger.info('Evaluating models from %s...', models_dir)
-    results = list()
-    for model_file in models_files:
-        model = read_object(join(models_dir, model_file))
-        result = [model_file] + list(test_accuracy(model, testset_filepath))
-        results.append(result)
+    testset = read_testset(testset_filepath)
+    scores = evaluate_models([join(models_dir, model_file)
+                              for model_file in models_files],
+                             testset, jobs)
+    results = [[model_file] + list(model_scores)
+               for model_file, model_scores in zip(models_files, scores)]
 
     labels = ['model', 'rmse', 'mae', 'fcp']
     results_df = pd.DataFrame.from_records(results, columns=labels)
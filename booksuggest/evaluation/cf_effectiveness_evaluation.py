@@ -2,10 +2,11 @@ import logging
 from os import listdir
 from os.path import join
 import click
+import numpy as np
 import pandas as pd
 from typing import Tuple
 
-from .metrics import precision_thresholded, recall_thresholded
+from ..utils.ranking import ranks_within_groups
 
 
 def evaluate_on_predictions(
@@ -25,20 +26,82 @@ def evaluate_on_predictions(
     Returns:
         Tuple[float, float]: Average `(precision, recall)` for all users.
     """
-    def evaluate(group):
-        to_read_ids = group['book_id'].values
-        predictions = predictions_grouped_df.get_group(group.name).head(n)
-        pred_tuples = [(x.book_id, x.est)
-                       for x in predictions.itertuples()]
-        return (precision_thresholded(pred_tuples, to_read_ids, threshold),
-                recall_thresholded(pred_tuples, to_read_ids, threshold))
-
-    predictions_grouped_df = predictions_df.groupby('user_id')[
-        'book_id', 'est']
-    metrics_series = test_df.groupby('user_id').apply(evaluate)
-    df = pd.DataFrame(metrics_series.values.tolist(),
-                      index=metrics_series.index)
-    return tuple(df.mean().values)
+    precisions, recalls = evaluate_on_predictions_up_to(
+        predictions_df, test_df, threshold, n)
+    return float(precisions[n - 1]), float(recalls[n - 1])
+
+
+def evaluate_on_predictions_up_to(
+        predictions_df: pd.DataFrame,
+        test_df: pd.DataFrame,
+        threshold: float,
+        n_max: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Calculates the precision and recall of predictions for every number
+    of recommendations from 1 to `n_max` at once.
+
+    Predictions of each user are taken in the order of the data frame.
+    Hits against the test data are found with a single sorted join and
+    the numbers of relevant recommendations for all `n` are obtained
+    with cumulative sums over a users by ranks matrix.
+
+    Args:
+        predictions_df (pd.DataFrame): Data frame with predictions.
+        test_df (pd.DataFrame): Data frame containg testing data.
+            Should contain `['user_id', 'book_id']` columns.
+        threshold (float): Treshold for rating to be valid recommendation.
+        n_max (int): Maximal number of recommendations.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Average precision and recall
+            for all users, the `n - 1` element corresponds to `n`
+            recommendations.
+    """
+    test_users, relevant_counts = np.unique(test_df['user_id'].values,
+                                            return_counts=True)
+
+    order = np.argsort(predictions_df['user_id'].values, kind='mergesort')
+    users = predictions_df['user_id'].values[order]
+    books = predictions_df['book_id'].values[order]
+    estimations = predictions_df['est'].values[order]
+    ranks = ranks_within_groups(users)
+
+    positions = np.searchsorted(test_users, users)
+    positions[positions == len(test_users)] = 0
+    evaluated = (test_users[positions] == users) & (ranks < n_max)
+
+    valid = estimations >= threshold
+    hits = evaluated & valid & _is_test_pair(users, books, test_df)
+
+    hits_matrix = np.zeros((len(test_users), n_max), dtype=np.int32)
+    hits_matrix[positions[hits], ranks[hits]] = 1
+    relevant_retrieved = np.cumsum(hits_matrix, axis=1)
+
+    predictions_counts = np.bincount(positions[evaluated],
+                                     minlength=len(test_users))
+    retrieved = np.minimum(predictions_counts[:, np.newaxis],
+                           np.arange(1, n_max + 1))
+
+    precisions = np.divide(relevant_retrieved, retrieved,
+                           out=np.zeros(relevant_retrieved.shape),
+                           where=retrieved != 0)
+    recalls = relevant_retrieved / relevant_counts[:, np.newaxis]
+    return precisions.mean(axis=0), recalls.mean(axis=0)
+
+
+def _is_test_pair(
+        users: np.ndarray,
+        books: np.ndarray,
+        test_df: pd.DataFrame
+) -> np.ndarray:
+    """Checks which (user, book) pairs are present in the test data.
+    """
+    books_count = max(books.max(initial=0),
+                      test_df['book_id'].max()) + 1
+    test_keys = (test_df['user_id'].values.astype(np.int64) * books_count +
+                 test_df['book_id'].values)
+    keys = users.astype(np.int64) * books_count + books
+    return np.isin(keys, test_keys)
 
 
 @click.command()
@@ -77,13 +140,14 @@ def main(predictions_dir: str, to_read_filepath: str, testset_filepath: str,
     results = list()
     for prediction_file in predictions_files:
         prediction_df = pd.read_csv(join(predictions_dir, prediction_file))
+        p_to_read, r_to_read = evaluate_on_predictions_up_to(
+            prediction_df, to_read_df, threshold, n_max)
+        p_testset, r_testset = evaluate_on_predictions_up_to(
+            prediction_df, testset_df, threshold, n_max)
         for n in range(n_min, n_max + 1):
-            p_to_read, r_to_read = evaluate_on_predictions(
-                prediction_df, to_read_df, threshold, n)
-            p_testset, r_testset = evaluate_on_predictions(
-                prediction_df, testset_df, threshold, n)
-            results.append((prediction_file, n, p_to_read, p_testset,
-                            r_to_read, r_testset))
+            results.append((prediction_file, n,
+                            p_to_read[n - 1], p_testset[n - 1],
+                            r_to_read[n - 1], r_testset[n - 1]))
 
     logger.info('Saving results to %s...', output_filepath)
     labels = ['model', 'n', 'precision-to_read', 'precision-testset',
@@ -6,21 +6,21 @@ from typing import Any, Callable, Dict, Tuple
 
 from surprise import AlgoBase, KNNBaseline, SVD
 from surprise import Dataset, Reader
-from surprise.model_selection import GridSearchCV
-from surprise.model_selection.split import KFold
-import numpy as np
 from sklearn.utils.random import sample_without_replacement
 
+from .cf_search import grid_search, successive_halving
+
 logger = logging.getLogger(__name__)
 
 
-def knn_grid_search(dataset: Dataset, random_state: int
+def knn_grid_search(dataset: Dataset, random_state: int, jobs: int = None
                     ) -> Tuple[AlgoBase, pd.DataFrame]:
     """Performs a grid searcg procedure for KNN model.
 
     Args:
         dataset (Dataset): Dataset to run tests on.
         random_state (int): Value for random seed.
+        jobs (int): Number of processes fitting models.
 
     Returns:
         Tuple[AlgoBase, pd.DataFrame]: `(model_constructor, best_parameters)`
@@ -36,16 +36,18 @@ def knn_grid_search(dataset: Dataset, random_state: int
                               'shrinkage': [100]},
               'verbose': [False]}
     algo = KNNBaseline
-    return (algo, _perform_grid_search(algo, params, dataset, random_state))
+    return (algo, _perform_grid_search(algo, params, dataset, random_state,
+                                       jobs))
 
 
-def svd_grid_search(dataset: Dataset, random_state: int
+def svd_grid_search(dataset: Dataset, random_state: int, jobs: int = None
                     ) -> Tuple[AlgoBase, pd.DataFrame]:
     """Performs a grid searcg procedure for SVD model.
 
     Args:
         dataset (Dataset): Dataset to run tests on.
         random_state (int): Value for random seed.
+        jobs (int): Number of processes fitting models.
 
     Returns:
         Tuple[AlgoBase, pd.DataFrame]: `(model_constructor, best_parameters)`
@@ -59,16 +61,70 @@ def svd_grid_search(dataset: Dataset, random_state: int
               'reg_all': [0.02],
               'random_state': [random_state]}
     algo = SVD
-    return (algo, _perform_grid_search(algo, params, dataset, random_state))
+    return (algo, _perform_grid_search(algo, params, dataset, random_state,
+                                       jobs))
+
+
+def knn_halving_search(dataset: Dataset, random_state: int, jobs: int = None
+                       ) -> Tuple[AlgoBase, pd.DataFrame]:
+    """Performs a successive halving search procedure for KNN model,
+    budgets are fractions of the training ratings.
+
+    Args:
+        dataset (Dataset): Dataset to run tests on.
+        random_state (int): Value for random seed.
+        jobs (int): Number of processes fitting models.
+
+    Returns:
+        Tuple[AlgoBase, pd.DataFrame]: `(model_constructor, best_parameters)`
+    """
+    params = {'bsl_options': {'method': ['als'],
+                              'reg_i': [5, 10, 15],
+                              'reg_u': [10, 15, 20],
+                              'n_epochs': [10]},
+              'k': [20, 30, 50],
+              'sim_options': {'name': ['pearson_baseline'],
+                              'min_support': [1],
+                              'user_based': [False],
+                              'shrinkage': [50, 100]},
+              'verbose': [False]}
+    algo = KNNBaseline
+    return (algo, successive_halving(algo, params, dataset, 'fraction',
+                                     1 / 9, 1.0, eta=3,
+                                     random_state=random_state, jobs=jobs))
+
+
+def svd_halving_search(dataset: Dataset, random_state: int, jobs: int = None
+                       ) -> Tuple[AlgoBase, pd.DataFrame]:
+    """Performs a successive halving search procedure for SVD model,
+    budgets are numbers of epochs.
+
+    Args:
+        dataset (Dataset): Dataset to run tests on.
+        random_state (int): Value for random seed.
+        jobs (int): Number of processes fitting models.
+
+    Returns:
+        Tuple[AlgoBase, pd.DataFrame]: `(model_constructor, best_parameters)`
+    """
+    params = {'n_factors': [50, 100, 200],
+              'biased': [True],
+              'init_mean': [0.1],
+              'init_std_dev': [0.05],
+              'lr_all': [0.002, 0.005, 0.01],
+              'reg_all': [0.02, 0.05, 0.1],
+              'random_state': [random_state]}
+    algo = SVD
+    return (algo, successive_halving(algo, params, dataset, 'n_epochs',
+                                     5, 45, eta=3,
+                                     random_state=random_state, jobs=jobs))
 
 
 def _perform_grid_search(algo_class: AlgoBase, param_grid: Dict[str, Any],
-                         dataset: Dataset, random_state: int) -> pd.DataFrame:
-    gs = GridSearchCV(algo_class, param_grid, measures=['rmse', 'mae', 'fcp'],
-                      cv=KFold(5, random_state=random_state),
-                      n_jobs=2, joblib_verbose=100, pre_dispatch=2)
-    gs.fit(dataset)
-    return pd.DataFrame.from_dict(gs.cv_results).sort_values('rank_test_rmse')
+                         dataset: Dataset, random_state: int,
+                         jobs: int = None) -> pd.DataFrame:
+    return grid_search(algo_class, param_grid, dataset, n_splits=5,
+                       random_state=random_state, jobs=jobs)
 
 
 def _minify_dataset(ratings_df: pd.DataFrame, random_state: int
@@ -85,18 +141,25 @@ def _minify_dataset(ratings_df: pd.DataFrame, random_state: int
 @click.argument('ratings_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
 @click.option('--model', type=click.Choice(['knn', 'svd']))
+@click.option('--search', type=click.Choice(['grid', 'halving']),
+              default='grid')
 @click.option('--random-state', type=int, default=None)
 @click.option('--use-subset', is_flag=True)
+@click.option('--jobs', type=int, default=None,
+              help='Number of processes fitting models.')
 def main(ratings_filepath: str, output_filepath: str,
-         model: str, random_state: int, use_subset: bool):
+         model: str, search: str, random_state: int, use_subset: bool,
+         jobs: int):
     """Searchs over model parameters values to find best combination.
 
     Args:
         ratings_filepath (str): Path to a file with ratings data,
         output_filepath (str): Output filepath.
         model (str): Model type shortname. Values: `['knn', 'svd']`
+        search (str): Search procedure. Values: `['grid', 'halving']`
         random_state (int): Value for random seed.
         use_subset (bool): Whether to use a subset of 200 random users.
+        jobs (int): Number of processes fitting models.
 
     Raises:
         KeyError: When `model` is out of the specified range.
@@ -112,11 +175,13 @@ def main(ratings_filepath: str, output_filepath: str,
 
     logger.info('Searching parameters values for %s model...', model)
     model_func = {
-        'knn': lambda x: knn_grid_search(x, random_state=random_state),
-        'svd': lambda x: svd_grid_search(x, random_state=random_state)}
+        'grid': {'knn': knn_grid_search, 'svd': svd_grid_search},
+        'halving': {'knn': knn_halving_search, 'svd': svd_halving_search}
+    }[search]
 
     try:
-        algo, parameters_df = model_func[model](dataset)
+        algo, parameters_df = model_func[model](
+            dataset, random_state=random_state, jobs=jobs)
     except KeyError:
         raise KeyError("Model shortname not predefined!")
 
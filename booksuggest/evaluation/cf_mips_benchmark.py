@@ -0,0 +1,126 @@
+"""Benchmark comparing the maximum inner product search index of SVD serving
+models with the brute force scoring of all books.
+"""
+import logging
+import time
+from typing import Dict, List, Union
+
+import click
+import numpy as np
+import pandas as pd
+
+from ..models.mips_index import NormOrderedMipsIndex
+from ..utils.ranking import top_n_indices
+from ..utils.serialization import read_arrays
+
+logger = logging.getLogger(__name__)
+
+
+def benchmark_mips_index(
+        serving_model_dir: str,
+        users: np.ndarray,
+        recommendations_count: int,
+        recall_targets: List[float]
+) -> List[Dict[str, Union[str, float]]]:
+    """Measures recall and latency of the index for given recall targets.
+
+    Args:
+        serving_model_dir: Directory containing the SVD serving model.
+        users: Inner ids of users for which recommendations are calculated.
+        recommendations_count: Number of recommendations per user.
+        recall_targets: Recall targets used for calibrating the index.
+
+    Returns:
+        Benchmark results for the brute force search and each recall target.
+    """
+    metadata, arrays = read_arrays(serving_model_dir, mmap_mode=None)
+    offset = metadata['global_mean'] + arrays['bu']
+    qi, bi, pu = arrays['qi'], arrays['bi'], arrays['pu']
+    n_items = len(arrays['item_ids'])
+
+    def excluded(user):
+        return np.unpackbits(arrays['known_items'][user])[:n_items] \
+            .astype(bool)
+
+    def brute_force(user):
+        scores = np.clip(offset[user] + bi + qi.dot(pu[user]),
+                         *metadata['rating_scale'])
+        scores[excluded(user)] = -np.inf
+        return top_n_indices(scores, recommendations_count)
+
+    start = time.perf_counter()
+    exact_results = [set(brute_force(user)) for user in users]
+    results = [{
+        'search': 'brute-force',
+        'recall_target': 1.0,
+        'recall': 1.0,
+        'scanned_fraction': 1.0,
+        'latency_ms': 1000 * (time.perf_counter() - start) / len(users)
+    }]
+
+    index = NormOrderedMipsIndex.build(qi, bi)
+    for recall_target in recall_targets:
+        logger.info('Benchmarking index with %s recall target...',
+                    recall_target)
+        index.calibrate(pu[users], recommendations_count, recall_target)
+
+        start = time.perf_counter()
+        searches = [index.search_with_stats(
+            pu[user], recommendations_count, offset[user],
+            metadata['rating_scale'], excluded(user)) for user in users]
+        latency = 1000 * (time.perf_counter() - start) / len(users)
+
+        results.append({
+            'search': 'mips-index',
+            'recall_target': recall_target,
+            'recall': np.mean([
+                len(exact & set(items)) / len(exact)
+                for exact, (items, _, _) in zip(exact_results, searches)
+            ]),
+            'scanned_fraction': np.mean([
+                scanned / n_items for _, _, scanned in searches
+            ]),
+            'latency_ms': latency
+        })
+
+    return results
+
+
+@click.command()
+@click.argument('serving_model_dir', type=click.Path(exists=True))
+@click.argument('output_filepath', type=click.Path())
+@click.option('--n', default=20,
+              help='How many recommendations should be returned by the model')
+@click.option('--users-count', default=1000,
+              help='Number of randomly chosen users used for benchmarking.')
+@click.option('--recall-target', type=float, multiple=True,
+              default=[1.0, 0.99, 0.95, 0.9],
+              help='Recall targets of the index.')
+@click.option('--random-state', type=int, default=None)
+def main(serving_model_dir: str, output_filepath: str, n: int,
+         users_count: int, recall_target: List[float], random_state: int):
+    """Compares the maximum inner product search index with brute force.
+
+    Args:
+        serving_model_dir (str): Directory containing the SVD serving model.
+        output_filepath (str): Output filepath.
+        n (int): Number of recommendations to return.
+        users_count (int): Number of users used for benchmarking.
+        recall_target (List[float]): Recall targets of the index.
+        random_state (int): Value for random seed.
+    """
+    _, arrays = read_arrays(serving_model_dir)
+    users = np.random.RandomState(random_state).permutation(
+        len(arrays['user_ids']))[:users_count]
+
+    logger.info('Benchmarking %s...', serving_model_dir)
+    results = benchmark_mips_index(serving_model_dir, users, n,
+                                   list(recall_target))
+
+    logger.info('Saving results to %s...', output_filepath)
+    pd.DataFrame.from_records(results).to_csv(output_filepath, index=False)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()  # pylint: disable=no-value-for-parameter
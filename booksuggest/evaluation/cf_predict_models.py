@@ -1,59 +1,324 @@
 import click
+import datetime
+import io
+import json
 import logging
+import numpy as np
+import os
 import pandas as pd
+import shutil
+import tempfile
+import time
 
 import concurrent.futures as cf
 from itertools import chain, islice, repeat
-from typing import Any, Iterable, List, Tuple
+from typing import Any, Dict, Iterable, List, Set, TextIO, Tuple
 
-from ..models.cf_recommend_models import ICfRecommendationModel
+from ..models.cf_recommend_models import (
+    ICfRecommendationModel,
+    SurpriseBasedModel
+)
+from ..models.cf_serving_models import (
+    SERVING_MODEL_EXTENSION,
+    ServingCfModel,
+    export_serving_model,
+    is_serving_model,
+    read_serving_model
+)
+from ..utils.ranking import grouped_top_n_indices
 from ..utils.serialization import read_object
 
 logger = logging.getLogger(__name__)
 
+_worker_model = None
+
+PREDICTIONS_COLUMNS = ['user_id', 'book_id', 'est']
+MANIFEST_FILENAME = 'manifest.json'
+
 
 def predict_model(model: ICfRecommendationModel,
                   recommendation_count: int,
                   chunks_count: int,
-                  batch_size: int = 100000
+                  batch_size: int = 100000,
+                  block_size: int = 100
                   ) -> pd.DataFrame:
     """Calculates top recommendations for every user in the trainset.
 
-    Calculations are done in batches to avoid huge memory consumption.
+    Same as `write_predictions`, but the predictions are returned
+    as a data frame.
 
     Args:
         model (ICfRecommendationModel): Already trained model.
         recommendation_count (int): Specifies how many recommendations to save.
-        chunks_count (int): Number of chunks.
+        chunks_count (int): Number of worker processes.
         batch_size (int, optional): Defaults to 100000. Size of single batch.
+        block_size (int, optional): Defaults to 100. Number of users
+            in a single block of work.
 
     Returns:
         pd.DataFrame: Data frame with predictions.
     """
-    main_df = pd.DataFrame(columns=['user_id', 'book_id', 'est'])
-    users_chunked = _chunk_users(list(model.users), chunks_count)
-    args = (users_chunked, repeat(model), repeat(recommendation_count),
-            repeat(batch_size))
-    with cf.ProcessPoolExecutor(max_workers=chunks_count) as executor:
-        for df in executor.map(_process_chunk, *args):
-            main_df = main_df.append(df)
-    return main_df.sort_values('user_id')
+    output = io.StringIO()
+    write_predictions(model, output, recommendation_count, chunks_count,
+                      batch_size, block_size=block_size)
+    output.seek(0)
+    return pd.read_csv(output)
+
+
+def write_predictions(model: ICfRecommendationModel,
+                      output: TextIO,
+                      recommendation_count: int,
+                      chunks_count: int,
+                      batch_size: int = 100000,
+                      header: bool = True,
+                      block_size: int = 100,
+                      work_dir: str = None,
+                      resume: bool = False,
+                      model_fingerprint: str = None):
+    """Calculates top recommendations for every user in the trainset
+    and writes them in the csv format sorted by user ids.
+
+    Users are split into small blocks of consecutive ids, which are handed
+    out to idle workers, so a slow block does not stall the others. Each
+    worker streams predictions of its block, batch by batch, to a separate
+    partition file. Completed blocks are recorded in a manifest in the work
+    directory, which allows resuming an interrupted run. The partitions
+    are concatenated afterwards, so only a single batch of predictions
+    is kept in memory.
+
+    Models based on supported Surprise algorithms are exported
+    as temporary serving models first. Workers memory map the arrays
+    of serving models once, so they share a single copy of the model
+    regardless of the number of workers.
+
+    Args:
+        model (ICfRecommendationModel): Already trained model.
+        output (TextIO): Output stream.
+        recommendation_count (int): Specifies how many recommendations to save.
+        chunks_count (int): Number of worker processes.
+        batch_size (int, optional): Defaults to 100000. Maximal number
+            of predictions in a single batch, users are not split
+            between batches.
+        header (bool, optional): Defaults to True. Whether to write
+            the column names.
+        block_size (int, optional): Defaults to 100. Number of users
+            in a single block of work.
+        work_dir (str, optional): Defaults to None. Directory for partition
+            files and the manifest, removed when all predictions are written.
+            A temporary directory is used if None.
+        resume (bool, optional): Defaults to False. Whether to skip blocks
+            completed by a previous run using the same work directory.
+        model_fingerprint (str, optional): Defaults to None. Identifies
+            the model in the manifest, blocks completed by a previous run
+            are reused only if the fingerprints are equal.
+    """
+    blocks = _block_users(sorted(model.users), block_size)
+    parameters = {
+        'users_count': sum(len(block) for block in blocks),
+        'block_size': block_size,
+        'recommendation_count': recommendation_count,
+        'model': model_fingerprint
+    }
+
+    persistent_work_dir = work_dir is not None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = work_dir or tmp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        manifest_filepath = os.path.join(work_dir, MANIFEST_FILENAME)
+        completed = (_read_manifest(manifest_filepath, parameters)
+                     if resume else set())
+        partitions = [os.path.join(work_dir, f'block-{idx:06d}.csv')
+                      for idx in range(len(blocks))]
+        missing = [idx for idx in range(len(blocks)) if idx not in completed]
+        logger.info('Blocks to process: %d of %d', len(missing), len(blocks))
+
+        if missing:
+            model = _shared_model(model, tmp_dir)
+            with cf.ProcessPoolExecutor(max_workers=chunks_count,
+                                        initializer=_init_worker,
+                                        initargs=(model,)) as executor:
+                futures = {
+                    executor.submit(_process_chunk, blocks[idx],
+                                    recommendation_count, batch_size,
+                                    partitions[idx]): idx
+                    for idx in missing
+                }
+                progress = _Progress(
+                    sum(len(blocks[idx]) for idx in missing))
+                for future in cf.as_completed(futures):
+                    future.result()
+                    idx = futures[future]
+                    completed.add(idx)
+                    _write_manifest(manifest_filepath, parameters, completed)
+                    progress.update(len(blocks[idx]))
+
+        if header:
+            output.write(','.join(PREDICTIONS_COLUMNS) + '\n')
+        _concatenate_partitions(partitions, output)
+
+    if persistent_work_dir:
+        shutil.rmtree(work_dir)
+
+
+class _Progress():
+    """Logs throughput and estimated remaining time of processed users.
+    """
+
+    def __init__(self, users_count: int):
+        self._users_count = users_count
+        self._done = 0
+        self._start = time.perf_counter()
+
+    def update(self, users_done: int):
+        self._done += users_done
+        elapsed = time.perf_counter() - self._start
+        throughput = self._done / elapsed if elapsed > 0 else float('inf')
+        eta = (self._users_count - self._done) / throughput
+        logger.info('Users: %d/%d, %.1f users/s, ETA: %s',
+                    self._done, self._users_count, throughput,
+                    datetime.timedelta(seconds=round(eta)))
+
+
+def _read_manifest(
+        manifest_filepath: str,
+        parameters: Dict[str, Any]
+) -> Set[int]:
+    """Reads blocks completed by a previous run with the same parameters.
+    """
+    if not os.path.exists(manifest_filepath):
+        return set()
 
+    with open(manifest_filepath) as f:
+        manifest = json.load(f)
+    if manifest['parameters'] != parameters:
+        logger.warning('Manifest parameters differ, starting from scratch')
+        return set()
 
-def _chunk_users(users, chunks_count):
-    return [users[start::chunks_count] for start in range(chunks_count)]
+    return set(manifest['completed'])
 
 
-def _process_chunk(users, model, recommendation_count, batch_size):
-    batches = _batch(model.generate_antitest_set(users), batch_size)
-    batch_counter = 0
-    main_df = pd.DataFrame(columns=['user_id', 'book_id', 'est'])
-    for batch in batches:
-        logger.debug('Batch: %s', batch_counter)
-        batch_counter += 1
-        df = _predict_batch(model, list(batch), recommendation_count)
-        main_df = main_df.append(df)
-    return main_df
+def _write_manifest(
+        manifest_filepath: str,
+        parameters: Dict[str, Any],
+        completed: Set[int]
+):
+    tmp_filepath = manifest_filepath + '.tmp'
+    with open(tmp_filepath, 'w') as f:
+        json.dump({'parameters': parameters, 'completed': sorted(completed)},
+                  f)
+    os.replace(tmp_filepath, manifest_filepath)
+
+
+def model_fingerprint(model_filepath: str) -> str:
+    """Creates a fingerprint of a model file or of a serving model
+    directory, which changes whenever the model is saved again.
+
+    Args:
+        model_filepath (str): Path to the model file or directory.
+
+    Returns:
+        str: Sizes and modification times of the model files.
+    """
+    filepaths = ([os.path.join(model_filepath, filename)
+                  for filename in sorted(os.listdir(model_filepath))]
+                 if os.path.isdir(model_filepath) else [model_filepath])
+    stats = [os.stat(filepath) for filepath in filepaths]
+    return ';'.join(f'{os.path.basename(filepath)}:{stat.st_size}:'
+                    f'{stat.st_mtime_ns}'
+                    for filepath, stat in zip(filepaths, stats))
+
+
+def _shared_model(
+        model: ICfRecommendationModel,
+        dirname: str
+) -> ICfRecommendationModel:
+    """Replaces a Surprise based model with a memory mapped serving model
+    saved in the given directory, other models are returned unchanged.
+    """
+    if not isinstance(model, SurpriseBasedModel):
+        return model
+
+    serving_model_dir = os.path.join(dirname,
+                                     'model' + SERVING_MODEL_EXTENSION)
+    try:
+        export_serving_model(model, serving_model_dir)
+    except ValueError:
+        logger.info('Model cannot be exported, it is copied to workers')
+        return model
+
+    return read_serving_model(serving_model_dir)
+
+
+def _init_worker(model: ICfRecommendationModel):
+    global _worker_model  # pylint: disable=global-statement
+    _worker_model = model
+
+
+def _block_users(users, block_size):
+    return [users[start:start + block_size]
+            for start in range(0, len(users), block_size)]
+
+
+def _process_chunk(users, recommendation_count, batch_size,
+                   partition_filepath):
+    model = _worker_model
+    if isinstance(model, ServingCfModel):
+        users_per_batch = max(1, batch_size // max(1, recommendation_count))
+        batches = (_recommend_users(model, list(batch), recommendation_count)
+                   for batch in _batch(users, users_per_batch))
+    else:
+        batches = (_predict_batch(model, batch, recommendation_count)
+                   for batch in _batch_users(model, users, batch_size))
+
+    # the partition appears only when the whole block is written
+    tmp_filepath = partition_filepath + '.tmp'
+    with open(tmp_filepath, 'w') as partition:
+        for batch_counter, df in enumerate(batches):
+            logger.debug('Batch: %s', batch_counter)
+            df.to_csv(partition, header=False, index=False)
+    os.replace(tmp_filepath, partition_filepath)
+
+    return partition_filepath
+
+
+def _concatenate_partitions(partitions: List[str], output: TextIO):
+    """Writes partitions of consecutive user blocks to the output stream.
+    """
+    for partition in partitions:
+        with open(partition) as f:
+            shutil.copyfileobj(f, output)
+
+
+def _recommend_users(
+        model: ServingCfModel,
+        users: List[int],
+        recommendation_count: int
+) -> pd.DataFrame:
+    rows = [(user, book_id, est)
+            for user in users
+            for book_id, est
+            in model.recommend(user, recommendation_count).items()]
+    return pd.DataFrame.from_records(rows, columns=PREDICTIONS_COLUMNS)
+
+
+def _batch_users(
+        model: ICfRecommendationModel,
+        users: List[int],
+        batch_size: int
+) -> Iterable[List[Tuple[int, int, float]]]:
+    """Groups cases of consecutive users into batches of at most
+    `batch_size` cases, a user with more cases forms a batch on its own.
+    """
+    batch = list()
+    for user in users:
+        cases = list(model.generate_antitest_set([user]))
+        if batch and len(batch) + len(cases) > batch_size:
+            yield batch
+            batch = list()
+        batch.extend(cases)
+
+    if batch:
+        yield batch
 
 
 def _predict_batch(
@@ -62,12 +327,15 @@ def _predict_batch(
         recommendation_count: int
 ) -> pd.DataFrame:
     predictions = model.test(cases_batch)
-    labels = ['user_id', 'book_id', '2', 'est', '4']
-    pred_df = pd.DataFrame.from_records(
-        predictions, exclude=['2', '4'], columns=labels)
-    pred_df = pred_df.groupby('user_id')['book_id', 'est'].apply(
-        lambda x: x.nlargest(recommendation_count, columns=['est']))
-    return pred_df.reset_index(level=0)
+    users = np.array([prediction.uid for prediction in predictions])
+    books = np.array([prediction.iid for prediction in predictions])
+    estimations = np.array([prediction.est for prediction in predictions])
+
+    top_n = grouped_top_n_indices(users, estimations, recommendation_count)
+    return pd.DataFrame({'user_id': users[top_n],
+                         'book_id': books[top_n],
+                         'est': estimations[top_n]},
+                        columns=PREDICTIONS_COLUMNS)
 
 
 def _batch(iterable: Iterable[Any], batch_size: int) -> Iterable[Any]:
@@ -86,26 +354,42 @@ def _batch(iterable: Iterable[Any], batch_size: int) -> Iterable[Any]:
 @click.argument('output_filepath', type=click.Path())
 @click.option('--n', default=20,
               help='How many recommendations should be returned by the model')
-@click.option('--chunks-count', type=int, help='Numbers of chunks')
-def main(model_filepath: str, output_filepath: str, n: int, chunks_count: int):
+@click.option('--chunks-count', type=int, help='Numbers of worker processes')
+@click.option('--block-size', default=100,
+              help='Number of users in a single block of work.')
+@click.option('--resume', is_flag=True,
+              help='Skip blocks completed by an interrupted run.')
+def main(model_filepath: str, output_filepath: str, n: int, chunks_count: int,
+         block_size: int, resume: bool):
     """Calculates and saves predictions for the given model.
 
+    Serving models compute recommendations of each user at once instead
+    of estimating ratings of all (user, book) pairs. Completed blocks
+    of users are kept in the `<output_filepath>.parts` directory until
+    all predictions are saved.
+
     Args:
-        model_filepath (str): Path to a file containg model.
+        model_filepath (str): Path to a file containg model
+            or to a serving model directory.
         output_filepath (str): Output filepath.
         n (int): Number of recommendations to return.
-        chunks_count (int): In how many chunks split the users set
-            during parallel processing.
+        chunks_count (int): Number of worker processes.
+        block_size (int): Number of users in a single block of work.
+        resume (bool): Whether to skip blocks completed by a previous run
+            of the same model.
     """
     logger.info('Loading model...')
-    model = read_object(model_filepath)
-
-    logger.info('Calculating predictions...')
-    predictions = predict_model(model, n, chunks_count)
+    model = (read_serving_model(model_filepath)
+             if is_serving_model(model_filepath)
+             else read_object(model_filepath))
 
-    logger.info('Appending results to %s...', output_filepath)
+    logger.info('Calculating and appending predictions to %s...',
+                output_filepath)
     with open(output_filepath, 'a') as f:
-        predictions.to_csv(f, header=f.tell() == 0, index=False)
+        write_predictions(model, f, n, chunks_count, header=f.tell() == 0,
+                          block_size=block_size,
+                          work_dir=output_filepath + '.parts', resume=resume,
+                          model_fingerprint=model_fingerprint(model_filepath))
 
 
 if __name__ == '__main__':
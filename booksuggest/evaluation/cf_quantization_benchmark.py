@@ -0,0 +1,133 @@
+"""Benchmark comparing SVD serving models with quantized item factors
+against the full precision model.
+"""
+import logging
+import time
+from typing import Dict, List, Union
+
+import click
+import numpy as np
+import pandas as pd
+
+from ..models.cf_serving_models import (
+    SvdServingModel,
+    quantize_serving_arrays
+)
+from ..utils.serialization import read_arrays
+
+logger = logging.getLogger(__name__)
+
+
+def benchmark_quantization(
+        serving_model_dir: str,
+        users: List[int],
+        recommendations_count: int,
+        rescore_factor: int
+) -> List[Dict[str, Union[str, float]]]:
+    """Measures memory, latency and top-N overlap of quantized models.
+
+    Args:
+        serving_model_dir: Directory containing the SVD serving model.
+        users: Users for which recommendations are calculated.
+        recommendations_count: Number of recommendations per user.
+        rescore_factor: How many times more candidates than recommendations
+            are rescored using exact factors.
+
+    Returns:
+        Benchmark results for each storage type.
+    """
+    metadata, arrays = read_arrays(serving_model_dir, mmap_mode=None)
+    # the index would be used instead of the quantized factors
+    metadata, arrays = _exact_serving_arrays(metadata, arrays)
+    full_model = SvdServingModel(metadata, arrays)
+    full_recommendations, full_latency = _time_recommendations(
+        full_model, users, recommendations_count)
+
+    results = [{
+        'storage': 'float64',
+        'factors_bytes': arrays['qi'].nbytes,
+        'latency_ms': full_latency,
+        'overlap': 1.0
+    }]
+    for dtype in ['float16', 'int8']:
+        logger.info('Benchmarking %s item factors...', dtype)
+        model_metadata, model_arrays = quantize_serving_arrays(
+            metadata, arrays, dtype, rescore_factor)
+        model = SvdServingModel(model_metadata, model_arrays)
+        recommendations, latency = _time_recommendations(
+            model, users, recommendations_count)
+
+        overlap = np.mean([
+            len(recommendations[user].keys() &
+                full_recommendations[user].keys()) / recommendations_count
+            for user in users
+        ])
+        results.append({
+            'storage': dtype,
+            'factors_bytes': (model_arrays['qi_quantized'].nbytes +
+                              model_arrays['qi_scale'].nbytes),
+            'latency_ms': latency,
+            'overlap': overlap
+        })
+
+    return results
+
+
+def _exact_serving_arrays(metadata, arrays):
+    metadata = {key: value for key, value in metadata.items()
+                if not key.startswith('mips_')
+                and key not in {'quantization', 'rescore_factor'}}
+    arrays = {name: array for name, array in arrays.items()
+              if not name.startswith('mips_')
+              and name not in {'qi_quantized', 'qi_scale'}}
+    return metadata, arrays
+
+
+def _time_recommendations(model, users, recommendations_count):
+    recommendations = dict()
+    start = time.perf_counter()
+    for user in users:
+        recommendations[user] = model.recommend(user, recommendations_count)
+    elapsed = time.perf_counter() - start
+    return recommendations, 1000 * elapsed / len(users)
+
+
+@click.command()
+@click.argument('serving_model_dir', type=click.Path(exists=True))
+@click.argument('output_filepath', type=click.Path())
+@click.option('--n', default=20,
+              help='How many recommendations should be returned by the model')
+@click.option('--users-count', default=1000,
+              help='Number of randomly chosen users used for benchmarking.')
+@click.option('--rescore-factor', default=4,
+              help='How many times more candidates than recommendations '
+              'are rescored using exact factors.')
+@click.option('--random-state', type=int, default=None)
+def main(serving_model_dir: str, output_filepath: str, n: int,
+         users_count: int, rescore_factor: int, random_state: int):
+    """Compares quantized item factors with full precision factors.
+
+    Args:
+        serving_model_dir (str): Directory containing the SVD serving model.
+        output_filepath (str): Output filepath.
+        n (int): Number of recommendations to return.
+        users_count (int): Number of users used for benchmarking.
+        rescore_factor (int): How many times more candidates than
+            recommendations are rescored using exact factors.
+        random_state (int): Value for random seed.
+    """
+    _, arrays = read_arrays(serving_model_dir)
+    users = np.random.RandomState(random_state).permutation(
+        arrays['user_ids'])[:users_count].tolist()
+
+    logger.info('Benchmarking %s...', serving_model_dir)
+    results = benchmark_quantization(serving_model_dir, users, n,
+                                     rescore_factor)
+
+    logger.info('Saving results to %s...', output_filepath)
+    pd.DataFrame.from_records(results).to_csv(output_filepath, index=False)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()  # pylint: disable=no-value-for-parameter
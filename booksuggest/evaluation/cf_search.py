@@ -0,0 +1,438 @@
+"""Cross validated parameters search for collaborative filtering models.
+
+Gives the same results as `surprise.model_selection.GridSearchCV` with
+`KFold` splits, but:
+
+* the folds are shuffled once and saved as memory mapped arrays shared
+  by all worker processes, each worker builds a fold trainset once,
+* KNNBaseline baselines are computed once per fold and baselines options,
+  parameters used only during estimation (`k`, `min_k`) reuse a single
+  fitted model, so baselines and similarities are not recomputed,
+* fits are scheduled on a process pool of configurable size.
+
+Besides the exhaustive grid search, successive halving evaluates all
+combinations with a small budget (number of epochs or fraction of the
+training ratings) and repeatedly gives a larger budget only to the best
+of them.
+"""
+import concurrent.futures as cf
+import itertools
+import json
+import logging
+import math
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from surprise import AlgoBase, Dataset, KNNBaseline, Reader
+from surprise.prediction_algorithms.knns import SymmetricAlgo
+from surprise.utils import get_rng
+
+from ..utils.serialization import read_arrays, save_arrays
+from .cf_accuracy_evaluation import evaluate_accuracy
+
+MEASURES = ['rmse', 'mae', 'fcp']
+
+RESOURCES = ['n_epochs', 'fraction']
+
+_ESTIMATION_PARAMS = ('k', 'min_k')
+
+_worker_folds_dir = None
+_worker_algo_class = None
+_worker_fold = None
+
+logger = logging.getLogger(__name__)
+
+
+def grid_search(
+        algo_class: AlgoBase,
+        param_grid: Dict[str, Any],
+        dataset: Dataset,
+        n_splits: int = 5,
+        random_state: int = None,
+        jobs: int = None
+) -> pd.DataFrame:
+    """Evaluates all combinations of parameters values using
+    K-fold cross validation.
+
+    Args:
+        algo_class: Class of the evaluated algorithm.
+        param_grid: Lists of parameters values, `sim_options` and
+            `bsl_options` are dictionaries of lists as in Surprise.
+        dataset: Dataset to run tests on.
+        n_splits: Defaults to 5. Number of folds.
+        random_state: Defaults to None. Seed used for shuffling ratings.
+        jobs: Defaults to the number of processors. Number of processes
+            fitting models.
+
+    Returns:
+        Results in the format of `GridSearchCV.cv_results`,
+        sorted by the RMSE rank.
+    """
+    combinations = parameters_combinations(param_grid)
+    with tempfile.TemporaryDirectory() as folds_dir:
+        save_folds(dataset, n_splits, random_state, folds_dir)
+        scores, fit_times, test_times = cross_validate(
+            algo_class, combinations, folds_dir, jobs)
+
+    return results_frame(combinations, scores, fit_times, test_times)
+
+
+def successive_halving(
+        algo_class: AlgoBase,
+        param_grid: Dict[str, Any],
+        dataset: Dataset,
+        resource: str,
+        min_budget: float,
+        max_budget: float,
+        eta: int = 3,
+        n_splits: int = 5,
+        random_state: int = None,
+        jobs: int = None
+) -> pd.DataFrame:
+    """Evaluates combinations of parameters values using successive
+    halving with K-fold cross validation.
+
+    In each round the remaining combinations are evaluated with the next
+    budget and only `1 / eta` of them with the lowest mean RMSE are kept
+    for the next round. The last round uses the maximal budget.
+
+    Args:
+        algo_class: Class of the evaluated algorithm.
+        param_grid: Lists of parameters values, `sim_options` and
+            `bsl_options` are dictionaries of lists as in Surprise.
+        dataset: Dataset to run tests on.
+        resource: Either `'n_epochs'`, the budget is the number of epochs
+            of the algorithm, or `'fraction'`, the budget is the fraction
+            of the training ratings of each fold used for fitting.
+        min_budget: Budget of the first round.
+        max_budget: Budget of the last round.
+        eta: Defaults to 3. Ratio of budgets of subsequent rounds.
+        n_splits: Defaults to 5. Number of folds.
+        random_state: Defaults to None. Seed used for shuffling ratings.
+        jobs: Defaults to the number of processors. Number of processes
+            fitting models.
+
+    Returns:
+        Results in the format of `GridSearchCV.cv_results` containing the
+        scores of each combination with the largest budget it was given,
+        sorted by the RMSE rank. Combinations which reached later rounds
+        are ranked higher.
+    """
+    if resource not in RESOURCES:
+        raise ValueError(f'Unknown resource: {resource}')
+    if resource == 'fraction' and max_budget > 1:
+        raise ValueError('Fraction of ratings cannot be greater than 1')
+
+    combinations = parameters_combinations(param_grid)
+    evaluated = list(combinations)
+    scores = np.empty((len(combinations), n_splits, len(MEASURES)))
+    fit_times = np.empty((len(combinations), n_splits))
+    test_times = np.empty((len(combinations), n_splits))
+    rounds = np.zeros(len(combinations), dtype=int)
+
+    candidates = np.arange(len(combinations))
+    with tempfile.TemporaryDirectory() as folds_dir:
+        save_folds(dataset, n_splits, random_state, folds_dir)
+        budgets = halving_budgets(min_budget, max_budget, eta)
+        for round_index, budget in enumerate(budgets):
+            logger.info('Round %d: evaluating %d combinations with %s=%s...',
+                        round_index, len(candidates), resource, budget)
+            fraction = 1.0
+            if resource == 'fraction':
+                fraction = budget
+            else:
+                for i in candidates:
+                    evaluated[i] = dict(combinations[i], n_epochs=budget)
+
+            (scores[candidates], fit_times[candidates],
+             test_times[candidates]) = cross_validate(
+                 algo_class, [evaluated[i] for i in candidates], folds_dir,
+                 jobs, fraction)
+            rounds[candidates] = round_index
+
+            kept_count = max(1, len(candidates) // eta)
+            order = np.argsort(scores[candidates, :, 0].mean(axis=1),
+                               kind='mergesort')
+            candidates = np.sort(candidates[order[:kept_count]])
+
+    return results_frame(evaluated, scores, fit_times, test_times, rounds)
+
+
+def halving_budgets(
+        min_budget: float,
+        max_budget: float,
+        eta: int
+) -> List[float]:
+    """Lists budgets of successive halving rounds, each `eta` times
+    larger than the previous one and ending with the maximal budget.
+
+    Budgets are rounded to integers when both limits are integers.
+    """
+    if eta < 2:
+        raise ValueError('eta has to be at least 2')
+    if not 0 < min_budget <= max_budget:
+        raise ValueError('Budgets have to satisfy 0 < min <= max')
+
+    rounds_count = int(math.floor(
+        math.log(max_budget / min_budget, eta) + 1e-9)) + 1
+    budgets = [max_budget / eta ** (rounds_count - 1 - i)
+               for i in range(rounds_count)]
+    if isinstance(min_budget, int) and isinstance(max_budget, int):
+        budgets = [int(round(budget)) for budget in budgets]
+
+    return budgets
+
+
+def parameters_combinations(
+        param_grid: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Lists combinations of parameters values in the order
+    used by `GridSearchCV`.
+    """
+    param_grid = dict(param_grid)
+    for options in ['sim_options', 'bsl_options']:
+        if options in param_grid:
+            param_grid[options] = _product(param_grid[options])
+
+    return _product(param_grid)
+
+
+def _product(param_grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    return [dict(zip(param_grid, values))
+            for values in itertools.product(*param_grid.values())]
+
+
+def save_folds(
+        dataset: Dataset,
+        n_splits: int,
+        random_state: int,
+        dirname: str
+):
+    """Saves ratings of the dataset shuffled as in `surprise.KFold`
+    together with the folds bounds.
+
+    Args:
+        dataset: Dataset to split.
+        n_splits: Number of folds.
+        random_state: Seed used for shuffling ratings.
+        dirname: Directory in which the folds should be saved.
+    """
+    if n_splits > len(dataset.raw_ratings) or n_splits < 2:
+        raise ValueError(f'Incorrect value for n_splits={n_splits}')
+
+    ratings_count = len(dataset.raw_ratings)
+    order = np.arange(ratings_count)
+    get_rng(random_state).shuffle(order)
+
+    fold_sizes = np.full(n_splits, ratings_count // n_splits)
+    fold_sizes[:ratings_count % n_splits] += 1
+    bounds = np.concatenate(([0], np.cumsum(fold_sizes)))
+
+    users, books, ratings, _ = zip(*dataset.raw_ratings)
+    save_arrays({
+        'users': np.array(users)[order],
+        'books': np.array(books)[order],
+        'ratings': np.array(ratings, dtype=np.float64)[order]
+    }, {
+        'bounds': bounds.tolist(),
+        'rating_scale': list(dataset.reader.rating_scale)
+    }, dirname)
+
+
+def cross_validate(
+        algo_class: AlgoBase,
+        combinations: List[Dict[str, Any]],
+        folds_dir: str,
+        jobs: int = None,
+        fraction: float = 1.0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fits and tests the algorithm with each combination of parameters
+    on each fold saved with `save_folds`.
+
+    Combinations differing only in estimation parameters are evaluated
+    on a single fitted model, their fit time is the time of that fit.
+    With `fraction` lower than 1 models are fitted on a random part
+    of the training ratings of each fold.
+
+    Returns:
+        Scores of shape `(combinations, folds, measures)`, fit times
+        and test times of shape `(combinations, folds)`.
+    """
+    metadata, _ = read_arrays(folds_dir)
+    n_splits = len(metadata['bounds']) - 1
+    groups = _fit_groups(algo_class, combinations)
+
+    scores = np.empty((len(combinations), n_splits, len(MEASURES)))
+    fit_times = np.empty((len(combinations), n_splits))
+    test_times = np.empty((len(combinations), n_splits))
+
+    tasks = [(fold, fraction, [combinations[i] for i in group])
+             for fold in range(n_splits) for group in groups]
+    logger.info('Fitting %d models on %d folds...', len(tasks), n_splits)
+    with cf.ProcessPoolExecutor(max_workers=jobs,
+                                initializer=_init_worker,
+                                initargs=(folds_dir, algo_class)) as executor:
+        results = executor.map(_fit_and_score, tasks)
+        for (fold, _, _), group, result in zip(tasks, groups * n_splits,
+                                            results):
+            for i, (scores_values, fit_time, test_time) in zip(group, result):
+                scores[i, fold] = scores_values
+                fit_times[i, fold] = fit_time
+                test_times[i, fold] = test_time
+
+    return scores, fit_times, test_times
+
+
+def _fit_groups(
+        algo_class: AlgoBase,
+        combinations: List[Dict[str, Any]]
+) -> List[List[int]]:
+    """Groups indices of combinations which can share a fitted model.
+    """
+    groups = dict()
+    for i, params in enumerate(combinations):
+        key = params
+        if issubclass(algo_class, SymmetricAlgo):
+            key = {name: value for name, value in params.items()
+                   if name not in _ESTIMATION_PARAMS}
+        groups.setdefault(_options_key(key), []).append(i)
+
+    return list(groups.values())
+
+
+def _options_key(options: Dict[str, Any]) -> str:
+    return json.dumps(options, sort_keys=True, default=str)
+
+
+def results_frame(
+        combinations: List[Dict[str, Any]],
+        scores: np.ndarray,
+        fit_times: np.ndarray,
+        test_times: np.ndarray,
+        rounds: np.ndarray = None
+) -> pd.DataFrame:
+    """Creates a data frame with the same columns as one created from
+    `GridSearchCV.cv_results`, sorted by the RMSE rank.
+
+    If rounds of successive halving are given, combinations from later
+    rounds are ranked higher regardless of their scores.
+    """
+    results = dict()
+    for m, measure in enumerate(MEASURES):
+        measure_scores = scores[:, :, m]
+        for split in range(measure_scores.shape[1]):
+            results[f'split{split}_test_{measure}'] = measure_scores[:, split]
+
+        mean_scores = measure_scores.mean(axis=1)
+        results[f'mean_test_{measure}'] = mean_scores
+        results[f'std_test_{measure}'] = measure_scores.std(axis=1)
+
+        if rounds is None:
+            indices = mean_scores.argsort()
+            ranks = np.empty_like(indices)
+            if measure == 'fcp':
+                ranks[indices] = np.arange(len(indices), 0, -1)
+            else:
+                ranks[indices] = np.arange(len(indices)) + 1
+        else:
+            sign = -1 if measure == 'fcp' else 1
+            indices = np.lexsort((sign * mean_scores, -rounds))
+            ranks = np.empty_like(indices)
+            ranks[indices] = np.arange(len(indices)) + 1
+        results[f'rank_test_{measure}'] = ranks
+
+    for name, times in [('fit', fit_times), ('test', test_times)]:
+        results[f'mean_{name}_time'] = times.mean(axis=1)
+        results[f'std_{name}_time'] = times.std(axis=1)
+
+    results['params'] = combinations
+    for param in combinations[0]:
+        results['param_' + param] = [params[param] for params in combinations]
+
+    return pd.DataFrame.from_dict(results).sort_values('rank_test_rmse')
+
+
+def _init_worker(folds_dir: str, algo_class: AlgoBase):
+    # pylint: disable=global-statement
+    global _worker_folds_dir, _worker_algo_class
+    _worker_folds_dir = folds_dir
+    _worker_algo_class = algo_class
+
+
+def _fit_and_score(
+        task: Tuple[int, float, List[Dict[str, Any]]]
+) -> List[Tuple[List[float], float, float]]:
+    fold, fraction, combinations = task
+    trainset, testset, baselines = _read_fold(fold, fraction)
+
+    algo = _worker_algo_class(**combinations[0])
+    start = time.perf_counter()
+    if isinstance(algo, KNNBaseline):
+        _fit_knn_baseline(algo, trainset, baselines)
+    else:
+        algo.fit(trainset)
+    fit_time = time.perf_counter() - start
+
+    results = []
+    for params in combinations:
+        for name in _ESTIMATION_PARAMS:
+            if name in params:
+                setattr(algo, name, params[name])
+
+        start = time.perf_counter()
+        scores = evaluate_accuracy(algo, testset)
+        test_time = time.perf_counter() - start
+        results.append((list(scores), fit_time, test_time))
+
+    return results
+
+
+def _read_fold(fold: int, fraction: float):
+    """Builds the trainset and testset of the fold, the last read fold
+    is kept together with baselines computed on it.
+
+    Ratings are already shuffled, so the given fraction of the training
+    ratings is their prefix.
+    """
+    global _worker_fold  # pylint: disable=global-statement
+    if _worker_fold is not None and _worker_fold[0] == (fold, fraction):
+        return _worker_fold[1:]
+
+    metadata, arrays = read_arrays(_worker_folds_dir)
+    start, stop = metadata['bounds'][fold:fold + 2]
+    train = np.r_[0:start, stop:len(arrays['ratings'])]
+    train = train[:int(math.ceil(fraction * len(train)))]
+    raw_trainset = list(zip(arrays['users'][train].tolist(),
+                            arrays['books'][train].tolist(),
+                            arrays['ratings'][train].tolist(),
+                            itertools.repeat(None)))
+
+    reader = Reader(rating_scale=tuple(metadata['rating_scale']))
+    trainset = Dataset(reader).construct_trainset(raw_trainset)
+    testset = (arrays['users'][start:stop],
+               arrays['books'][start:stop],
+               np.asarray(arrays['ratings'][start:stop]))
+
+    _worker_fold = ((fold, fraction), trainset, testset, dict())
+    return _worker_fold[1:]
+
+
+def _fit_knn_baseline(
+        algo: KNNBaseline,
+        trainset,
+        baselines: Dict[str, Tuple[np.ndarray, np.ndarray]]
+):
+    """Same as `KNNBaseline.fit`, baselines are taken from the given
+    dictionary if they were already computed with the same options.
+    """
+    SymmetricAlgo.fit(algo, trainset)
+    key = _options_key(algo.bsl_options)
+    if key in baselines:
+        algo.bu, algo.bi = baselines[key]
+    baselines[key] = algo.compute_baselines()
+    algo.bx, algo.by = algo.switch(algo.bu, algo.bi)
+    algo.sim = algo.compute_similarities()
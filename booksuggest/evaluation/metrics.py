@@ -1,7 +1,10 @@
 """Functions calculating metric scores used for recommendation models
 evaluation.
 """
-from typing import List, Tuple
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
 
 
 def precision(recommendations: List[int], ground_truth: List[int]) -> float:
@@ -10,13 +13,9 @@ def precision(recommendations: List[int], ground_truth: List[int]) -> float:
 
     TODO add latex equation
     """
-    relevant_retrieved = len(set(recommendations) & set(ground_truth))
-    retrieved = len(recommendations)
-    if retrieved == 0:
-        return 0
-
-    precision_score = relevant_retrieved / retrieved
-    return precision_score
+    recommended, relevant = _single_user_matrices(recommendations,
+                                                  ground_truth)
+    return float(batch_precision(recommended, relevant)[0])
 
 
 def recall(recommendations: List[int], ground_truth: List[int]) -> float:
@@ -25,13 +24,9 @@ def recall(recommendations: List[int], ground_truth: List[int]) -> float:
 
     TODO add latex equation
     """
-    relevant_retrieved = len(set(recommendations) & set(ground_truth))
-    relevant = len(ground_truth)
-    if relevant == 0:
-        return 0
-
-    accuracy_score = relevant_retrieved / relevant
-    return accuracy_score
+    recommended, relevant = _single_user_matrices(recommendations,
+                                                  ground_truth)
+    return float(batch_recall(recommended, relevant)[0])
 
 
 def precision_thresholded(recommendations: List[Tuple[int, float]],
@@ -42,15 +37,10 @@ def precision_thresholded(recommendations: List[Tuple[int, float]],
 
     TODO add latex equation
     """
-    valid_recommendations = [x[0] for x in recommendations
-                             if x[1] >= threshold]
-    relevant_retrieved = len(set(valid_recommendations) & set(ground_truth))
-    retrieved = len(recommendations)
-    if retrieved == 0:
-        return 0
-
-    precision_score = relevant_retrieved / retrieved
-    return precision_score
+    recommended, relevant, scores = _single_user_matrices_with_scores(
+        recommendations, ground_truth)
+    return float(batch_precision_thresholded(
+        recommended, relevant, scores, threshold)[0])
 
 
 def recall_thresholded(recommendations: List[Tuple[int, float]],
@@ -61,6 +51,333 @@ def recall_thresholded(recommendations: List[Tuple[int, float]],
 
     TODO add latex equation
     """
-    valid_recommendations = [x[0] for x in recommendations
-                             if x[1] >= threshold]
-    return recall(valid_recommendations, ground_truth)
+    recommended, relevant, scores = _single_user_matrices_with_scores(
+        recommendations, ground_truth)
+    return float(batch_recall_thresholded(
+        recommended, relevant, scores, threshold)[0])
+
+
+def recommendations_matrix(
+        recommendations: Sequence[Sequence[int]],
+        items_count: int,
+        scores: Sequence[Sequence[float]] = None
+) -> Tuple[sparse.csr_matrix, sparse.csr_matrix]:
+    """Converts lists of recommended items to sparse matrices used
+    by the batch metrics.
+
+    Args:
+        recommendations: Ordered recommended items (column indices)
+            of each user.
+        items_count: Number of items in the catalog.
+        scores: Defaults to None. Scores of the recommended items.
+
+    Returns:
+        Matrix with 1-based ranks of the recommended items and matrix
+        with their scores (None if scores were not given).
+    """
+    lengths = [len(items) for items in recommendations]
+    indptr = np.append(0, np.cumsum(lengths))
+    indices = np.fromiter((item for items in recommendations
+                           for item in items), dtype=np.int64,
+                          count=indptr[-1])
+    ranks = np.concatenate([np.arange(1, length + 1) for length in lengths]
+                           + [np.empty(0, dtype=np.int64)])
+    shape = (len(recommendations), items_count)
+    recommended = sparse.csr_matrix((ranks, indices, indptr), shape=shape)
+
+    scores_matrix = None
+    if scores is not None:
+        data = np.fromiter((score for items_scores in scores
+                            for score in items_scores), dtype=np.float64,
+                           count=indptr[-1])
+        scores_matrix = sparse.csr_matrix((data, indices, indptr),
+                                          shape=shape)
+    return recommended, scores_matrix
+
+
+def relevance_matrix(
+        ground_truth: Sequence[Sequence[int]],
+        items_count: int
+) -> sparse.csr_matrix:
+    """Converts lists of relevant items (column indices) of each user
+    to a sparse matrix, values are numbers of occurrences of the items.
+    """
+    rows = np.repeat(np.arange(len(ground_truth)),
+                     [len(items) for items in ground_truth])
+    columns = np.fromiter((item for items in ground_truth for item in items),
+                          dtype=np.int64, count=len(rows))
+    return sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int64), (rows, columns)),
+        shape=(len(ground_truth), items_count))
+
+
+def hits_by_rank(
+        recommended: sparse.csr_matrix,
+        relevant: sparse.csr_matrix,
+        k: int = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Marks relevant recommendations, cumulative sums of the result give
+    the numbers of hits for all cut-offs up to `k` at once.
+
+    Args:
+        recommended: Users by items matrix of 1-based ranks
+            of the recommended items.
+        relevant: Users by items matrix of relevant items.
+        k: Defaults to None. Number of recommendations taken into
+            account, all recommendations are used if None.
+
+    Returns:
+        Users by ranks matrix with ones for relevant recommendations
+        and the number of the top `k` recommendations of each user.
+        An item recommended multiple times to a user is a hit only
+        at its first rank, but all its recommendations are counted.
+    """
+    # duplicated entries are kept by the coo format, unlike by csr
+    # operations, which would add up their ranks
+    top_k = sparse.coo_matrix(recommended)
+    kept = top_k.data > 0
+    if k is not None:
+        kept &= top_k.data <= k
+    rows, columns = top_k.row[kept], top_k.col[kept]
+    ranks = top_k.data[kept].astype(np.int64)
+    if k is None:
+        k = int(ranks.max()) if len(ranks) else 0
+
+    order = np.lexsort((ranks, columns, rows))
+    rows, columns, ranks = rows[order], columns[order], ranks[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+    first_ranks = sparse.csr_matrix(
+        (ranks[first], (rows[first], columns[first])), shape=top_k.shape)
+
+    hit_ranks = sparse.coo_matrix(
+        first_ranks.multiply(relevant.astype(bool)))
+    hits = np.zeros((top_k.shape[0], k))
+    hits[hit_ranks.row, hit_ranks.data.astype(np.int64) - 1] = 1
+    return hits, np.bincount(rows, minlength=top_k.shape[0])
+
+
+def batch_hits(
+        recommended: sparse.csr_matrix,
+        relevant: sparse.csr_matrix,
+        k: int = None
+) -> np.ndarray:
+    """Counts relevant items among the top `k` recommendations of each user.
+    """
+    hits, _ = hits_by_rank(recommended, relevant, k)
+    return hits.sum(axis=1).astype(np.int64)
+
+
+def batch_precision(
+        recommended: sparse.csr_matrix,
+        relevant: sparse.csr_matrix,
+        k: int = None
+) -> np.ndarray:
+    """Calculates the precision of the top `k` recommendations of each user.
+
+    Args:
+        recommended: Users by items matrix of 1-based ranks
+            of the recommended items.
+        relevant: Users by items matrix of relevant items.
+        k: Defaults to None. Number of recommendations taken into
+            account, all recommendations are used if None.
+
+    Returns:
+        Precision of each user, 0 for users without recommendations.
+    """
+    hits, retrieved = hits_by_rank(recommended, relevant, k)
+    return _safe_divide(hits.sum(axis=1), retrieved)
+
+
+def batch_recall(
+        recommended: sparse.csr_matrix,
+        relevant: sparse.csr_matrix,
+        k: int = None
+) -> np.ndarray:
+    """Calculates the recall of the top `k` recommendations of each user,
+    0 for users without relevant items. Repeated relevant items
+    are counted multiple times in the denominator.
+    """
+    hits, _ = hits_by_rank(recommended, relevant, k)
+    relevant_count = np.asarray(relevant.sum(axis=1)).ravel()
+    return _safe_divide(hits.sum(axis=1), relevant_count)
+
+
+def batch_precision_thresholded(
+        recommended: sparse.csr_matrix,
+        relevant: sparse.csr_matrix,
+        scores: sparse.csr_matrix,
+        threshold: float,
+        k: int = None
+) -> np.ndarray:
+    """Same as `batch_precision`, but recommendations scored below
+    the threshold are never counted as relevant.
+
+    Args:
+        scores: Scores of the recommended items, with the same
+            sparsity structure as `recommended`.
+        threshold: Minimal score of a valid recommendation.
+    """
+    _, retrieved = hits_by_rank(recommended, relevant, k)
+    valid = _valid_recommendations(recommended, scores, threshold)
+    hits, _ = hits_by_rank(valid, relevant, k)
+    return _safe_divide(hits.sum(axis=1), retrieved)
+
+
+def batch_recall_thresholded(
+        recommended: sparse.csr_matrix,
+        relevant: sparse.csr_matrix,
+        scores: sparse.csr_matrix,
+        threshold: float,
+        k: int = None
+) -> np.ndarray:
+    """Same as `batch_recall`, but recommendations scored below
+    the threshold are never counted as relevant.
+    """
+    valid = _valid_recommendations(recommended, scores, threshold)
+    return batch_recall(valid, relevant, k)
+
+
+def batch_ndcg(
+        recommended: sparse.csr_matrix,
+        relevant: sparse.csr_matrix,
+        k: int = None
+) -> np.ndarray:
+    """Calculates the normalized discounted cumulative gain of the top `k`
+    recommendations of each user with binary relevance, 0 for users
+    without relevant items.
+    """
+    hits, _ = hits_by_rank(recommended, relevant, k)
+    discounts = 1 / np.log2(np.arange(2, hits.shape[1] + 2))
+    dcg = hits.dot(discounts)
+
+    ideal_hits = np.minimum(relevant.getnnz(axis=1), hits.shape[1])
+    ideal_dcg = np.append(0, np.cumsum(discounts))[ideal_hits]
+    return _safe_divide(dcg, ideal_dcg)
+
+
+def batch_average_precision(
+        recommended: sparse.csr_matrix,
+        relevant: sparse.csr_matrix,
+        k: int = None
+) -> np.ndarray:
+    """Calculates the average precision of the top `k` recommendations
+    of each user, the mean of the result is MAP@k.
+    """
+    hits, _ = hits_by_rank(recommended, relevant, k)
+    precisions = np.cumsum(hits, axis=1) / np.arange(1, hits.shape[1] + 1)
+    relevant_count = np.minimum(relevant.getnnz(axis=1), hits.shape[1])
+    return _safe_divide((precisions * hits).sum(axis=1), relevant_count)
+
+
+def batch_reciprocal_rank(
+        recommended: sparse.csr_matrix,
+        relevant: sparse.csr_matrix,
+        k: int = None
+) -> np.ndarray:
+    """Calculates the reciprocal rank of the first relevant recommendation
+    among the top `k` of each user, the mean of the result is MRR.
+    """
+    hits, _ = hits_by_rank(recommended, relevant, k)
+    first_hit = np.argmax(hits, axis=1)
+    return np.where(hits.any(axis=1), 1 / (first_hit + 1), 0.0)
+
+
+def batch_hit_rate(
+        recommended: sparse.csr_matrix,
+        relevant: sparse.csr_matrix,
+        k: int = None
+) -> np.ndarray:
+    """Checks whether any of the top `k` recommendations of each user
+    is relevant, the mean of the result is the hit rate.
+    """
+    hits, _ = hits_by_rank(recommended, relevant, k)
+    return hits.any(axis=1).astype(np.float64)
+
+
+def catalog_coverage(recommended: sparse.csr_matrix, k: int = None) -> float:
+    """Calculates the fraction of catalog items which appear among
+    the top `k` recommendations of any user.
+    """
+    top_k = _top_k(recommended, k)
+    return len(np.unique(top_k.indices)) / recommended.shape[1]
+
+
+def batch_novelty(
+        recommended: sparse.csr_matrix,
+        popularity: np.ndarray,
+        k: int = None
+) -> np.ndarray:
+    """Calculates the mean self-information `-log2(popularity)` of the top
+    `k` recommendations of each user, 0 for users without recommendations.
+
+    Args:
+        popularity: Fraction of users who interacted with each item.
+    """
+    top_k = _top_k(recommended, k)
+    information = sparse.csr_matrix(
+        (-np.log2(popularity[top_k.indices]), top_k.indices, top_k.indptr),
+        shape=top_k.shape)
+    return _safe_divide(np.asarray(information.sum(axis=1)).ravel(),
+                        top_k.getnnz(axis=1))
+
+
+def _top_k(recommended: sparse.csr_matrix, k: int) -> sparse.csr_matrix:
+    recommended = sparse.csr_matrix(recommended, copy=True)
+    if k is not None:
+        recommended.data[recommended.data > k] = 0
+    recommended.eliminate_zeros()
+    return recommended
+
+
+def _valid_recommendations(
+        recommended: sparse.csr_matrix,
+        scores: sparse.csr_matrix,
+        threshold: float
+) -> sparse.csr_matrix:
+    recommended = sparse.csr_matrix(recommended, copy=True)
+    scores = sparse.csr_matrix(scores, copy=True)
+    # sorting could pair duplicated items with scores of other occurrences,
+    # matrices created by `recommendations_matrix` are already aligned
+    if not (np.array_equal(recommended.indptr, scores.indptr)
+            and np.array_equal(recommended.indices, scores.indices)):
+        recommended.sort_indices()
+        scores.sort_indices()
+    recommended.data = np.where(scores.data >= threshold,
+                                recommended.data, 0)
+    recommended.eliminate_zeros()
+    return recommended
+
+
+def _safe_divide(numerator, denominator) -> np.ndarray:
+    numerator = np.asarray(numerator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)),
+                     where=np.asarray(denominator) != 0)
+
+
+def _single_user_matrices(recommendations, ground_truth):
+    codes = _item_codes(recommendations, ground_truth)
+    recommended, _ = recommendations_matrix(
+        [[codes[item] for item in recommendations]], len(codes))
+    relevant = relevance_matrix([[codes[item] for item in ground_truth]],
+                                len(codes))
+    return recommended, relevant
+
+
+def _single_user_matrices_with_scores(recommendations, ground_truth):
+    items = [item for item, _ in recommendations]
+    codes = _item_codes(items, ground_truth)
+    recommended, scores = recommendations_matrix(
+        [[codes[item] for item in items]], len(codes),
+        [[score for _, score in recommendations]])
+    relevant = relevance_matrix([[codes[item] for item in ground_truth]],
+                                len(codes))
+    return recommended, relevant, scores
+
+
+def _item_codes(*items_lists) -> Dict[int, int]:
+    codes = dict()
+    for items in items_lists:
+        for item in items:
+            codes.setdefault(item, len(codes))
+    return codes
@@ -6,11 +6,14 @@ when creating book representations.
 """
 
 import logging
-from typing import List
+import os
+from typing import List, NamedTuple
 import click
 import numpy as np
 import pandas as pd
 
+from scipy import sparse
+
 
 class InvalidTagFeaturesError(Exception):
     """Exception signifying that the passed
@@ -18,6 +21,33 @@ class InvalidTagFeaturesError(Exception):
     """
 
 
+class TagFeatures(NamedTuple):
+    """Sparse tag features of books.
+
+    Attributes:
+        features: Matrix with a row for each book and a column for each tag.
+        book_ids: Book ids of the rows.
+        tag_names: Tag names of the columns.
+    """
+    features: sparse.csr_matrix
+    book_ids: np.ndarray
+    tag_names: np.ndarray
+
+    @classmethod
+    def from_frame(cls, tag_features: pd.DataFrame) -> 'TagFeatures':
+        """Converts a data frame indexed by book ids to sparse features.
+        """
+        return cls(sparse.csr_matrix(tag_features.values),
+                   tag_features.index.values, tag_features.columns.values)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Converts features to a dense data frame indexed by book ids,
+        columns are positions of tags.
+        """
+        return pd.DataFrame(self.features.toarray(),
+                            index=pd.Index(self.book_ids, name='book_id'))
+
+
 def build_all_tag_features(
         book_tags: pd.DataFrame,
         tags: pd.DataFrame
@@ -32,14 +62,93 @@ def build_all_tag_features(
         book_tags: Data frame containing book_id and tag_id columns.
         tags: Data frame containing tag_id and tag_names columns.
     """
-    book_tags_grouped = book_tags.groupby(by='book_id')
-    tag_features = book_tags_grouped.apply(
-        lambda single_book_tags: pd.Series(
-            build_tag_features(single_book_tags, tags)
-        )
-    )
+    return build_sparse_tag_features(book_tags, tags).to_frame()
+
+
+def build_sparse_tag_features(
+        book_tags: pd.DataFrame,
+        tags: pd.DataFrame
+) -> TagFeatures:
+    """Calculates tag features of all books as a sparse matrix.
+
+    Tag names are mapped to columns using categorical codes and the
+    matrix is built from ``(book, tag, count)`` triplets at once, so
+    values are the same as of `build_tag_features` applied to each book.
+    Data for which per book features are not well defined, i.e. repeated
+    tags of a book or books whose counts sum to zero, is rejected.
+
+    Args:
+        book_tags: Data frame containing book_id, tag_name and count columns.
+        tags: Data frame containing tag_name column.
+
+    Returns:
+        TagFeatures: Features with rows of sorted book ids and columns
+            of tags in order of the tags data frame.
 
-    return tag_features.reset_index().set_index('book_id')
+    Raises:
+        InvalidTagFeaturesError: Raised when the data is invalid.
+    """
+    required_columns = {'book_id', 'tag_name', 'count'}
+    if not required_columns <= set(book_tags.columns) \
+            or not validate_tags_data(tags) \
+            or book_tags['book_id'].isnull().any() \
+            or book_tags.duplicated(['book_id', 'tag_name']).any():
+        raise InvalidTagFeaturesError
+
+    tag_names = tags['tag_name'].values
+    tag_codes = pd.Categorical(book_tags['tag_name'],
+                               categories=tag_names).codes
+    if (tag_codes == -1).any():
+        raise InvalidTagFeaturesError
+
+    book_codes, book_ids = pd.factorize(book_tags['book_id'], sort=True)
+    features = sparse.csr_matrix(
+        (book_tags['count'].values.astype(np.float64),
+         (book_codes, tag_codes)),
+        shape=(len(book_ids), len(tag_names)))
+    features.eliminate_zeros()
+
+    counts_sums = np.asarray(features.sum(axis=1)).ravel()
+    if (counts_sums == 0).any():
+        raise InvalidTagFeaturesError
+
+    features.data /= np.repeat(counts_sums, np.diff(features.indptr))
+
+    return TagFeatures(features, np.asarray(book_ids), tag_names)
+
+
+def save_tag_features(filepath: str, tag_features: TagFeatures):
+    """Saves tag features in an uncompressed .npz file containing
+    the sparse matrix arrays, book ids and tag names.
+
+    Args:
+        filepath: Output filepath, the file is replaced atomically.
+        tag_features: Features to save.
+    """
+    features = tag_features.features.tocsr()
+    temporary_path = filepath + '.tmp'
+    with open(temporary_path, 'wb') as save_file:
+        np.savez(save_file,
+                 data=features.data,
+                 indices=features.indices,
+                 indptr=features.indptr,
+                 shape=np.array(features.shape),
+                 book_ids=np.asarray(tag_features.book_ids),
+                 tag_names=np.asarray(tag_features.tag_names, dtype=str))
+    os.replace(temporary_path, filepath)
+
+
+def read_tag_features(filepath: str) -> TagFeatures:
+    """Reads tag features saved with `save_tag_features`.
+
+    Args:
+        filepath: Path to the .npz file with tag features.
+    """
+    with np.load(filepath) as arrays:
+        features = sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']),
+            shape=tuple(arrays['shape']))
+        return TagFeatures(features, arrays['book_ids'], arrays['tag_names'])
 
 
 def build_tag_features(
@@ -124,7 +233,9 @@ def validate_tags_data(tags: pd.DataFrame) -> bool:
 @click.command()
 @click.argument('book_tags_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
-def main(book_tags_filepath: str, output_filepath: str):
+@click.option('--csv_filepath', type=click.Path(), default=None,
+              help='Additionally saves features as a dense .csv file.')
+def main(book_tags_filepath: str, output_filepath: str, csv_filepath: str):
     """
     Calculates tag features for all books present in the book
     tags data frame and saves them to the specified output filepath.
@@ -132,18 +243,22 @@ def main(book_tags_filepath: str, output_filepath: str):
     Args:
         book_tags: Data frame containg information about tags
             assigned to books.
-        output_filepath: Speficies the files in which the results should
-            be saved.
+        output_filepath: Speficies the .npz file in which the results
+            should be saved.
+        csv_filepath: Speficies the .csv file in which dense results
+            should be saved, e.g. for notebooks.
 
     """
     book_tags = pd.read_csv(book_tags_filepath)
     tags = pd.DataFrame({'tag_name': list(book_tags['tag_name'].unique())})
 
-    tag_features_df = build_all_tag_features(
+    tag_features = build_sparse_tag_features(
         book_tags, tags
     )
 
-    tag_features_df.to_csv(output_filepath)
+    save_tag_features(output_filepath, tag_features)
+    if csv_filepath is not None:
+        tag_features.to_frame().to_csv(csv_filepath)
 
 
 if __name__ == '__main__':
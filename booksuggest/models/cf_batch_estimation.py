@@ -0,0 +1,187 @@
+"""Vectorized estimation of ratings of a single user for many books.
+
+Surprise algorithms estimate ratings one (user, book) pair at a time.
+Estimators from this module compute ratings of a user for all candidate
+books at once, giving the same results as the original algorithms.
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+
+from surprise import KNNBaseline
+
+
+class KnnBaselineBatchEstimator():
+    """Batch version of the item based KNNBaseline estimation.
+
+    For each candidate book the `k` most similar books among the books rated
+    by the user are chosen (ties are resolved in the order of user ratings,
+    as in Surprise) and their baseline adjusted ratings are averaged with
+    positive similarities as weights.
+
+    Args:
+        global_mean: Mean of all ratings.
+        bu: Users baselines.
+        bi: Books baselines.
+        sim: Symmetric books similarity matrix.
+        k: Maximal number of neighbors.
+        min_k: Minimal number of neighbors with positive similarity.
+        ratings_indptr: Offsets of users ratings (CSR format).
+        ratings_indices: Rated books of users (CSR format).
+        ratings_data: Ratings of users (CSR format).
+    """
+
+    def __init__(
+            self,
+            global_mean: float,
+            bu: np.ndarray,
+            bi: np.ndarray,
+            sim: np.ndarray,
+            k: int,
+            min_k: int,
+            ratings_indptr: np.ndarray,
+            ratings_indices: np.ndarray,
+            ratings_data: np.ndarray
+    ):
+        self._global_mean = global_mean
+        self._bu = bu
+        self._bi = bi
+        self._sim = sim
+        self._k = k
+        self._min_k = min_k
+        self._ratings_indptr = ratings_indptr
+        self._ratings_indices = ratings_indices
+        self._ratings_data = ratings_data
+
+    @classmethod
+    def from_algorithm(
+            cls,
+            algorithm: KNNBaseline
+    ) -> 'KnnBaselineBatchEstimator':
+        """Creates an estimator using data of the trained algorithm.
+
+        Args:
+            algorithm: Trained item based KNNBaseline algorithm.
+
+        Raises:
+            ValueError: Raised when the algorithm is user based.
+        """
+        if algorithm.sim_options.get('user_based', True):
+            raise ValueError('Only item based KNN models are supported')
+
+        ratings = user_ratings_arrays(algorithm.trainset)
+        return cls(algorithm.trainset.global_mean,
+                   np.asarray(algorithm.bu),
+                   np.asarray(algorithm.bi),
+                   np.asarray(algorithm.sim),
+                   algorithm.k,
+                   algorithm.min_k,
+                   ratings['ratings_indptr'],
+                   ratings['ratings_indices'],
+                   ratings['ratings_data'])
+
+    def estimate(self, user: int, items: np.ndarray) -> np.ndarray:
+        """Estimates unclipped ratings of the user for the given books.
+
+        Args:
+            user: Inner id of the user.
+            items: Inner ids of books.
+        """
+        return self.estimate_with_details(user, items)[0]
+
+    def estimate_with_details(
+            self,
+            user: int,
+            items: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Same as `estimate`, additionally returns the number of neighbors
+        with positive similarity used for each book.
+        """
+        start, end = self._ratings_indptr[user:user + 2]
+        rated = self._ratings_indices[start:end]
+        ratings = self._ratings_data[start:end]
+
+        baseline = self._global_mean + self._bu[user]
+        residuals = ratings - (baseline + self._bi[rated])
+        # the similarity matrix is symmetric, reading rows of the rated books
+        # touches only a small part of a memory mapped matrix
+        similarities = self._sim[rated][:, items]
+
+        weights = np.where(
+            self._top_k_neighbors(similarities) & (similarities > 0),
+            similarities, 0)
+        sum_sim = weights.sum(axis=0)
+        sum_ratings = residuals.dot(weights)
+        actual_k = np.count_nonzero(weights, axis=0)
+        sum_ratings[actual_k < self._min_k] = 0
+
+        neighbors_part = np.divide(sum_ratings, sum_sim,
+                                   out=np.zeros_like(sum_ratings),
+                                   where=sum_sim != 0)
+        return baseline + self._bi[items] + neighbors_part, actual_k
+
+    def _top_k_neighbors(self, similarities: np.ndarray) -> np.ndarray:
+        """Marks the `k` highest similarities in each column, ties are
+        resolved in favour of lower rows.
+        """
+        if len(similarities) <= self._k:
+            return np.ones(similarities.shape, dtype=bool)
+
+        kth_similarity = -np.partition(
+            -similarities, self._k - 1, axis=0)[self._k - 1]
+        above = similarities > kth_similarity
+        ties = similarities == kth_similarity
+        missing = self._k - above.sum(axis=0)
+        return above | (ties & (np.cumsum(ties, axis=0) <= missing))
+
+
+def user_ratings_arrays(trainset) -> Dict[str, np.ndarray]:
+    """Converts ratings of all users to the CSR format, books are kept
+    in the order of the trainset.
+
+    Args:
+        trainset (Trainset): Surprise trainset.
+
+    Returns:
+        Offsets, books and ratings arrays.
+    """
+    user_ratings = [trainset.ur[u] for u in trainset.all_users()]
+    indptr = np.cumsum([0] + [len(ratings) for ratings in user_ratings])
+    indices = [item for ratings in user_ratings for item, _ in ratings]
+    data = [rating for ratings in user_ratings for _, rating in ratings]
+    return {
+        'ratings_indptr': indptr.astype(np.int64),
+        'ratings_indices': np.array(indices, dtype=np.int64),
+        'ratings_data': np.array(data, dtype=np.float64)
+    }
+
+
+def known_items_bitmap(
+        trainset,
+        item_positions: np.ndarray = None
+) -> np.ndarray:
+    """Creates a bitmap of books rated by each user, packed into bytes
+    the same way as by `np.packbits`. Bits are set directly in the packed
+    rows, so no boolean matrix of all users and books is created.
+
+    Args:
+        trainset (Trainset): Surprise trainset.
+        item_positions (np.ndarray, optional): Defaults to None. Positions
+            of bits of books indexed by inner ids, inner ids are used
+            if None.
+
+    Returns:
+        Array of shape ``(n_users, ceil(n_items / 8))``.
+    """
+    ratings = user_ratings_arrays(trainset)
+    users = np.repeat(np.arange(trainset.n_users),
+                      np.diff(ratings['ratings_indptr']))
+    positions = ratings['ratings_indices']
+    if item_positions is not None:
+        positions = item_positions[positions]
+
+    bitmap = np.zeros((trainset.n_users, (trainset.n_items + 7) // 8),
+                      dtype=np.uint8)
+    np.bitwise_or.at(bitmap, (users, positions >> 3),
+                     (0x80 >> (positions & 7)).astype(np.uint8))
+    return bitmap
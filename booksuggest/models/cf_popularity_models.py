@@ -0,0 +1,31 @@
+import logging
+
+import click
+
+from .cf_recommend_models import PopularityRecommendationModel
+from ..utils.serialization import save_object
+
+
+@click.command()
+@click.argument('input_filepath', type=click.Path(exists=True))
+@click.argument('output_filepath', type=click.Path())
+@click.option('--method', type=click.Choice(['damped-mean', 'baseline']),
+              default='damped-mean',
+              help='Popularity score used for ranking books.')
+@click.option('--damping', type=float, default=10,
+              help='Number of global mean ratings added to each book.')
+def main(input_filepath: str, output_filepath: str, method: str,
+         damping: float):
+    logger = logging.getLogger(__name__)
+
+    logger.info('Training popularity model...')
+    popularity_model = PopularityRecommendationModel(input_filepath)
+    popularity_model.train(method=method, damping=damping)
+
+    logger.info('Saving popularity model to %s...', output_filepath)
+    save_object(popularity_model, output_filepath)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()  # pylint: disable=no-value-for-parameter
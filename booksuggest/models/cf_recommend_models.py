@@ -1,12 +1,20 @@
+import logging
+import os
 from abc import ABCMeta, abstractmethod, abstractproperty
+from collections import defaultdict
 from typing import Dict, Iterable, List, Tuple
 
+import numpy as np
 import pandas as pd
 
-from surprise import Dataset, Prediction, Reader
-from surprise import KNNBaseline, SlopeOne, SVD
+from surprise import AlgoBase, Dataset, Prediction, Reader, Trainset
+from surprise import BaselineOnly, KNNBaseline, SlopeOne, SVD
 
+from .cf_batch_estimation import KnnBaselineBatchEstimator, known_items_bitmap
 from .model_exceptions import UntrainedModelError
+from ..utils.serialization import is_arrays_dir, read_arrays, save_arrays
+
+POPULARITY_FALLBACK_EXTENSION = '.popularity'
 
 
 class ICfRecommendationModel(metaclass=ABCMeta):
@@ -39,6 +47,14 @@ class ICfRecommendationModel(metaclass=ABCMeta):
             Dict[int, float]: `book_id: estimated_rating` pairs
         """
 
+    @abstractmethod
+    def knows_user(self, user_id: int) -> bool:
+        """Checks whether the user is part of the training set.
+
+        Args:
+            user_id (int): Id of the user.
+        """
+
     @abstractmethod
     def test(self, ratings: List[Tuple[int, int, float]]) -> List[Prediction]:
         """Tests the model on the given ground-truth dataset.
@@ -107,7 +123,7 @@ class SurpriseBasedModel(ICfRecommendationModel):
             raise UntrainedModelError
 
         to_predict = [x for x in self._generate_antitest(user_id)]
-        predictions = self._algorithm.test(to_predict)
+        predictions = self.test(to_predict)
 
         top_n = sorted(predictions, key=lambda x: x.est, reverse=True)[
             :recommendations_count]
@@ -120,6 +136,33 @@ class SurpriseBasedModel(ICfRecommendationModel):
         yield from [self._trainset.to_raw_uid(x)
                     for x in self._trainset.all_users()]
 
+    def knows_user(self, user_id: int) -> bool:
+        try:
+            self._trainset.to_inner_uid(user_id)
+        except ValueError:
+            return False
+
+        return True
+
+    @property
+    def trainset(self) -> Trainset:
+        """Dataset used for model training.
+        """
+        return self._trainset
+
+    @property
+    def algorithm(self) -> AlgoBase:
+        """Trained algorithm used by the model.
+
+        Raises:
+            UntrainedModelError:
+                Raised when the model is not trained yet.
+        """
+        if not self._algorithm:
+            raise UntrainedModelError
+
+        return self._algorithm
+
     def generate_antitest_set(self, users_ids: List[int]) -> Iterable[Tuple[int, int, float]]:
         for uid in users_ids:
             yield from self._generate_antitest(uid)
@@ -160,8 +203,49 @@ class SvdRecommendationModel(SurpriseBasedModel):
 
 class KNNRecommendationModel(SurpriseBasedModel):
     """Recommendation algorithm using the neighbor similarity.
+
+    Ratings of known users and books are estimated for all books
+    of a single user at once using `KnnBaselineBatchEstimator`.
     """
 
+    def test(self, ratings: List[Tuple[int, int, float]]) -> List[Prediction]:
+        if not self._algorithm:
+            raise UntrainedModelError
+
+        predictions = [None] * len(ratings)
+        users_cases = defaultdict(list)
+        for position, (uid, iid, r_ui) in enumerate(ratings):
+            try:
+                user = self._trainset.to_inner_uid(uid)
+                item = self._trainset.to_inner_iid(iid)
+            except ValueError:
+                predictions[position] = self._algorithm.predict(uid, iid, r_ui)
+            else:
+                users_cases[user].append((position, item))
+
+        estimator = self._get_batch_estimator()
+        lower_bound, higher_bound = self._trainset.rating_scale
+        for user, cases in users_cases.items():
+            positions, items = zip(*cases)
+            estimations, actual_ks = estimator.estimate_with_details(
+                user, np.array(items))
+            estimations = np.clip(estimations, lower_bound, higher_bound)
+            for position, est, actual_k in zip(positions, estimations,
+                                               actual_ks):
+                uid, iid, r_ui = ratings[position]
+                predictions[position] = Prediction(
+                    uid, iid, r_ui, float(est),
+                    {'actual_k': int(actual_k), 'was_impossible': False})
+
+        return predictions
+
+    def _get_batch_estimator(self) -> KnnBaselineBatchEstimator:
+        if getattr(self, '_batch_estimator', None) is None:
+            self._batch_estimator = KnnBaselineBatchEstimator.from_algorithm(
+                self._algorithm)
+
+        return self._batch_estimator
+
     def train(self):
         """Computes user and items similarities.
         """
@@ -176,3 +260,260 @@ class KNNRecommendationModel(SurpriseBasedModel):
         algo = KNNBaseline(k=30, bsl_options=bsl_options,
                            sim_options=sim_options, verbose=False)
         self._algorithm = algo.fit(self._trainset)
+        self._batch_estimator = None
+
+
+class PopularityRecommendationModel(SurpriseBasedModel):
+    """Recommendation algorithm returning the most popular books.
+
+    Books are ranked once during training, by their mean ratings damped
+    towards the global mean or by their baselines. A recommendation only
+    skips books already rated by the user at the top of the ranking,
+    which is checked using a bitmap of rated books kept in the ranking
+    order. Users unknown to the model get the top of the ranking.
+
+    Args:
+        input_filepath: Filepath containing ratings data.
+        trainset: Defaults to None. Dataset used instead of reading
+            the ratings file.
+    """
+
+    def __init__(self, input_filepath: str = None, trainset: Trainset = None):
+        if trainset is None:
+            trainset = self._read_trainset(input_filepath)
+
+        self._trainset = trainset
+        self._algorithm = None
+        self._scores = None
+        self._ranking = None
+        self._known_ranks = None
+
+    @property
+    def scores(self) -> np.ndarray:
+        """Popularity scores of books ordered by inner ids.
+        """
+        self._check_trained()
+        return self._scores
+
+    @property
+    def ranking(self) -> np.ndarray:
+        """Inner ids of books ordered by decreasing popularity.
+        """
+        self._check_trained()
+        return self._ranking
+
+    @property
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays of the trained model, see `from_arrays`.
+        """
+        self._check_trained()
+        return {
+            'scores': self._scores,
+            'ranking': self._ranking,
+            'known_ranks': self._known_ranks
+        }
+
+    @classmethod
+    def from_arrays(
+            cls,
+            trainset: Trainset,
+            arrays: Dict[str, np.ndarray]
+    ) -> 'PopularityRecommendationModel':
+        """Recreates a model trained on the trainset from its arrays,
+        without training it again.
+        """
+        model = cls(trainset=trainset)
+        model._scores = arrays['scores']
+        model._ranking = arrays['ranking']
+        model._known_ranks = arrays['known_ranks']
+        return model
+
+    def train(self, method: str = 'damped-mean', damping: float = 10):
+        """Ranks books by their popularity.
+
+        Args:
+            method (str, optional): Defaults to 'damped-mean'.
+                Popularity score of books, 'damped-mean' uses mean
+                ratings with `damping` global mean ratings added,
+                'baseline' uses books baselines.
+            damping (float, optional): Defaults to 10. Number of global
+                mean ratings added to ratings of each book.
+
+        Raises:
+            ValueError: Raised when the method is unknown.
+        """
+        trainset = self._trainset
+        if method == 'damped-mean':
+            sums = np.zeros(trainset.n_items)
+            counts = np.zeros(trainset.n_items)
+            for item, item_ratings in trainset.ir.items():
+                sums[item] = sum(rating for _, rating in item_ratings)
+                counts[item] = len(item_ratings)
+            scores = ((sums + damping * trainset.global_mean) /
+                      (counts + damping))
+        elif method == 'baseline':
+            bsl_options = {'method': 'als',
+                           'n_epochs': 10,
+                           'reg_u': 15,
+                           'reg_i': 10}
+            algo = BaselineOnly(bsl_options=bsl_options, verbose=False)
+            algo.fit(trainset)
+            scores = trainset.global_mean + np.asarray(algo.bi)
+        else:
+            raise ValueError(f'Unknown popularity method {method}')
+
+        self._scores = np.clip(scores, *trainset.rating_scale)
+        self._ranking = np.argsort(-self._scores, kind='mergesort')
+
+        ranks = np.empty(trainset.n_items, dtype=np.int64)
+        ranks[self._ranking] = np.arange(trainset.n_items)
+        self._known_ranks = known_items_bitmap(trainset, ranks)
+
+    def recommend(
+            self,
+            user_id: int,
+            recommendations_count: int = 10
+    ) -> Dict[int, float]:
+        self._check_trained()
+
+        ranking = self._ranking[:recommendations_count]
+        if self.knows_user(user_id):
+            ranking = self._unknown_top(self._trainset.to_inner_uid(user_id),
+                                        recommendations_count)
+
+        return {self._trainset.to_raw_iid(item): float(self._scores[item])
+                for item in ranking}
+
+    def _unknown_top(self, user: int, count: int) -> List[int]:
+        """Walks the ranking until `count` books not rated by the user
+        are found, only bits of the visited ranks are tested.
+        """
+        known_ranks = self._known_ranks[user]
+        top = list()
+        for rank, item in enumerate(self._ranking):
+            if len(top) == count:
+                break
+            if not known_ranks[rank >> 3] & (0x80 >> (rank & 7)):
+                top.append(item)
+
+        return top
+
+    def test(self, ratings: List[Tuple[int, int, float]]) -> List[Prediction]:
+        self._check_trained()
+
+        predictions = list()
+        for uid, iid, r_ui in ratings:
+            try:
+                est = float(self._scores[self._trainset.to_inner_iid(iid)])
+                was_impossible = False
+            except ValueError:
+                est = self._trainset.global_mean
+                was_impossible = True
+            predictions.append(Prediction(
+                uid, iid, r_ui, est, {'was_impossible': was_impossible}))
+
+        return predictions
+
+    def _check_trained(self):
+        if self._scores is None:
+            raise UntrainedModelError
+
+
+class FallbackRecommendationModel(ICfRecommendationModel):
+    """Model making recommendations for users unknown to the main model
+    using a fallback model.
+
+    Args:
+        model: Main recommendation model.
+        fallback_model: Model used for users unknown to the main model.
+    """
+
+    def __init__(
+            self,
+            model: ICfRecommendationModel,
+            fallback_model: ICfRecommendationModel
+    ):
+        self._model = model
+        self._fallback_model = fallback_model
+
+    @property
+    def model(self) -> ICfRecommendationModel:
+        """Main recommendation model.
+        """
+        return self._model
+
+    @property
+    def users(self) -> Iterable[int]:
+        return self._model.users
+
+    def knows_user(self, user_id: int) -> bool:
+        return self._model.knows_user(user_id)
+
+    def recommend(
+            self,
+            user_id: int,
+            recommendations_count: int = 10
+    ) -> Dict[int, float]:
+        if self._model.knows_user(user_id):
+            return self._model.recommend(user_id, recommendations_count)
+
+        return self._fallback_model.recommend(user_id, recommendations_count)
+
+    def test(self, ratings: List[Tuple[int, int, float]]) -> List[Prediction]:
+        return self._model.test(ratings)
+
+    def generate_antitest_set(
+            self,
+            users_ids: List[int]
+    ) -> Iterable[Tuple[int, int, float]]:
+        return self._model.generate_antitest_set(users_ids)
+
+
+def with_popularity_fallback(
+        model: SurpriseBasedModel,
+        model_filepath: str = None
+) -> FallbackRecommendationModel:
+    """Adds a popularity model trained on the same ratings as a fallback
+    for users unknown to the model.
+
+    If the file of the model is given, the popularity model is saved
+    next to it and reused as long as the model file does not change,
+    so it is trained only once.
+
+    Args:
+        model: Trained model based on a Surprise algorithm.
+        model_filepath: Defaults to None. File the model was read from.
+    """
+    if model_filepath is None:
+        popularity_model = PopularityRecommendationModel(
+            trainset=model.trainset)
+        popularity_model.train()
+    else:
+        popularity_model = _saved_popularity_model(model, model_filepath)
+
+    return FallbackRecommendationModel(model, popularity_model)
+
+
+def _saved_popularity_model(
+        model: SurpriseBasedModel,
+        model_filepath: str
+) -> PopularityRecommendationModel:
+    fallback_dir = model_filepath + POPULARITY_FALLBACK_EXTENSION
+    stat = os.stat(model_filepath)
+    model_key = f'{stat.st_size}:{stat.st_mtime_ns}'
+    if is_arrays_dir(fallback_dir):
+        metadata, arrays = read_arrays(fallback_dir)
+        if metadata.get('model') == model_key:
+            return PopularityRecommendationModel.from_arrays(
+                model.trainset, arrays)
+
+    popularity_model = PopularityRecommendationModel(trainset=model.trainset)
+    popularity_model.train()
+    try:
+        save_arrays(popularity_model.arrays, {'model': model_key},
+                    fallback_dir)
+    except OSError:
+        logging.warning('Cannot save the popularity model to %s',
+                        fallback_dir)
+
+    return popularity_model
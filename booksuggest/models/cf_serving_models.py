@@ -0,0 +1,687 @@
+"""Serving-only versions of collaborative filtering models.
+
+Models trained with the Surprise package keep the whole trainset and
+the algorithm object, which is not needed to make recommendations.
+Functions from this module export a trained model to a directory of
+arrays (factors, biases, similarities, id maps and a bitmap of already
+rated books) which are memory mapped when the model is loaded.
+Item factors of SVD models can be additionally stored in a quantized
+form, which reduces the memory touched when ranking books, or indexed
+for maximum inner product search. Every serving model keeps a ranking of
+the most popular books, used for users unknown to the model.
+"""
+import os
+from abc import abstractmethod
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from surprise import KNNBaseline, Prediction, SlopeOne, SVD
+
+from .cf_batch_estimation import (
+    KnnBaselineBatchEstimator,
+    known_items_bitmap,
+    user_ratings_arrays
+)
+from .cf_recommend_models import (
+    ICfRecommendationModel,
+    PopularityRecommendationModel,
+    SurpriseBasedModel
+)
+from .mips_index import NormOrderedMipsIndex
+from ..utils.ranking import top_n_indices
+from ..utils.serialization import is_arrays_dir, read_arrays, save_arrays
+
+SERVING_MODEL_EXTENSION = '.serving'
+
+
+class ServingCfModel(ICfRecommendationModel):
+    """Base class for collaborative filtering models which only keep
+    the arrays required for inference.
+
+    Args:
+        metadata: Scalar parameters of the model.
+        arrays: Arrays of the model, usually memory mapped.
+
+    Attributes:
+        _user_ids (np.ndarray): Raw user ids ordered by inner ids.
+        _item_ids (np.ndarray): Raw book ids ordered by inner ids.
+        _known_items (np.ndarray):
+            Bitmap of rated books, a single packed row per user.
+        _popularity_ranking (np.ndarray):
+            Inner ids of books ordered by decreasing popularity,
+            None for models exported without the popularity ranking.
+        _popularity_scores (np.ndarray):
+            Popularity scores of books ordered by inner ids.
+        _dirname (str): Directory of the memory mapped arrays, if set
+            the model is pickled as a reference to the directory.
+    """
+
+    def __init__(
+            self,
+            metadata: Dict[str, Any],
+            arrays: Dict[str, np.ndarray]
+    ):
+        self._global_mean = metadata['global_mean']
+        self._rating_scale = tuple(metadata['rating_scale'])
+        self._user_ids = arrays['user_ids']
+        self._user_lookup = arrays['user_lookup']
+        self._item_ids = arrays['item_ids']
+        self._item_lookup = arrays['item_lookup']
+        self._known_items = arrays['known_items']
+        self._popularity_ranking = arrays.get('popularity_ranking')
+        self._popularity_scores = arrays.get('popularity_scores')
+        self._dirname = None
+
+    def __reduce_ex__(self, protocol):
+        if self._dirname is None:
+            return super().__reduce_ex__(protocol)
+
+        # other processes attach to the same files instead of copying arrays
+        return read_serving_model, (self._dirname,)
+
+    @property
+    def n_items(self) -> int:
+        """Number of books known by the model.
+        """
+        return len(self._item_ids)
+
+    @property
+    def users(self) -> Iterable[int]:
+        yield from (int(user_id) for user_id in self._user_ids)
+
+    def recommend(
+            self,
+            user_id: int,
+            recommendations_count: int = 10
+    ) -> Dict[int, float]:
+        """Returns top recommendations for the user, users unknown
+        to the model get the most popular books.
+
+        Raises:
+            ValueError: Raised when the user is unknown and the model
+                was exported without the popularity ranking.
+        """
+        if self._popularity_ranking is not None \
+                and not self.knows_user(user_id):
+            top_n = self._popularity_ranking[:recommendations_count]
+            return self._recommendations(top_n, self._popularity_scores[top_n])
+
+        user = self.to_inner_uid(user_id)
+        return self._recommend(user, recommendations_count)
+
+    def knows_user(self, user_id: int) -> bool:
+        return self._to_inner_ids(self._user_ids, self._user_lookup,
+                                  [user_id])[0] >= 0
+
+    def test(self, ratings: List[Tuple[int, int, float]]) -> List[Prediction]:
+        if not ratings:
+            return list()
+
+        uids, iids, r_uis = zip(*ratings)
+        users = self._to_inner_ids(self._user_ids, self._user_lookup, uids)
+        items = self._to_inner_ids(self._item_ids, self._item_lookup, iids)
+        estimations = np.empty(len(ratings))
+        was_impossible = np.zeros(len(ratings), dtype=bool)
+
+        known = (users >= 0) & (items >= 0)
+        unique_users, inverse = np.unique(users[known], return_inverse=True)
+        # positions of each user are grouped once, keeping their order
+        order = np.argsort(inverse, kind='mergesort')
+        offsets = np.cumsum(np.bincount(inverse))[:-1]
+        user_positions = np.split(np.flatnonzero(known)[order], offsets)
+        for user, positions in zip(unique_users, user_positions):
+            estimations[positions] = self._estimate(user, items[positions])
+
+        unknown_positions = np.flatnonzero(~known)
+        for position in unknown_positions:
+            estimation = self._estimate_unknown(users[position],
+                                                items[position])
+            if estimation is None:
+                estimation = self._global_mean
+                was_impossible[position] = True
+            estimations[position] = estimation
+
+        estimations = self._clip(estimations)
+        return [Prediction(uid, iid, r_ui, float(est),
+                           {'was_impossible': bool(impossible)})
+                for uid, iid, r_ui, est, impossible
+                in zip(uids, iids, r_uis, estimations, was_impossible)]
+
+    def generate_antitest_set(
+            self,
+            users_ids: List[int]
+    ) -> Iterable[Tuple[int, int, float]]:
+        for uid in users_ids:
+            user = self.to_inner_uid(uid)
+            items = np.flatnonzero(~self.known_items_mask(user))
+            yield from ((uid, int(iid), self._global_mean)
+                        for iid in self._item_ids[items])
+
+    def to_inner_uid(self, user_id: int) -> int:
+        """Converts a raw user id to the inner user id.
+
+        Raises:
+            ValueError: Raised when the user is not part of the trainset.
+        """
+        user = self._to_inner_ids(self._user_ids, self._user_lookup,
+                                  [user_id])[0]
+        if user < 0:
+            raise ValueError(f'User {user_id} is not part of the trainset.')
+
+        return int(user)
+
+    def known_items_mask(self, user: int) -> np.ndarray:
+        """Returns a boolean mask of books already rated by the user.
+
+        Args:
+            user: Inner id of the user.
+        """
+        return np.unpackbits(self._known_items[user])[:self.n_items] \
+            .astype(bool)
+
+    @staticmethod
+    def _to_inner_ids(
+            raw_ids: np.ndarray,
+            lookup: np.ndarray,
+            ids: Iterable[int]
+    ) -> np.ndarray:
+        """Maps raw ids to inner ids, unknown ids are mapped to -1.
+        """
+        ids = np.asarray(ids)
+        sorted_ids = raw_ids[lookup]
+        positions = np.searchsorted(sorted_ids, ids)
+        positions[positions == len(sorted_ids)] = 0
+        found = sorted_ids[positions] == ids
+        return np.where(found, lookup[positions], -1)
+
+    def _recommend(
+            self,
+            user: int,
+            recommendations_count: int
+    ) -> Dict[int, float]:
+        """Returns top recommendations for a known user.
+
+        Args:
+            user: Inner id of the user.
+            recommendations_count: Number of recommendations.
+        """
+        items = np.flatnonzero(~self.known_items_mask(user))
+        estimations = self._clip(self._estimate(user, items))
+        top_n = top_n_indices(estimations, recommendations_count)
+        return self._recommendations(items[top_n], estimations[top_n])
+
+    def _recommendations(
+            self,
+            items: np.ndarray,
+            estimations: np.ndarray
+    ) -> Dict[int, float]:
+        return {int(iid): float(est) for iid, est
+                in zip(self._item_ids[items], estimations)}
+
+    def _clip(self, estimations: np.ndarray) -> np.ndarray:
+        return np.clip(estimations, *self._rating_scale)
+
+    @abstractmethod
+    def _estimate(self, user: int, items: np.ndarray) -> np.ndarray:
+        """Estimates unclipped ratings of the user for the given books.
+
+        Args:
+            user: Inner id of the user.
+            items: Inner ids of books.
+        """
+
+    def _estimate_unknown(self, user: int, item: int) -> float:
+        """Estimates a rating when the user or the book is unknown.
+
+        Args:
+            user: Inner id of the user or -1 if unknown.
+            item: Inner id of the book or -1 if unknown.
+
+        Returns:
+            Estimated rating or None when the prediction is impossible.
+        """
+        return None
+
+
+class SvdServingModel(ServingCfModel):
+    """Serving version of the biased SVD model.
+
+    If the model was exported with a maximum inner product search index,
+    the index is used for finding recommendations. Otherwise, if the model
+    was exported with quantized item factors, recommendations are ranked
+    using the quantized factors and only the top
+    `rescore_factor * recommendations_count` candidates are rescored
+    using the exact factors.
+    """
+
+    def __init__(
+            self,
+            metadata: Dict[str, Any],
+            arrays: Dict[str, np.ndarray]
+    ):
+        super().__init__(metadata, arrays)
+        self._bu = arrays['bu']
+        self._bi = arrays['bi']
+        self._pu = arrays['pu']
+        self._qi = arrays['qi']
+        self._qi_quantized = arrays.get('qi_quantized')
+        self._qi_scale = arrays.get('qi_scale')
+        self._rescore_factor = metadata.get('rescore_factor', 1)
+        self._mips_index = None
+        if 'mips_vectors' in arrays:
+            self._mips_index = NormOrderedMipsIndex(
+                arrays['mips_vectors'], arrays['mips_norms'],
+                arrays['mips_order'], metadata['mips_block_size'],
+                metadata['mips_bound_scale'])
+
+    def _recommend(
+            self,
+            user: int,
+            recommendations_count: int
+    ) -> Dict[int, float]:
+        if self._mips_index is not None:
+            return self._recommend_with_index(user, recommendations_count)
+
+        if self._qi_quantized is None:
+            return super()._recommend(user, recommendations_count)
+
+        items = np.flatnonzero(~self.known_items_mask(user))
+        approximations = self._estimate_quantized(user, items)
+        candidates = np.sort(top_n_indices(
+            approximations, recommendations_count * self._rescore_factor))
+
+        items = items[candidates]
+        estimations = self._clip(self._estimate(user, items))
+        top_n = top_n_indices(estimations, recommendations_count)
+        return self._recommendations(items[top_n], estimations[top_n])
+
+    def _recommend_with_index(
+            self,
+            user: int,
+            recommendations_count: int
+    ) -> Dict[int, float]:
+        items, estimations = self._mips_index.search(
+            self._pu[user], recommendations_count,
+            offset=self._global_mean + self._bu[user],
+            clip=self._rating_scale,
+            excluded=self.known_items_mask(user))
+        return self._recommendations(items, estimations)
+
+    def _estimate(self, user: int, items: np.ndarray) -> np.ndarray:
+        return (self._global_mean + self._bu[user] + self._bi[items] +
+                self._qi[items].dot(self._pu[user]))
+
+    def _estimate_quantized(self, user: int, items: np.ndarray) -> np.ndarray:
+        user_factors = self._pu[user].astype(np.float32)
+        products = self._qi_quantized[items].dot(user_factors)
+        return (self._global_mean + self._bu[user] + self._bi[items] +
+                products * self._qi_scale[items])
+
+    def _estimate_unknown(self, user: int, item: int) -> float:
+        return _baseline_estimate(self._global_mean, self._bu, self._bi,
+                                  user, item)
+
+
+class KnnServingModel(ServingCfModel):
+    """Serving version of the item based KNNBaseline model.
+
+    Similarities are stored as full rows, so that the `k` nearest books
+    among the books rated by the user can be chosen exactly as in the
+    original model.
+    """
+
+    def __init__(
+            self,
+            metadata: Dict[str, Any],
+            arrays: Dict[str, np.ndarray]
+    ):
+        super().__init__(metadata, arrays)
+        self._bu = arrays['bu']
+        self._bi = arrays['bi']
+        self._estimator = KnnBaselineBatchEstimator(
+            self._global_mean, self._bu, self._bi, arrays['sim'],
+            metadata['k'], metadata['min_k'], arrays['ratings_indptr'],
+            arrays['ratings_indices'], arrays['ratings_data'])
+
+    def _estimate(self, user: int, items: np.ndarray) -> np.ndarray:
+        return self._estimator.estimate(user, items)
+
+    def _estimate_unknown(self, user: int, item: int) -> float:
+        return _baseline_estimate(self._global_mean, self._bu, self._bi,
+                                  user, item)
+
+
+class SlopeOneServingModel(ServingCfModel):
+    """Serving version of the SlopeOne model.
+    """
+
+    def __init__(
+            self,
+            metadata: Dict[str, Any],
+            arrays: Dict[str, np.ndarray]
+    ):
+        super().__init__(metadata, arrays)
+        self._dev = arrays['dev']
+        self._co_rated = arrays['co_rated']
+        self._user_mean = arrays['user_mean']
+        self._ratings_indptr = arrays['ratings_indptr']
+        self._ratings_indices = arrays['ratings_indices']
+
+    def _estimate(self, user: int, items: np.ndarray) -> np.ndarray:
+        start, end = self._ratings_indptr[user:user + 2]
+        rated = self._ratings_indices[start:end]
+
+        # both matrices are (anti)symmetric, so rows of the rated books
+        # are read instead of columns
+        relevant = np.unpackbits(self._co_rated[rated], axis=1)[:, items]
+        deviations = np.where(relevant, -self._dev[rated][:, items], 0)
+
+        relevant_count = relevant.sum(axis=0)
+        mean_deviation = np.divide(deviations.sum(axis=0), relevant_count,
+                                   out=np.zeros(len(items)),
+                                   where=relevant_count != 0)
+        return self._user_mean[user] + mean_deviation
+
+
+class PopularityServingModel(ServingCfModel):
+    """Serving version of the popularity model.
+    """
+
+    def _recommend(
+            self,
+            user: int,
+            recommendations_count: int
+    ) -> Dict[int, float]:
+        ranking = self._popularity_ranking
+        known = self.known_items_mask(user)[ranking]
+        top_n = ranking[~known][:recommendations_count]
+        return self._recommendations(top_n, self._popularity_scores[top_n])
+
+    def _estimate(self, user: int, items: np.ndarray) -> np.ndarray:
+        return self._popularity_scores[items]
+
+    def _estimate_unknown(self, user: int, item: int) -> float:
+        return self._popularity_scores[item] if item >= 0 else None
+
+
+def _baseline_estimate(
+        global_mean: float,
+        bu: np.ndarray,
+        bi: np.ndarray,
+        user: int,
+        item: int
+) -> float:
+    estimation = global_mean
+    if user >= 0:
+        estimation += bu[user]
+    if item >= 0:
+        estimation += bi[item]
+    return estimation
+
+
+_SERVING_MODELS = {
+    'svd': SvdServingModel,
+    'knn': KnnServingModel,
+    'slopeone': SlopeOneServingModel,
+    'popularity': PopularityServingModel
+}
+
+
+def export_serving_model(
+        model: SurpriseBasedModel,
+        dirname: str,
+        quantization: str = None,
+        rescore_factor: int = 4,
+        mips_recall_target: float = None
+):
+    """Exports arrays required for inference of a trained model.
+
+    Args:
+        model: Trained popularity model or model based on the SVD,
+            KNNBaseline or SlopeOne algorithm.
+        dirname: Directory in which the serving model should be saved.
+        quantization: Defaults to None. Type of quantized item factors
+            ('float16' or 'int8') stored next to the exact factors,
+            supported only by SVD models.
+        rescore_factor: Defaults to 4. How many times more candidates
+            than requested recommendations are rescored exactly when
+            quantized factors are used.
+        mips_recall_target: Defaults to None. Adds a maximum inner
+            product search index with the given required recall
+            (1 means exact search), supported only by SVD models.
+            Cannot be combined with quantization.
+
+    Raises:
+        ValueError: Raised when the model algorithm is not supported
+            or both quantization and the index are requested.
+    """
+    if quantization and mips_recall_target:
+        # the index ranks books using exact factors, so quantized
+        # factors would never be used
+        raise ValueError(
+            'Quantization cannot be combined with the MIPS index')
+
+    trainset = model.trainset
+    metadata = {
+        'model': 'popularity',
+        'global_mean': trainset.global_mean,
+        'rating_scale': list(trainset.rating_scale)
+    }
+    arrays = _trainset_arrays(trainset)
+    arrays.update(_popularity_arrays(model))
+
+    if not isinstance(model, PopularityRecommendationModel):
+        algorithm = model.algorithm
+        exporters = {
+            SVD: ('svd', _svd_arrays),
+            KNNBaseline: ('knn', _knn_arrays),
+            SlopeOne: ('slopeone', _slopeone_arrays)
+        }
+        try:
+            name, exporter = exporters[type(algorithm)]
+        except KeyError:
+            raise ValueError(
+                f'Unsupported algorithm {type(algorithm).__name__}')
+
+        model_metadata, model_arrays = exporter(algorithm, trainset)
+        metadata.update(model_metadata, model=name)
+        arrays.update(model_arrays)
+
+    if quantization:
+        metadata, arrays = quantize_serving_arrays(
+            metadata, arrays, quantization, rescore_factor)
+    if mips_recall_target:
+        metadata, arrays = index_serving_arrays(
+            metadata, arrays, mips_recall_target)
+
+    save_arrays(arrays, metadata, dirname)
+
+
+def read_serving_model(dirname: str, mmap_mode: str = 'r') -> ServingCfModel:
+    """Reads a serving model exported with `export_serving_model`.
+
+    Args:
+        dirname: Directory containing the serving model.
+        mmap_mode: Defaults to 'r'. Memory mapping mode of the arrays,
+            None reads them into memory.
+
+    Returns:
+        ServingCfModel: Serving model, memory mapped models are pickled
+            as references to the directory.
+    """
+    metadata, arrays = read_arrays(dirname, mmap_mode)
+    model = _SERVING_MODELS[metadata['model']](metadata, arrays)
+    if mmap_mode is not None:
+        # pylint: disable=protected-access
+        model._dirname = os.path.abspath(dirname)
+    return model
+
+
+def quantize_rows(
+        matrix: np.ndarray,
+        dtype: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantizes rows of the matrix using a separate scale for each row.
+
+    Args:
+        matrix: Two dimensional array to quantize.
+        dtype: Type of the quantized values, 'float16' or 'int8'.
+
+    Raises:
+        ValueError: Raised when the dtype is not supported.
+
+    Returns:
+        Quantized matrix and the scale of each row; the original
+        matrix is approximated by `quantized * scale[:, None]`.
+    """
+    max_values = {'float16': 1, 'int8': np.iinfo(np.int8).max}
+    if dtype not in max_values:
+        raise ValueError(f'Unsupported quantization type {dtype}')
+
+    matrix = np.asarray(matrix)
+    scale = np.abs(matrix).max(axis=1) / max_values[dtype]
+    scale[scale == 0] = 1
+    quantized = matrix / scale[:, np.newaxis]
+    if dtype == 'int8':
+        quantized = np.round(quantized)
+
+    return quantized.astype(dtype), scale.astype(np.float32)
+
+
+def quantize_serving_arrays(
+        metadata: Dict[str, Any],
+        arrays: Dict[str, np.ndarray],
+        dtype: str,
+        rescore_factor: int = 4
+) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Adds quantized item factors to arrays of a SVD serving model.
+
+    Args:
+        metadata: Metadata of the serving model.
+        arrays: Arrays of the serving model.
+        dtype: Type of the quantized values, 'float16' or 'int8'.
+        rescore_factor: Defaults to 4. How many times more candidates
+            than requested recommendations are rescored exactly.
+
+    Raises:
+        ValueError: Raised when the model does not use item factors.
+
+    Returns:
+        Updated metadata and arrays of the serving model.
+    """
+    if metadata['model'] != 'svd':
+        raise ValueError('Only SVD models can be quantized')
+
+    qi_quantized, qi_scale = quantize_rows(arrays['qi'], dtype)
+    metadata = dict(metadata, quantization=dtype,
+                    rescore_factor=rescore_factor)
+    arrays = dict(arrays, qi_quantized=qi_quantized, qi_scale=qi_scale)
+    return metadata, arrays
+
+
+def index_serving_arrays(
+        metadata: Dict[str, Any],
+        arrays: Dict[str, np.ndarray],
+        recall_target: float = 1.0,
+        block_size: int = 256,
+        calibration_count: int = 1000,
+        recommendations_count: int = 20
+) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Adds a maximum inner product search index to arrays
+    of a SVD serving model.
+
+    Args:
+        metadata: Metadata of the serving model.
+        arrays: Arrays of the serving model.
+        recall_target: Defaults to 1. Required mean recall of the index,
+            1 means the index is exact.
+        block_size: Defaults to 256. Number of books scored at once.
+        calibration_count: Defaults to 1000. Number of users used for
+            choosing the bound scale of an approximate index.
+        recommendations_count: Defaults to 20. Number of recommendations
+            used for choosing the bound scale of an approximate index.
+
+    Raises:
+        ValueError: Raised when the model does not use item factors.
+
+    Returns:
+        Updated metadata and arrays of the serving model.
+    """
+    if metadata['model'] != 'svd':
+        raise ValueError('Only SVD models can be indexed')
+
+    index = NormOrderedMipsIndex.build(
+        np.asarray(arrays['qi']), np.asarray(arrays['bi']), block_size)
+    bound_scale = index.calibrate(
+        np.asarray(arrays['pu'][:calibration_count]),
+        recommendations_count, recall_target)
+
+    metadata = dict(metadata, mips_block_size=block_size,
+                    mips_bound_scale=bound_scale)
+    arrays = dict(arrays, **index.arrays)
+    return metadata, arrays
+
+
+def is_serving_model(path: str) -> bool:
+    """Checks whether the given path contains a serving model.
+    """
+    return os.path.isdir(path) and is_arrays_dir(path)
+
+
+def _trainset_arrays(trainset) -> Dict[str, np.ndarray]:
+    user_ids = np.array([trainset.to_raw_uid(u)
+                         for u in trainset.all_users()], dtype=np.int64)
+    item_ids = np.array([trainset.to_raw_iid(i)
+                         for i in trainset.all_items()], dtype=np.int64)
+
+    return {
+        'user_ids': user_ids,
+        'user_lookup': np.argsort(user_ids, kind='mergesort'),
+        'item_ids': item_ids,
+        'item_lookup': np.argsort(item_ids, kind='mergesort'),
+        'known_items': known_items_bitmap(trainset)
+    }
+
+
+def _popularity_arrays(model: SurpriseBasedModel) -> Dict[str, np.ndarray]:
+    if not isinstance(model, PopularityRecommendationModel):
+        model = PopularityRecommendationModel(trainset=model.trainset)
+        model.train()
+
+    return {
+        'popularity_ranking': model.ranking,
+        'popularity_scores': model.scores
+    }
+
+
+def _svd_arrays(algorithm: SVD, trainset):
+    if not algorithm.biased:
+        raise ValueError('Only biased SVD models are supported')
+
+    arrays = {
+        'bu': np.asarray(algorithm.bu),
+        'bi': np.asarray(algorithm.bi),
+        'pu': np.asarray(algorithm.pu),
+        'qi': np.asarray(algorithm.qi)
+    }
+    return dict(), arrays
+
+
+def _knn_arrays(algorithm: KNNBaseline, trainset):
+    if algorithm.sim_options.get('user_based', True):
+        raise ValueError('Only item based KNN models are supported')
+
+    arrays = dict(user_ratings_arrays(trainset),
+                  bu=np.asarray(algorithm.bu),
+                  bi=np.asarray(algorithm.bi),
+                  sim=np.asarray(algorithm.sim))
+    return {'k': algorithm.k, 'min_k': algorithm.min_k}, arrays
+
+
+def _slopeone_arrays(algorithm: SlopeOne, trainset):
+    arrays = dict(user_ratings_arrays(trainset),
+                  dev=np.asarray(algorithm.dev),
+                  co_rated=np.packbits(np.asarray(algorithm.freq) > 0, axis=1),
+                  user_mean=np.asarray(algorithm.user_mean, dtype=np.float64))
+    return dict(), arrays
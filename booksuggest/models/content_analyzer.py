@@ -6,7 +6,7 @@ systems.
 """
 from abc import ABCMeta, abstractmethod
 from functools import partial
-from typing import Callable, Dict, List
+from typing import Callable, Dict, Iterable, List, Union
 import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import (
@@ -15,8 +15,9 @@ from sklearn.feature_extraction.text import (
     VectorizerMixin
 )
 
-from scipy.sparse import hstack
+from scipy.sparse import csr_matrix, hstack
 
+from ..features.build_tag_features import TagFeatures
 from .model_exceptions import UnbuiltFeaturesError
 
 
@@ -84,23 +85,38 @@ class TextBasedContentAnalyzer(IContentAnalyzer):
 
 class TagBasedContentAnalyzer(IContentAnalyzer):
     """Content analyzer that uses book tags to construct
-    feature vectors.
+    sparse feature vectors.
+
+    Attributes:
+        tag_features: Sparse tag features, data frames indexed
+            by book ids are converted.
     """
 
     def __init__(
             self,
-            tag_features: pd.DataFrame
+            tag_features: Union[TagFeatures, pd.DataFrame]
     ):
         super().__init__()
+        if isinstance(tag_features, pd.DataFrame):
+            tag_features = TagFeatures.from_frame(tag_features)
         self.tag_features = tag_features
+        self._book_rows = pd.Index(tag_features.book_ids)
 
-    def build_features(self, book_data) -> np.ndarray:
+    def build_features(self, book_data) -> csr_matrix:
         self._book_data = book_data
-        return self.tag_features.loc[book_data.index].values
+        return self.tag_features.features[self._rows(book_data.index)]
 
     def get_feature_vector(self, book_id):
         self._has_built_features()
-        return self.tag_features.loc[book_id].values.reshape(1, -1)
+        return self.tag_features.features[self._rows([book_id])]
+
+    def _rows(self, book_ids: Iterable[int]) -> np.ndarray:
+        rows = self._book_rows.get_indexer(book_ids)
+        if (rows == -1).any():
+            raise KeyError(
+                f'Missing tag features of {(rows == -1).sum()} books')
+
+        return rows
 
 
 class EnsembledContentAnalyzer(IContentAnalyzer):
@@ -139,7 +155,7 @@ class TextAndTagBasedContentAnalyzer(EnsembledContentAnalyzer):
     def __init__(
             self,
             text_feature_extractor: VectorizerMixin,
-            tag_features: pd.DataFrame
+            tag_features: Union[TagFeatures, pd.DataFrame]
     ):
         super().__init__([
             TextBasedContentAnalyzer(text_feature_extractor),
@@ -159,13 +175,13 @@ class ContentAnalyzerBuilder():
     Args:
         name: Type of the content analyzer.
         ngram: Maximal number of words in a single feature.
-        tag_features: Data frame containing calculated tag features.
+        tag_features: Calculated tag features.
     """
     def __init__(
             self,
             name: str,
             ngrams: int = None,
-            tag_features: pd.DataFrame = None
+            tag_features: Union[TagFeatures, pd.DataFrame] = None
     ):
         self._name = name
         self._ngrams = ngrams
@@ -0,0 +1,47 @@
+import logging
+
+import click
+
+from .cf_serving_models import export_serving_model
+from ..utils.serialization import read_object
+
+
+@click.command()
+@click.argument('model_filepath', type=click.Path(exists=True))
+@click.argument('output_dirpath', type=click.Path())
+@click.option('--quantize', type=click.Choice(['float16', 'int8']),
+              help='Stores quantized item factors (SVD models only).')
+@click.option('--rescore-factor', default=4,
+              help='How many times more candidates than recommendations '
+              'are rescored using exact factors.')
+@click.option('--mips-recall-target', type=float,
+              help='Adds a maximum inner product search index with the given '
+              'recall, 1 means exact search (SVD models only, not combined '
+              'with --quantize).')
+def main(model_filepath: str, output_dirpath: str, quantize: str,
+         rescore_factor: int, mips_recall_target: float):
+    """Exports a trained collaborative filtering model to a serving model
+    containing only arrays required for inference.
+
+    Args:
+        model_filepath (str): Path to a file containing the trained model.
+        output_dirpath (str): Directory in which the serving model is saved.
+        quantize (str): Type of quantized item factors, none by default.
+        rescore_factor (int): How many times more candidates than
+            recommendations are rescored using exact factors.
+        mips_recall_target (float): Required recall of the maximum inner
+            product search index, no index by default.
+    """
+    logger = logging.getLogger(__name__)
+
+    logger.info('Loading model from %s...', model_filepath)
+    model = read_object(model_filepath)
+
+    logger.info('Exporting serving model to %s...', output_dirpath)
+    export_serving_model(model, output_dirpath, quantize, rescore_factor,
+                         mips_recall_target)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()  # pylint: disable=no-value-for-parameter
@@ -8,7 +8,13 @@ from typing import TypeVar
 
 from ..utils.serialization import read_object
 from .cb_recommend_models import ICbRecommendationModel
-from .cf_recommend_models import ICfRecommendationModel
+from .cf_recommend_models import (
+    ICfRecommendationModel,
+    PopularityRecommendationModel,
+    SurpriseBasedModel,
+    with_popularity_fallback
+)
+from .cf_serving_models import is_serving_model, read_serving_model
 
 IRecommendationModel = TypeVar(
     'IRecommendationModel', 'ICbRecommendationModel', 'ICfRecommendationModel'
@@ -23,8 +29,16 @@ class InvalidModelException(Exception):
 def load_model(model_file_path: str) -> IRecommendationModel:
     """Loads the model specified stored in model_file_path
 
+    Serving models exported from collaborative filtering models
+    are directories, their arrays are memory mapped. Collaborative
+    filtering models recommend the most popular books to unknown users,
+    the popularity model is trained once and written next to the model
+    file, to a `<model file>.popularity` directory, which is reused while
+    the model file does not change.
+
     Args:
-        model_file_path (str): Path to a file containing recommendation model.
+        model_file_path (str): Path to a file containing recommendation model
+            or to a serving model directory.
 
     Raises:
         InvalidModelException:
@@ -34,11 +48,18 @@ def load_model(model_file_path: str) -> IRecommendationModel:
     Returns:
         IRecommendationModel: Recommendation model object.
     """
+    if is_serving_model(model_file_path):
+        return read_serving_model(model_file_path)
+
     if not os.path.isfile(model_file_path):
         raise FileNotFoundError(
             errno.ENOENT, os.strerror(errno.ENOENT), model_file_path)
 
     model = read_object(model_file_path)
+    if isinstance(model, SurpriseBasedModel) \
+            and not isinstance(model, PopularityRecommendationModel):
+        return with_popularity_fallback(model, model_file_path)
+
     if isinstance(model, (ICbRecommendationModel, ICfRecommendationModel)):
         return model
 
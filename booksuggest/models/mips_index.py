@@ -0,0 +1,187 @@
+"""Maximum inner product search index used by matrix factorization models.
+
+Items are scanned in blocks ordered by decreasing norms of their vectors.
+By the Cauchy-Schwarz inequality no item in the remaining blocks can score
+more than the norm of the query multiplied by the norm of the next item,
+so the scan stops as soon as this bound drops below the current n-th score.
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+
+from ..utils.ranking import top_n_indices
+
+
+class NormOrderedMipsIndex():
+    """Index returning items with the highest `offset + item_vector @ query`
+    scores, optionally clipped to a given range.
+
+    Args:
+        vectors: Item vectors sorted by decreasing norms.
+        norms: Norms of the sorted item vectors.
+        order: Original ids of the sorted item vectors.
+        block_size: Number of items scored at once.
+        bound_scale: Scale of the upper bound of the remaining scores,
+            1 makes the search exact, lower values stop the scan earlier
+            at the cost of recall.
+    """
+
+    def __init__(
+            self,
+            vectors: np.ndarray,
+            norms: np.ndarray,
+            order: np.ndarray,
+            block_size: int = 256,
+            bound_scale: float = 1.0
+    ):
+        self._vectors = vectors
+        self._norms = norms
+        self._order = order
+        self.block_size = block_size
+        self.bound_scale = bound_scale
+
+    @classmethod
+    def build(
+            cls,
+            item_factors: np.ndarray,
+            item_biases: np.ndarray,
+            block_size: int = 256
+    ) -> 'NormOrderedMipsIndex':
+        """Builds an index over item factors and item biases.
+
+        Biases are appended to the factors as an additional dimension,
+        queries are extended with 1 accordingly.
+
+        Args:
+            item_factors: Matrix of item factors.
+            item_biases: Vector of item biases.
+            block_size: Defaults to 256. Number of items scored at once.
+        """
+        vectors = np.hstack((item_factors, item_biases[:, np.newaxis]))
+        norms = np.linalg.norm(vectors, axis=1)
+        order = np.argsort(-norms, kind='mergesort')
+        return cls(vectors[order], norms[order], order, block_size)
+
+    @property
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays of the index, used for saving it.
+        """
+        return {
+            'mips_vectors': self._vectors,
+            'mips_norms': self._norms,
+            'mips_order': self._order
+        }
+
+    def search(
+            self,
+            query: np.ndarray,
+            n: int,
+            offset: float = 0.0,
+            clip: Tuple[float, float] = (-np.inf, np.inf),
+            excluded: np.ndarray = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds items with the highest scores.
+
+        Ties are resolved in favour of lower item ids, so that the exact
+        search returns the same items as a stable sort of all scores.
+
+        Args:
+            query: Query vector (without the bias dimension).
+            n: Number of items to return.
+            offset: Defaults to 0. Value added to all scores.
+            clip: Defaults to no clipping. Range of the scores.
+            excluded: Defaults to None. Boolean mask of items
+                that should not be returned.
+
+        Returns:
+            Ids of the items and their scores in descending order.
+        """
+        items, scores, _ = self.search_with_stats(
+            query, n, offset, clip, excluded)
+        return items, scores
+
+    def search_with_stats(
+            self,
+            query: np.ndarray,
+            n: int,
+            offset: float = 0.0,
+            clip: Tuple[float, float] = (-np.inf, np.inf),
+            excluded: np.ndarray = None
+    ) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Same as `search`, additionally returns the number
+        of scored items.
+        """
+        query = np.append(query, 1.0)
+        bound_factor = self.bound_scale * np.linalg.norm(query)
+        lower_bound, upper_bound = clip
+
+        best_items = np.empty(0, dtype=self._order.dtype)
+        best_scores = np.empty(0)
+        scanned = 0
+        for start in range(0, len(self._order), self.block_size):
+            if len(best_items) == n:
+                bound = offset + bound_factor * self._norms[start]
+                bound = min(max(bound, lower_bound), upper_bound)
+                if bound < best_scores[-1]:
+                    break
+
+            end = start + self.block_size
+            items = self._order[start:end]
+            scores = np.clip(offset + self._vectors[start:end].dot(query),
+                             lower_bound, upper_bound)
+            scanned += len(items)
+            if excluded is not None:
+                included = ~excluded[items]
+                items, scores = items[included], scores[included]
+
+            candidates = np.concatenate((best_items, items))
+            candidates_scores = np.concatenate((best_scores, scores))
+            by_id = np.argsort(candidates, kind='mergesort')
+            candidates = candidates[by_id]
+            candidates_scores = candidates_scores[by_id]
+
+            top_n = top_n_indices(candidates_scores, n)
+            best_items = candidates[top_n]
+            best_scores = candidates_scores[top_n]
+
+        return best_items, best_scores, scanned
+
+    def calibrate(
+            self,
+            queries: np.ndarray,
+            n: int,
+            recall_target: float,
+            iterations: int = 10
+    ) -> float:
+        """Chooses the lowest bound scale for which the mean recall
+        on the given queries is not lower than the target.
+
+        Args:
+            queries: Matrix of sample queries.
+            n: Number of items returned by a single search.
+            recall_target: Required mean recall, 1 means exact search.
+            iterations: Defaults to 10. Number of bisection steps.
+
+        Returns:
+            Chosen bound scale, also set as the index bound scale.
+        """
+        self.bound_scale = 1.0
+        if recall_target >= 1:
+            return self.bound_scale
+
+        exact_results = [set(self.search(query, n)[0]) for query in queries]
+
+        low, high = 0.0, 1.0
+        for _ in range(iterations):
+            self.bound_scale = (low + high) / 2
+            recall = np.mean([
+                len(exact & set(self.search(query, n)[0])) / len(exact)
+                for query, exact in zip(queries, exact_results)
+            ])
+            if recall >= recall_target:
+                high = self.bound_scale
+            else:
+                low = self.bound_scale
+
+        self.bound_scale = high
+        return self.bound_scale
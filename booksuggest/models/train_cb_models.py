@@ -8,6 +8,7 @@ import pandas as pd
 
 from .cb_recommend_models import ContentBasedRecommendationModel
 from .content_analyzer import ContentAnalyzerBuilder
+from ..features.build_tag_features import read_tag_features
 from ..utils.serialization import save_object
 
 
@@ -42,13 +43,13 @@ def main(
         name:
             Type of the model to train.
         tag_features_filepath:
-        Path to file containing precalculated tag features.
+        Path to .npz file containing precalculated tag features.
     """
     logger = logging.getLogger(__name__)
 
     logger.info('Reading data...')
     book_data = pd.read_csv(input_filepath, index_col='book_id')
-    tag_features = (pd.read_csv(tag_features_filepath, index_col='book_id')
+    tag_features = (read_tag_features(tag_features_filepath)
                     if tag_features_filepath else None)
 
     logger.info('Training %s model...', name)
@@ -0,0 +1,83 @@
+"""Functions used for selecting top scored elements.
+"""
+import numpy as np
+
+
+def top_n_indices(scores: np.ndarray, n: int) -> np.ndarray:
+    """Returns indices of the `n` highest scores in descending order.
+
+    The result is identical to taking the first `n` elements of a stable
+    descending sort, i.e. ties are resolved in favour of lower indices,
+    but only the top candidates are fully sorted.
+
+    Args:
+        scores: One dimensional array of scores.
+        n: How many indices to return.
+
+    Returns:
+        Indices of the top `n` scores.
+    """
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if n < len(scores):
+        kth_score = np.partition(scores, len(scores) - n)[len(scores) - n]
+        above = np.flatnonzero(scores > kth_score)
+        ties = np.flatnonzero(scores == kth_score)[:n - len(above)]
+        candidates = np.concatenate((above, ties))
+    else:
+        candidates = np.arange(len(scores))
+
+    order = np.argsort(-scores[candidates], kind='mergesort')
+    return candidates[order]
+
+
+def grouped_top_n_indices(
+        groups: np.ndarray,
+        scores: np.ndarray,
+        n: int
+) -> np.ndarray:
+    """Returns indices of the `n` highest scores within each group.
+
+    Scores of all groups are ranked at once with a stable lexicographic
+    sort, so no Python code is run per group. Elements of a group do not
+    have to be adjacent; ties are resolved in favour of lower indices.
+    Useful for selecting top recommendations of many users or books
+    from flat arrays of (group, item, score) triples.
+
+    Args:
+        groups: One dimensional array of group ids.
+        scores: One dimensional array of scores.
+        n: How many indices to return for each group.
+
+    Returns:
+        Indices of the top scores ordered by group ids
+        and then by descending scores.
+    """
+    groups = np.asarray(groups)
+    scores = np.asarray(scores)
+    if n <= 0 or len(groups) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    order = np.lexsort((-scores, groups))
+    return order[ranks_within_groups(groups[order]) < n]
+
+
+def ranks_within_groups(groups: np.ndarray) -> np.ndarray:
+    """Returns 0-based positions of elements within runs of equal
+    adjacent group ids.
+
+    Args:
+        groups: One dimensional array of group ids, usually sorted.
+    """
+    groups = np.asarray(groups)
+    if len(groups) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    is_start = np.empty(len(groups), dtype=bool)
+    is_start[0] = True
+    np.not_equal(groups[1:], groups[:-1], out=is_start[1:])
+
+    starts = np.flatnonzero(is_start)
+    sizes = np.diff(np.append(starts, len(groups)))
+    return np.arange(len(groups)) - np.repeat(starts, sizes)
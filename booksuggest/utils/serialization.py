@@ -1,8 +1,14 @@
 """Functions used for serializing python objects.
 """
+import json
+import os
 import pickle
 
-from typing import Any
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+METADATA_FILENAME = 'metadata.json'
 
 
 def save_object(obj, filename: str):
@@ -32,3 +38,63 @@ def read_object(filename: str) -> Any:
         obj = pickle.load(read_file)
 
     return obj
+
+
+def save_arrays(
+        arrays: Dict[str, np.ndarray],
+        metadata: Dict[str, Any],
+        dirname: str
+):
+    """Saves the given arrays as separate .npy files in the dirname
+    directory together with a json file containing metadata.
+
+    Each array is stored in its own file so that it can be later
+    memory mapped instead of being read into memory.
+
+    Args:
+        arrays: Arrays to save, keys are used as file names.
+        metadata: Json serializable data describing the arrays.
+        dirname: Directory in which the arrays should be saved.
+    """
+    os.makedirs(dirname, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(dirname, f'{name}.npy'), array)
+
+    with open(os.path.join(dirname, METADATA_FILENAME), 'w') as save_file:
+        json.dump(dict(metadata, arrays=sorted(arrays.keys())), save_file)
+
+
+def read_arrays(
+        dirname: str,
+        mmap_mode: str = 'r'
+) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Reads arrays saved with the `save_arrays` function.
+
+    Args:
+        dirname: Directory from which arrays should be read.
+        mmap_mode: Defaults to 'r'. Memory mapping mode passed to
+            `np.load`, None reads the arrays into memory.
+
+    Returns:
+        Metadata and a dictionary of (memory mapped) arrays.
+    """
+    with open(os.path.join(dirname, METADATA_FILENAME)) as read_file:
+        metadata = json.load(read_file)
+
+    arrays = {
+        name: np.load(os.path.join(dirname, f'{name}.npy'),
+                      mmap_mode=mmap_mode)
+        for name in metadata['arrays']
+    }
+
+    return metadata, arrays
+
+
+def is_arrays_dir(dirname: str) -> bool:
+    """Checks whether the given path is a directory created
+    by the `save_arrays` function.
+
+    Args:
+        dirname: Path to check.
+    """
+    return os.path.isfile(os.path.join(dirname, METADATA_FILENAME))
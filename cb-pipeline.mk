@@ -8,9 +8,11 @@ CLEAN_DESCRIPTION_WITH_NOUNS = data/interim/cb-tf-idf/book_with_nouns.csv
 CLEAN_DESCRIPTION_WITHOUT_NOUNS = data/interim/cb-tf-idf/book_without_nouns.csv
 
 # FEATURES
-TAG_FEATURES = features/tag_based_features.csv
+TAG_FEATURES = features/tag_based_features.npz
 
 CB_SCORES = results/cb-results.csv
+CB_SCORES_CURVE = results/cb-results-curve.csv
+CB_SCORES_CACHE = results/cb-scores-cache
 
 # MODELS
 CB_MODELS_DIR = models/content-based-models
@@ -164,11 +166,14 @@ CB_PREDICTIONS = $(TF_IDF_NOUNS_PREDICTION) \
 #
 ################################################################################
 
+DESCRIPTIONS_CACHE=data/interim/descriptions_cache.sqlite
+NORMALIZED_WORDS=data/interim/normalized_words.json
+
 $(CLEAN_DESCRIPTION_WITH_NOUNS): data/processed/book.csv booksuggest/data/prepare_description.py 
-	$(PYTHON_INTERPRETER) -m booksuggest.data.prepare_description $< $@
+	$(PYTHON_INTERPRETER) -m booksuggest.data.prepare_description $< $@ --cache $(DESCRIPTIONS_CACHE) --vocabulary $(NORMALIZED_WORDS)
 
 $(CLEAN_DESCRIPTION_WITHOUT_NOUNS): data/processed/book.csv booksuggest/data/prepare_description.py 
-	$(PYTHON_INTERPRETER) -m booksuggest.data.prepare_description $< $@ --remove_nouns
+	$(PYTHON_INTERPRETER) -m booksuggest.data.prepare_description $< $@ --remove_nouns --cache $(DESCRIPTIONS_CACHE) --vocabulary $(NORMALIZED_WORDS)
 
 ################################################################################
 #
@@ -380,4 +385,5 @@ $(CB_PREDICTIONS): $(CB_TEST_CASES)
 SIMILAR_BOOKS = data/processed/similar_books.csv
 
 $(CB_SCORES): booksuggest/evaluation/cb_evaluation.py $(SIMILAR_BOOKS) $(CB_PREDICTIONS)
-	$(PYTHON_INTERPRETER) -m booksuggest.evaluation.cb_evaluation $(CB_RESULTS_DIR) $(SIMILAR_BOOKS) $@ --rec_count 20
+	$(PYTHON_INTERPRETER) -m booksuggest.evaluation.cb_evaluation $(CB_RESULTS_DIR) $(SIMILAR_BOOKS) $@ --rec_count 20 \
+							  --cache-dir $(CB_SCORES_CACHE) --curve-output $(CB_SCORES_CURVE)
@@ -8,17 +8,20 @@ CF_MODELS_DIR = models/collaborative-filtering-models
 SLOPEONE_MODEL = $(CF_MODELS_DIR)/slopeone-model.pkl
 KNN_MODEL = $(CF_MODELS_DIR)/knn-model.pkl
 SVD_MODEL = $(CF_MODELS_DIR)/svd-model.pkl
+POPULARITY_MODEL = $(CF_MODELS_DIR)/popularity-model.pkl
 
-CF_MODELS = $(SLOPEONE_MODEL) $(KNN_MODEL) $(SVD_MODEL)
-APP_CF_MODELS = $(CF_MODELS)
+CF_MODELS = $(SLOPEONE_MODEL) $(KNN_MODEL) $(SVD_MODEL) $(POPULARITY_MODEL)
+CF_SERVING_MODELS = $(CF_MODELS:.pkl=.serving)
+APP_CF_MODELS = $(CF_SERVING_MODELS)
 
 # PREDICTIONS
 CF_PREDICTIONS_DIR = models/predictions/cf-results
 SLOPEONE_PREDICTION = $(CF_PREDICTIONS_DIR)/slopeone-predictions.csv
 KNN_PREDICTION = $(CF_PREDICTIONS_DIR)/knn-predictions.csv
 SVD_PREDICTION = $(CF_PREDICTIONS_DIR)/svd-predictions.csv
+POPULARITY_PREDICTION = $(CF_PREDICTIONS_DIR)/popularity-predictions.csv
 
-CF_PREDICTIONS = $(SLOPEONE_PREDICTION) $(KNN_PREDICTION) $(SVD_PREDICTION)
+CF_PREDICTIONS = $(SLOPEONE_PREDICTION) $(KNN_PREDICTION) $(SVD_PREDICTION) $(POPULARITY_PREDICTION)
 
 CF_ACCURACY_SCORES = results/cf-accuracy-results.csv
 CF_EFFECTIVENESS_SCORES = results/cf-effectiveness-results.csv
@@ -54,6 +57,27 @@ $(KNN_MODEL): data/processed/ratings-train.csv
 $(SVD_MODEL): data/processed/ratings-train.csv
 	$(PYTHON_INTERPRETER) -m booksuggest.models.cf_svd_models $< $@ --random-state $(SEED)
 
+$(POPULARITY_MODEL): data/processed/ratings-train.csv
+	$(PYTHON_INTERPRETER) -m booksuggest.models.cf_popularity_models $< $@
+
+$(CF_MODELS_DIR)/svd-model.serving: EXPORT_OPTIONS := --mips-recall-target 1
+
+$(CF_SERVING_MODELS): %.serving: %.pkl
+	$(PYTHON_INTERPRETER) -m booksuggest.models.export_cf_models $< $@ $(EXPORT_OPTIONS)
+
+SVD_QUANTIZATION_BENCHMARK = results/svd-quantization-benchmark.csv
+
+SVD_MIPS_BENCHMARK = results/svd-mips-benchmark.csv
+
+quantization_benchmark: $(SVD_QUANTIZATION_BENCHMARK)
+mips_benchmark: $(SVD_MIPS_BENCHMARK)
+
+$(SVD_QUANTIZATION_BENCHMARK): $(CF_MODELS_DIR)/svd-model.serving
+	$(PYTHON_INTERPRETER) -m booksuggest.evaluation.cf_quantization_benchmark $< $@ --n 20 --random-state $(SEED)
+
+$(SVD_MIPS_BENCHMARK): $(CF_MODELS_DIR)/svd-model.serving
+	$(PYTHON_INTERPRETER) -m booksuggest.evaluation.cf_mips_benchmark $< $@ --n 20 --random-state $(SEED)
+
 KNN_PARAMS_SEARCH=results/knn-parameters-search.csv
 SVD_PARAMS_SEARCH=results/svd-parameters-search.csv
 
@@ -65,6 +89,17 @@ $(KNN_PARAMS_SEARCH): data/processed/ratings-train.csv
 $(SVD_PARAMS_SEARCH): data/processed/ratings-train.csv
 	$(PYTHON_INTERPRETER) -m booksuggest.evaluation.cf_grid_search data/processed/ratings-train.csv $(SVD_PARAMS_SEARCH) --model svd --random-state $(SEED)
 
+KNN_PARAMS_HALVING=results/knn-parameters-halving.csv
+SVD_PARAMS_HALVING=results/svd-parameters-halving.csv
+
+halving_search: $(KNN_PARAMS_HALVING) $(SVD_PARAMS_HALVING)
+
+$(KNN_PARAMS_HALVING): data/processed/ratings-train.csv
+	$(PYTHON_INTERPRETER) -m booksuggest.evaluation.cf_grid_search data/processed/ratings-train.csv $(KNN_PARAMS_HALVING) --model knn --search halving --random-state $(SEED)
+
+$(SVD_PARAMS_HALVING): data/processed/ratings-train.csv
+	$(PYTHON_INTERPRETER) -m booksuggest.evaluation.cf_grid_search data/processed/ratings-train.csv $(SVD_PARAMS_HALVING) --model svd --search halving --random-state $(SEED)
+
 ################################################################################
 #
 # Model predictions rules
@@ -80,8 +115,11 @@ $(KNN_PREDICTION): $(KNN_MODEL)
 $(SVD_PREDICTION): MODEL := $(SVD_MODEL)
 $(SVD_PREDICTION): $(SVD_MODEL)
 
+$(POPULARITY_PREDICTION): MODEL := $(POPULARITY_MODEL)
+$(POPULARITY_PREDICTION): $(POPULARITY_MODEL)
+
 $(CF_PREDICTIONS):
-	$(PYTHON_INTERPRETER) -m booksuggest.evaluation.cf_predict_models $(MODEL) $@ --n 20 --chunks-count 2
+	$(PYTHON_INTERPRETER) -m booksuggest.evaluation.cf_predict_models $(MODEL) $@ --n 20 --chunks-count 2 --resume
 
 ################################################################################
 #
@@ -20,6 +20,57 @@ def test_build_all_tag_features(book_tags, tags, expected):
     assert tag_features_list.index.tolist() == [2, 3]
 
 
+def test_build_sparse_tag_features():
+    book_tags = pd.DataFrame({'book_id': [3, 3, 2, 2, 3],
+                              'tag_name': ['c', 'a', 'a', 'b', 'b'],
+                              'count': [3, 1, 2, 0, 4]})
+    tags = pd.DataFrame({'tag_name': ['a', 'b', 'c', 'd']})
+    features, book_ids, tag_names = btf.build_sparse_tag_features(book_tags,
+                                                                  tags)
+
+    expected = [btf.build_tag_features(book_tags[book_tags['book_id'] == i],
+                                       tags)
+                for i in [2, 3]]
+    assert features.toarray().tolist() == expected
+    assert features.nnz == 4
+    assert book_ids.tolist() == [2, 3]
+    assert tag_names.tolist() == ['a', 'b', 'c', 'd']
+
+
+def test_tag_features_persisted(tmpdir):
+    book_tags = pd.DataFrame({'book_id': [5, 7, 7],
+                              'tag_name': ['a', 'b', 'c'],
+                              'count': [1, 1, 3]})
+    tags = pd.DataFrame({'tag_name': ['a', 'b', 'c']})
+    filepath = join(str(tmpdir), 'tag_features.npz')
+    tag_features = btf.build_sparse_tag_features(book_tags, tags)
+    btf.save_tag_features(filepath, tag_features)
+    result = btf.read_tag_features(filepath)
+
+    assert (result.features != tag_features.features).nnz == 0
+    assert result.book_ids.tolist() == [5, 7]
+    assert result.tag_names.tolist() == ['a', 'b', 'c']
+    assert result.to_frame().equals(
+        btf.build_all_tag_features(book_tags, tags))
+
+
+@pytest.mark.parametrize("book_tags", [
+    # unknown tag
+    {'book_id': [1], 'tag_name': ['c'], 'count': [1]},
+    # repeated tag of a book
+    {'book_id': [1, 1], 'tag_name': ['a', 'a'], 'count': [1, 2]},
+    # counts summing to zero
+    {'book_id': [1, 2, 2], 'tag_name': ['a', 'a', 'b'], 'count': [0, 1, 1]},
+    {'book_id': [1, 1], 'tag_name': ['a', 'b'], 'count': [1, -1]},
+    # missing book
+    {'book_id': [None], 'tag_name': ['a'], 'count': [1]}
+])
+def test_build_sparse_tag_features_invalid_data(book_tags):
+    with pytest.raises(btf.InvalidTagFeaturesError):
+        btf.build_sparse_tag_features(pd.DataFrame(book_tags),
+                                      pd.DataFrame({'tag_name': ['a', 'b']}))
+
+
 @pytest.mark.parametrize("book_tags, tags, expected", [(
     join(test_case_dir, "build_tag_features-book_tags-simple.csv"),
     join(test_case_dir, "build_tag_features-tags-simple.csv"),
@@ -1,11 +1,19 @@
+from statistics import mean
+
+import numpy as np
+import pandas as pd
 import pytest
 
 from os.path import dirname, join, realpath
 
 from booksuggest.evaluation.cb_evaluation import (
+    _without_rec_count,
+    calculate_score_curves,
+    calculate_scores,
     calculate_single_score,
     read_similar_books
 )
+from booksuggest.evaluation.metrics import precision, recall
 
 
 test_case_dir = join(dirname(realpath(__file__)), 'data')
@@ -35,3 +43,49 @@ def test_calculate_single_score(
 ):
     result = calculate_single_score(prediction_file, test_cases, 3)
     assert result == expected
+
+
+def _reference_score(predictions, test_cases, rec_count):
+    precisions = [precision(similar[:rec_count], test_cases[book_id])
+                  for book_id, similar in predictions.items()]
+    recalls = [recall(similar[:rec_count], test_cases[book_id])
+               for book_id, similar in predictions.items()]
+    hits = [len(set(similar[:rec_count]) & set(test_cases[book_id]))
+            for book_id, similar in predictions.items()]
+    return (round(mean(precisions), 3), round(mean(recalls), 3),
+            sum(hits))
+
+
+def test_calculate_scores_parity(tmpdir):
+    random_state = np.random.RandomState(0)
+    test_cases = {book_id: list(random_state.choice(50, 5, replace=False))
+                  for book_id in range(20)}
+    all_predictions = dict()
+    for model in ['a', 'b', 'c']:
+        # similar books of model c are repeated
+        predictions = {book_id: list(random_state.choice(
+                           50, 10, replace=(model == 'c')))
+                       for book_id in range(20)}
+        # books are interleaved, order of similar books is kept
+        rows = [(book_id, similar[rank])
+                for rank in range(10)
+                for book_id, similar in predictions.items()]
+        pd.DataFrame(rows, columns=['book_id', 'similar_book_id']).to_csv(
+            str(tmpdir.join(f'{model}.csv')), index=False)
+        all_predictions[f'{model}.csv'] = predictions
+
+    cache_dir = str(tmpdir.join('cache'))
+    for _ in range(2):
+        curves = calculate_score_curves(str(tmpdir), test_cases, 10,
+                                        jobs=2, cache_dir=cache_dir)
+        for curve in curves:
+            predictions = all_predictions[curve[0]['model']]
+            for score in curve:
+                expected = _reference_score(predictions, test_cases,
+                                            score['rec_count'])
+                assert (score['precision'], score['recall'],
+                        score['correct_hits']) == expected
+
+    assert len(tmpdir.join('cache').listdir()) == 3
+    scores = calculate_scores(str(tmpdir), test_cases, 10, jobs=1)
+    assert scores == [_without_rec_count(curve[-1]) for curve in curves]
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from os.path import dirname, join, realpath
+
+from booksuggest.models.cf_batch_estimation import known_items_bitmap
+from booksuggest.models.cf_recommend_models import KNNRecommendationModel
+
+test_case_dir = join(dirname(realpath(__file__)), 'data')
+
+
+@pytest.mark.parametrize("ratings_filepath, k", [
+    (join(test_case_dir, 'ratings-medium.csv'), 30),
+    (join(test_case_dir, 'ratings-medium.csv'), 3),
+    (join(test_case_dir, 'ratings-simple.csv'), 1),
+])
+def test_knn_batch_estimation(ratings_filepath, k):
+    model = KNNRecommendationModel(ratings_filepath)
+    model.train()
+    model.algorithm.k = k
+    ratings = list(model.generate_antitest_set(list(model.users)))
+    ratings += [(1, 11, 4.0), (1000, 11, 4.0), (1, 1000, 4.0)]
+
+    expected = model.algorithm.test(ratings)
+    result = model.test(ratings)
+
+    assert [x.est for x in result] == pytest.approx([x.est for x in expected])
+    assert [x.details for x in result] == [x.details for x in expected]
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_known_items_bitmap(shuffle):
+    trainset = KNNRecommendationModel(
+        join(test_case_dir, 'ratings-medium.csv')).trainset
+    positions = np.arange(trainset.n_items)
+    if shuffle:
+        np.random.RandomState(0).shuffle(positions)
+
+    known = np.zeros((trainset.n_users, trainset.n_items), dtype=bool)
+    for user, user_ratings in trainset.ur.items():
+        known[user, positions[[item for item, _ in user_ratings]]] = True
+
+    np.testing.assert_array_equal(
+        known_items_bitmap(trainset, positions if shuffle else None),
+        np.packbits(known, axis=1))
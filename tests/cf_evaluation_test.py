@@ -1,8 +1,27 @@
 import pytest
 from os.path import dirname, join, realpath
+import numpy as np
 import pandas as pd
 
-from booksuggest.evaluation.cf_effectiveness_evaluation import evaluate_on_predictions
+from surprise import Prediction, accuracy
+
+from booksuggest.evaluation.cf_accuracy_evaluation import (
+    evaluate_models,
+    fcp,
+    mae,
+    read_testset,
+    rmse
+)
+from booksuggest.evaluation.cf_effectiveness_evaluation import (
+    evaluate_on_predictions,
+    evaluate_on_predictions_up_to
+)
+from booksuggest.evaluation.metrics import (
+    precision_thresholded,
+    recall_thresholded
+)
+from booksuggest.models.cf_recommend_models import SlopeOneRecommendationModel
+from booksuggest.utils.serialization import save_object
 
 test_case_dir = join(dirname(realpath(__file__)), 'data')
 
@@ -17,3 +36,68 @@ def test_to_read_evaluation(predictions_filepath, to_read_filepath, expected):
     to_read_df = pd.read_csv(to_read_filepath)
     result = evaluate_on_predictions(predictions_df, to_read_df, 4, 20)
     assert result == expected
+
+
+def test_evaluation_up_to_n_parity():
+    random_state = np.random.RandomState(0)
+    predictions_df = pd.DataFrame({
+        'user_id': np.repeat(np.arange(1, 31), 15),
+        'book_id': np.tile(np.arange(100, 115), 30),
+        'est': random_state.uniform(1, 5, size=450).round(1)
+    }).sample(frac=1, random_state=0)
+    test_df = pd.DataFrame({
+        'user_id': random_state.randint(1, 36, size=200),
+        'book_id': random_state.randint(95, 120, size=200)
+    })
+
+    precisions, recalls = evaluate_on_predictions_up_to(
+        predictions_df, test_df, 3.5, 20)
+    for n in range(1, 21):
+        expected_precisions, expected_recalls = list(), list()
+        for user_id, group in test_df.groupby('user_id'):
+            user_predictions = predictions_df[
+                predictions_df['user_id'] == user_id].head(n)
+            pred_tuples = list(zip(user_predictions['book_id'],
+                                   user_predictions['est']))
+            ground_truth = group['book_id'].tolist()
+            expected_precisions.append(
+                precision_thresholded(pred_tuples, ground_truth, 3.5))
+            expected_recalls.append(
+                recall_thresholded(pred_tuples, ground_truth, 3.5))
+        assert precisions[n - 1] == pytest.approx(np.mean(expected_precisions))
+        assert recalls[n - 1] == pytest.approx(np.mean(expected_recalls))
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_accuracy_metrics_parity(seed):
+    random_state = np.random.RandomState(seed)
+    size = 500
+    users = random_state.randint(0, 40, size=size)
+    ratings = random_state.randint(1, 6, size=size).astype(float)
+    # rounded estimations produce ties
+    estimations = random_state.uniform(1, 5, size=size).round(1)
+    predictions = [Prediction(uid, iid, r_ui, est, dict())
+                   for uid, iid, r_ui, est
+                   in zip(users, range(size), ratings, estimations)]
+
+    assert rmse(ratings, estimations) == pytest.approx(
+        accuracy.rmse(predictions, verbose=False))
+    assert mae(ratings, estimations) == pytest.approx(
+        accuracy.mae(predictions, verbose=False))
+    assert fcp(users, ratings, estimations) == pytest.approx(
+        accuracy.fcp(predictions, verbose=False))
+
+
+def test_evaluate_models(tmpdir):
+    ratings_filepath = join(test_case_dir, 'ratings-medium.csv')
+    model = SlopeOneRecommendationModel(ratings_filepath)
+    model.train()
+    model_filepath = str(tmpdir.join('slopeone-model.pkl'))
+    save_object(model, model_filepath)
+
+    testset = read_testset(ratings_filepath)
+    predictions = model.test(list(zip(*testset)))
+    [result] = evaluate_models([model_filepath], testset, jobs=1)
+    assert result == pytest.approx((accuracy.rmse(predictions, verbose=False),
+                                    accuracy.mae(predictions, verbose=False),
+                                    accuracy.fcp(predictions, verbose=False)))
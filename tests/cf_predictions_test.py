@@ -1,6 +1,14 @@
+import io
+
 import pytest
 from booksuggest.models.cf_recommend_models import SlopeOneRecommendationModel
-from booksuggest.evaluation.cf_predict_models import _chunk_users, predict_model
+from booksuggest.evaluation.cf_predict_models import (
+    _block_users,
+    _predict_batch,
+    model_fingerprint,
+    predict_model,
+    write_predictions
+)
 from os.path import dirname, join, realpath
 import pandas as pd
 
@@ -15,14 +23,14 @@ def test_generate_antitest(ratings_filepath, expected):
     assert list(model.generate_antitest_set(model.users)) == expected
 
 
-@pytest.mark.parametrize("ratings_filepath, chunks_count, expected", [
-    (join(test_case_dir, "ratings-simple.csv"), 1, [[1, 2]]),
-    (join(test_case_dir, "ratings-simple.csv"), 2, [[1], [2]]),
-    (join(test_case_dir, "ratings-simple.csv"), 4, [[1], [2], [], []]),
+@pytest.mark.parametrize("ratings_filepath, block_size, expected", [
+    (join(test_case_dir, "ratings-simple.csv"), 1, [[1], [2]]),
+    (join(test_case_dir, "ratings-simple.csv"), 2, [[1, 2]]),
+    (join(test_case_dir, "ratings-simple.csv"), 4, [[1, 2]]),
 ])
-def test_users_chunking(ratings_filepath, chunks_count, expected):
+def test_users_blocks(ratings_filepath, block_size, expected):
     users = list(SlopeOneRecommendationModel(ratings_filepath).users)
-    assert _chunk_users(users, chunks_count) == expected
+    assert _block_users(users, block_size) == expected
 
 
 @pytest.mark.parametrize("ratings_filepath, expected", [
@@ -31,9 +39,71 @@ def test_users_chunking(ratings_filepath, chunks_count, expected):
 def test_users_chunking_pipeline(ratings_filepath, expected):
     model = SlopeOneRecommendationModel(ratings_filepath)
     model.train()
-    df1 = predict_model(model, 1, 2, 0)
-    df2 = predict_model(model, 1, 2, 1)
-    df = df1.append(df2)
-    results = [(x.user_id, x.book_id)
-               for x in df[['user_id', 'book_id']].itertuples()]
-    assert results == expected
+    for chunks_count, batch_size in [(1, 1), (2, 1), (2, 100)]:
+        df = predict_model(model, 1, chunks_count, batch_size)
+        results = [(x.user_id, x.book_id)
+                   for x in df[['user_id', 'book_id']].itertuples()]
+        assert results == expected
+
+
+def test_predictions_partitions_merge():
+    model = SlopeOneRecommendationModel(
+        join(test_case_dir, "ratings-medium.csv"))
+    model.train()
+    expected = predict_model(model, 5, 1, 100000)
+    assert expected['user_id'].is_monotonic_increasing
+    assert (expected.groupby('user_id').size() == 5).all()
+    for chunks_count, batch_size, block_size in [(3, 1, 7), (4, 500, 1)]:
+        df = predict_model(model, 5, chunks_count, batch_size, block_size)
+        pd.testing.assert_frame_equal(df, expected)
+
+
+@pytest.mark.parametrize("fingerprint, expected", [
+    ('model-1', ['1,100,5.0', '2,11,5.0']),
+    ('model-2', ['1,13,5.0', '2,11,5.0'])
+])
+def test_predictions_resume(tmpdir, fingerprint, expected):
+    model = SlopeOneRecommendationModel(
+        join(test_case_dir, "ratings-simple.csv"))
+    model.train()
+    work_dir = tmpdir.join('predictions.parts')
+    work_dir.mkdir()
+    work_dir.join('block-000000.csv').write('1,100,5.0\n')
+    work_dir.join('manifest.json').write(
+        '{"parameters": {"users_count": 2, "block_size": 1, '
+        '"recommendation_count": 1, "model": "model-1"}, "completed": [0]}')
+
+    output = io.StringIO()
+    write_predictions(model, output, 1, 1, block_size=1,
+                      work_dir=str(work_dir), resume=True,
+                      model_fingerprint=fingerprint)
+    assert output.getvalue().splitlines() == [
+        'user_id,book_id,est'] + expected
+    assert not work_dir.exists()
+
+
+def test_model_fingerprint_changes(tmpdir):
+    model_file = tmpdir.join('model.pkl')
+    model_file.write('model')
+    fingerprint = model_fingerprint(str(model_file))
+    assert model_fingerprint(str(model_file)) == fingerprint
+
+    model_file.write('retrained model')
+    assert model_fingerprint(str(model_file)) != fingerprint
+
+
+def test_predict_batch():
+    model = SlopeOneRecommendationModel(
+        join(test_case_dir, "ratings-medium.csv"))
+    model.train()
+    users = [5, 1, 3]
+    cases = list(model.generate_antitest_set(users))
+    df = _predict_batch(model, cases, 3)
+
+    assert df['user_id'].tolist() == [1] * 3 + [3] * 3 + [5] * 3
+    for user_id in users:
+        expected = model.recommend(user_id, 3)
+        user_df = df[df['user_id'] == user_id]
+        assert user_df['book_id'].tolist() == list(expected.keys())
+        assert user_df['est'].tolist() == pytest.approx(
+            list(expected.values()))
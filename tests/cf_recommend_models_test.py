@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from os.path import dirname, join, realpath
+
+from booksuggest.models.cf_recommend_models import (
+    PopularityRecommendationModel,
+    SlopeOneRecommendationModel,
+    with_popularity_fallback
+)
+from booksuggest.models.model_exceptions import UntrainedModelError
+from booksuggest.utils.serialization import read_object, save_object
+
+test_case_dir = join(dirname(realpath(__file__)), 'data')
+ratings_filepath = join(test_case_dir, 'ratings-medium.csv')
+
+
+@pytest.mark.parametrize("method", ['damped-mean', 'baseline'])
+def test_popularity_recommendations(method):
+    model = PopularityRecommendationModel(ratings_filepath)
+    model.train(method=method)
+    trainset = model.trainset
+    scores = model.scores
+    order = np.argsort(-scores, kind='mergesort')
+
+    for user_id in model.users:
+        user = trainset.to_inner_uid(user_id)
+        rated = {item for item, _ in trainset.ur[user]}
+        expected = [trainset.to_raw_iid(item) for item in order
+                    if item not in rated][:10]
+        assert list(model.recommend(user_id, 10).keys()) == expected
+
+    unknown_user_recommendations = model.recommend(1000, 10)
+    assert list(unknown_user_recommendations.keys()) == \
+        [trainset.to_raw_iid(item) for item in order[:10]]
+
+
+def test_popularity_damped_mean():
+    model = PopularityRecommendationModel(ratings_filepath)
+    model.train(damping=0)
+    trainset = model.trainset
+    for item, item_ratings in trainset.ir.items():
+        mean_rating = np.mean([rating for _, rating in item_ratings])
+        assert model.scores[item] == pytest.approx(mean_rating)
+
+
+def test_popularity_untrained():
+    model = PopularityRecommendationModel(ratings_filepath)
+    with pytest.raises(UntrainedModelError):
+        model.recommend(1)
+
+
+def test_popularity_unknown_method():
+    model = PopularityRecommendationModel(ratings_filepath)
+    with pytest.raises(ValueError):
+        model.train(method='unknown')
+
+
+def test_popularity_fallback():
+    model = SlopeOneRecommendationModel(ratings_filepath)
+    model.train()
+    fallback_model = with_popularity_fallback(model)
+
+    assert fallback_model.recommend(1, 10) == model.recommend(1, 10)
+    assert not fallback_model.knows_user(1000)
+    assert len(fallback_model.recommend(1000, 10)) == 10
+    with pytest.raises(ValueError):
+        model.recommend(1000, 10)
+
+
+def test_popularity_fallback_saved(tmpdir, monkeypatch):
+    model = SlopeOneRecommendationModel(ratings_filepath)
+    model.train()
+    model_filepath = str(tmpdir.join('model.pkl'))
+    save_object(model, model_filepath)
+    expected = with_popularity_fallback(model).recommend(1000, 10)
+    assert with_popularity_fallback(
+        model, model_filepath).recommend(1000, 10) == expected
+    assert tmpdir.join('model.pkl.popularity').check(dir=True)
+
+    def train(*args, **kwargs):
+        raise AssertionError('The popularity model is trained again')
+
+    monkeypatch.setattr(PopularityRecommendationModel, 'train', train)
+    model = read_object(model_filepath)
+    fallback_model = with_popularity_fallback(model, model_filepath)
+    assert fallback_model.recommend(1000, 10) == expected
+    assert fallback_model.recommend(1, 10) == model.recommend(1, 10)
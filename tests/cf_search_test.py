@@ -0,0 +1,91 @@
+import pytest
+from os.path import dirname, join, realpath
+import numpy as np
+import pandas as pd
+
+from surprise import Dataset, KNNBaseline, Reader, SVD
+from surprise.model_selection import GridSearchCV, KFold
+
+from booksuggest.evaluation.cf_search import (
+    grid_search,
+    halving_budgets,
+    successive_halving
+)
+
+test_case_dir = join(dirname(realpath(__file__)), 'data')
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    ratings_df = pd.read_csv(join(test_case_dir, 'ratings-medium.csv'))
+    return Dataset.load_from_df(ratings_df, Reader(rating_scale=(1, 5)))
+
+
+@pytest.mark.parametrize("algo_class, param_grid", [
+    (KNNBaseline, {'bsl_options': {'method': ['als'],
+                                   'reg_i': [5, 10],
+                                   'n_epochs': [5]},
+                   'k': [5, 30],
+                   'min_k': [1, 2],
+                   'sim_options': {'name': ['pearson_baseline'],
+                                   'user_based': [False],
+                                   'shrinkage': [0, 100]},
+                   'verbose': [False]}),
+    (SVD, {'n_factors': [5, 10],
+           'n_epochs': [5],
+           'reg_all': [0.02, 0.1],
+           'random_state': [5]})
+])
+def test_grid_search_parity(dataset, algo_class, param_grid):
+    gs = GridSearchCV(algo_class, param_grid,
+                      measures=['rmse', 'mae', 'fcp'],
+                      cv=KFold(3, random_state=7))
+    gs.fit(dataset)
+    expected = pd.DataFrame.from_dict(gs.cv_results).sort_values(
+        'rank_test_rmse')
+
+    result = grid_search(algo_class, param_grid, dataset, n_splits=3,
+                         random_state=7, jobs=2)
+
+    assert list(result.columns) == list(expected.columns)
+    assert list(result['params']) == list(expected['params'])
+    scores_columns = [column for column in expected.columns
+                      if '_test_' in column and 'time' not in column]
+    assert np.allclose(result[scores_columns].values.astype(float),
+                       expected[scores_columns].values.astype(float))
+
+
+@pytest.mark.parametrize("min_budget, max_budget, eta, expected", [
+    (5, 45, 3, [5, 15, 45]),
+    (5, 40, 3, [13, 40]),
+    (1 / 9, 1.0, 3, [1 / 9, 1 / 3, 1.0]),
+    (10, 10, 2, [10])
+])
+def test_halving_budgets(min_budget, max_budget, eta, expected):
+    assert np.allclose(halving_budgets(min_budget, max_budget, eta), expected)
+
+
+@pytest.mark.parametrize("resource, min_budget, max_budget", [
+    ('n_epochs', 2, 8),
+    ('fraction', 0.25, 1.0)
+])
+def test_successive_halving(dataset, resource, min_budget, max_budget):
+    param_grid = {'n_factors': [5, 10],
+                  'n_epochs': [8],
+                  'reg_all': [0.02, 0.1],
+                  'lr_all': [0.005, 0.01],
+                  'random_state': [5]}
+    expected = grid_search(SVD, param_grid, dataset, n_splits=3,
+                           random_state=7, jobs=2)
+
+    result = successive_halving(SVD, param_grid, dataset, resource,
+                                min_budget, max_budget, eta=2, n_splits=3,
+                                random_state=7, jobs=2)
+
+    assert list(result.columns) == list(expected.columns)
+    assert len(result) == len(expected)
+    best = result.iloc[0]
+    assert best['param_n_epochs'] == 8
+    expected_best = expected[expected['params'] == best['params']].iloc[0]
+    assert np.isclose(best['mean_test_rmse'], expected_best['mean_test_rmse'])
+    assert result['mean_test_rmse'].iloc[0] < result['mean_test_rmse'].iloc[1]
@@ -0,0 +1,138 @@
+import pickle
+
+import numpy as np
+import pytest
+from os.path import dirname, join, realpath
+
+from booksuggest.models.cf_recommend_models import (
+    KNNRecommendationModel,
+    PopularityRecommendationModel,
+    SlopeOneRecommendationModel,
+    SvdRecommendationModel
+)
+from booksuggest.models.cf_serving_models import (
+    export_serving_model,
+    quantize_rows,
+    read_serving_model
+)
+
+test_case_dir = join(dirname(realpath(__file__)), 'data')
+ratings_filepath = join(test_case_dir, 'ratings-medium.csv')
+
+
+def train_model(model_class):
+    model = model_class(ratings_filepath)
+    if model_class is SvdRecommendationModel:
+        model.train(random_state=44)
+    else:
+        model.train()
+    return model
+
+
+@pytest.fixture(params=[
+    SvdRecommendationModel,
+    KNNRecommendationModel,
+    SlopeOneRecommendationModel,
+    PopularityRecommendationModel
+])
+def models(request, tmpdir):
+    model = train_model(request.param)
+    serving_model_dir = str(tmpdir.join('model.serving'))
+    export_serving_model(model, serving_model_dir)
+    return model, read_serving_model(serving_model_dir)
+
+
+def test_serving_model_recommendations(models):
+    model, serving_model = models
+    assert list(model.users) == list(serving_model.users)
+    for user_id in model.users:
+        expected = model.recommend(user_id, 10)
+        result = serving_model.recommend(user_id, 10)
+        assert list(result.keys()) == list(expected.keys())
+        assert list(result.values()) == pytest.approx(list(expected.values()))
+
+
+def test_serving_model_test(models):
+    model, serving_model = models
+    # ratings of users are interleaved
+    ratings = [(user_id, book_id, 4.0)
+               for book_id in [100, 101, 159, 1000]
+               for user_id in [3, 1, 1000, 2]]
+    expected = model.test(ratings)
+    result = serving_model.test(ratings)
+    assert [x.est for x in result] == pytest.approx([x.est for x in expected])
+    assert ([x.details['was_impossible'] for x in result] ==
+            [x.details['was_impossible'] for x in expected])
+
+
+def test_serving_model_unknown_user_recommendations(models):
+    model, serving_model = models
+    popularity_model = PopularityRecommendationModel(trainset=model.trainset)
+    popularity_model.train()
+    expected = popularity_model.recommend(1000, 10)
+    result = serving_model.recommend(1000, 10)
+    assert len(result) == 10
+    assert result == pytest.approx(expected)
+    assert list(result.keys()) == list(expected.keys())
+
+
+def test_serving_model_pickled_as_reference(models):
+    model, serving_model = models
+    pickled = pickle.dumps(serving_model)
+    assert len(pickled) < 1000
+    unpickled = pickle.loads(pickled)
+    user_id = next(iter(model.users))
+    assert unpickled.recommend(user_id, 10) == serving_model.recommend(
+        user_id, 10)
+
+
+def test_serving_model_antitest(models):
+    model, serving_model = models
+    users = list(model.users)[:5]
+    assert (list(serving_model.generate_antitest_set(users)) ==
+            list(model.generate_antitest_set(users)))
+
+
+
+@pytest.mark.parametrize("dtype, tolerance", [
+    ('float16', 1e-3),
+    ('int8', 1e-2)
+])
+def test_quantize_rows(dtype, tolerance):
+    matrix = np.array([[0.5, -0.25, 0.1], [0, 0, 0], [-2, 1, 0.5]])
+    quantized, scale = quantize_rows(matrix, dtype)
+    assert quantized.dtype == np.dtype(dtype)
+    np.testing.assert_allclose(quantized * scale[:, np.newaxis], matrix,
+                               atol=tolerance * np.abs(matrix).max())
+
+
+@pytest.mark.parametrize("quantization", ['float16', 'int8'])
+def test_quantized_serving_model(quantization, tmpdir):
+    model = train_model(SvdRecommendationModel)
+    serving_model_dir = str(tmpdir.join('model.serving'))
+    export_serving_model(model, serving_model_dir, quantization, 4)
+    serving_model = read_serving_model(serving_model_dir)
+    for user_id in model.users:
+        expected = model.recommend(user_id, 5)
+        result = serving_model.recommend(user_id, 5)
+        assert list(result.keys()) == list(expected.keys())
+
+
+def test_indexed_serving_model(tmpdir):
+    model = train_model(SvdRecommendationModel)
+    serving_model_dir = str(tmpdir.join('model.serving'))
+    export_serving_model(model, serving_model_dir, mips_recall_target=1)
+    serving_model = read_serving_model(serving_model_dir)
+    for user_id in model.users:
+        expected = model.recommend(user_id, 5)
+        result = serving_model.recommend(user_id, 5)
+        assert list(result.keys()) == list(expected.keys())
+        assert list(result.values()) == pytest.approx(list(expected.values()))
+
+
+def test_quantized_indexed_serving_model(tmpdir):
+    model = train_model(SvdRecommendationModel)
+    serving_model_dir = str(tmpdir.join('model.serving'))
+    with pytest.raises(ValueError):
+        export_serving_model(model, serving_model_dir, 'int8',
+                             mips_recall_target=1)
@@ -2,6 +2,7 @@ import numpy as np
 from numpy.testing import assert_array_equal
 import pandas as pd
 import pytest
+from scipy.sparse import issparse
 from os.path import dirname, join, realpath
 from unittest.mock import MagicMock, Mock
 from booksuggest.models.content_analyzer import (
@@ -75,6 +76,8 @@ def test_content_analyzers(
     features = content_analyzer.build_features(book_data)
     feature_vec = content_analyzer.get_feature_vector(1)
 
+    if issparse(features):
+        features, feature_vec = features.toarray(), feature_vec.toarray()
     assert_array_equal(features, expected_features)
     assert_array_equal(feature_vec, expected_vector)
 
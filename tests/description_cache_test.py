@@ -0,0 +1,100 @@
+import os
+
+import booksuggest.data.prepare_description as prepare_description
+from booksuggest.data.description_cache import DescriptionCache
+from booksuggest.data.token_normalizer import TokenNormalizer
+
+
+def test_description_key_depends_on_options():
+    key = DescriptionCache.key('A description', {'remove_proper_nouns': True})
+    assert key == DescriptionCache.key(
+        'A description', {'remove_proper_nouns': True})
+    assert key != DescriptionCache.key(
+        'A description', {'remove_proper_nouns': False})
+    assert key != DescriptionCache.key(
+        'A description.', {'remove_proper_nouns': True})
+
+
+def test_description_cache_persisted(tmpdir):
+    cache_path = os.path.join(str(tmpdir), 'descriptions.sqlite')
+    entries = [('key-%d' % i, 'en', 'cleaned %d' % i) for i in range(1200)]
+    entries.append(('key-fr', 'fr', None))
+    with DescriptionCache(cache_path) as cache:
+        cache.put_many(entries)
+        cache.put_many([('key-0', 'en', 'updated')])
+
+    with DescriptionCache(cache_path) as cache:
+        cached = cache.get_many(
+            ['key-0', 'key-1199', 'key-fr', 'key-missing'])
+
+    assert cached == {'key-0': ('en', 'updated'),
+                      'key-1199': ('en', 'cleaned 1199'),
+                      'key-fr': ('fr', None)}
+
+
+class CountingCleaner():
+    """Cleaner recording cleaned descriptions in a file shared
+    by worker processes.
+    """
+
+    calls_path = None
+
+    def __init__(self, remove_proper_nouns, vocabulary=None):
+        self.remove_proper_nouns = remove_proper_nouns
+        self.normalizer = TokenNormalizer(str.lower, vocabulary=vocabulary)
+
+    @property
+    def options(self):
+        return prepare_description.cleaning_options(self.remove_proper_nouns)
+
+    def detect_and_clean(self, description):
+        with open(self.calls_path, 'a') as calls_file:
+            calls_file.write(description + '\n')
+        if description.startswith('fr'):
+            return 'fr', None
+
+        words = [self.normalizer.normalize(word)
+                 for word in description.split()]
+        return 'en', ' '.join(words)
+
+
+def cleaned_descriptions(calls_path):
+    if not os.path.exists(calls_path):
+        return []
+
+    with open(calls_path) as calls_file:
+        return sorted(calls_file.read().splitlines())
+
+
+def test_cached_descriptions_not_cleaned_again(tmpdir, monkeypatch):
+    cache_path = os.path.join(str(tmpdir), 'descriptions.sqlite')
+    calls_path = os.path.join(str(tmpdir), 'calls.txt')
+    monkeypatch.setattr(CountingCleaner, 'calls_path', calls_path)
+    monkeypatch.setattr(prepare_description, 'DescriptionCleaner',
+                        CountingCleaner)
+
+    def clean(descriptions, remove_proper_nouns=False):
+        result = prepare_description.clean_description_list(
+            descriptions, remove_proper_nouns, jobs=2, chunk_size=1,
+            cache_path=cache_path)
+        return [value if isinstance(value, str) else 'NaN'
+                for value in result]
+
+    descriptions = ['Book A', 'fr B', 'Book A', 'Book C']
+    assert clean(descriptions) == ['book a', 'NaN', 'book a', 'book c']
+    assert cleaned_descriptions(calls_path) == ['Book A', 'Book C', 'fr B']
+
+    os.remove(calls_path)
+    assert clean(descriptions + ['Book D', 'Book D']) == [
+        'book a', 'NaN', 'book a', 'book c', 'book d', 'book d']
+    assert cleaned_descriptions(calls_path) == ['Book D']
+
+    # other cleaning options do not share cached descriptions
+    os.remove(calls_path)
+    assert clean(['Book A'], remove_proper_nouns=True) == ['book a']
+    assert cleaned_descriptions(calls_path) == ['Book A']
+
+    with DescriptionCache(cache_path) as cache:
+        key = DescriptionCache.key(
+            'fr B', prepare_description.cleaning_options(False))
+        assert cache.get_many([key]) == {key: ('fr', None)}
@@ -1,7 +1,22 @@
+import numpy as np
 import pytest
 
 from booksuggest.evaluation.metrics import (precision, precision_thresholded,
                                     recall, recall_thresholded)
+from booksuggest.evaluation.metrics import (
+    batch_average_precision,
+    batch_hit_rate,
+    batch_ndcg,
+    batch_novelty,
+    batch_precision,
+    batch_precision_thresholded,
+    batch_recall,
+    batch_recall_thresholded,
+    batch_reciprocal_rank,
+    catalog_coverage,
+    recommendations_matrix,
+    relevance_matrix
+)
 
 
 @pytest.mark.parametrize("recommendations, ground_truth, expected", [
@@ -9,7 +24,9 @@ from booksuggest.evaluation.metrics import (precision, precision_thresholded,
     ([1, 2, 3, 4], [1, 2, 5, 6], 0.5),
     ([1, 2, 3, 4], [5, 1, 2, 6], 0.5),
     ([], [1, 2], 0),
-    ([1, 2, 3, 4], [1, 2], 0.5)
+    ([1, 2, 3, 4], [1, 2], 0.5),
+    ([1, 1], [1], 0.5),
+    ([1, 2, 3, 1], [1, 5], 0.25)
 ])
 def test_precision(recommendations, ground_truth, expected):
     result = precision(recommendations, ground_truth)
@@ -21,7 +38,8 @@ def test_precision(recommendations, ground_truth, expected):
     ([1, 2], [1, 2, 3, 4], 0.5),
     ([1, 2], [4, 2, 1, 3], 0.5),
     ([1, 2, 3, 4], [], 0),
-    ([1, 2], [1, 2], 1)
+    ([1, 2], [1, 2], 1),
+    ([1, 2, 3, 1], [1, 5], 0.5)
 ])
 def test_recall(recommendations, ground_truth, expected):
     result = recall(recommendations, ground_truth)
@@ -33,6 +51,7 @@ def test_recall(recommendations, ground_truth, expected):
     ([(11, 5), (22, 4)], [11, 22], 5, 1/2),
     ([(11, 4), (33, 4)], [11, 22], 4, 1/2),
     ([(11, 2), (33, 1)], [11, 22], 5, 0),
+    ([(11, 2), (22, 4), (11, 5)], [11, 22], 4, 2/3),
 ])
 def test_precision_with_threshold(recommendations, ground_truth,
                                   threshold, expected):
@@ -45,8 +64,79 @@ def test_precision_with_threshold(recommendations, ground_truth,
     ([(11, 5), (22, 4), (33, 5)], [11, 22, 33], 5, 2/3),
     ([(11, 4), (33, 4), (44, 5)], [11, 22, 33], 4, 2/3),
     ([(11, 2), (33, 1), (44, 5)], [11, 22, 33], 5, 0),
+    ([(11, 5), (11, 4), (33, 2)], [11, 22, 33], 4, 1/3),
 ])
 def test_recall__thresholded(recommendations, ground_truth,
                              threshold, expected):
     result = recall_thresholded(recommendations, ground_truth, threshold)
     assert result == expected
+
+
+@pytest.fixture
+def random_matrices():
+    random_state = np.random.RandomState(0)
+    recommendations = [list(random_state.permutation(30)[:size])
+                       for size in random_state.randint(0, 10, size=40)]
+    # some users are recommended the same items multiple times
+    recommendations += [list(random_state.choice(5, size))
+                        for size in random_state.randint(0, 10, size=10)]
+    scores = [list(random_state.randint(1, 6, size=len(items)))
+              for items in recommendations]
+    ground_truth = [list(random_state.choice(30, size, replace=False))
+                    for size in random_state.randint(0, 8, size=50)]
+    recommended, scores_matrix = recommendations_matrix(
+        recommendations, 30, scores)
+    relevant = relevance_matrix(ground_truth, 30)
+    return (recommendations, scores, ground_truth,
+            recommended, scores_matrix, relevant)
+
+
+@pytest.mark.parametrize("k", [None, 1, 5])
+def test_batch_metrics_parity(random_matrices, k):
+    (recommendations, scores, ground_truth,
+     recommended, scores_matrix, relevant) = random_matrices
+    top_k = [items[:k] for items in recommendations]
+    scored_top_k = [list(zip(items, items_scores))[:k]
+                    for items, items_scores in zip(recommendations, scores)]
+
+    np.testing.assert_allclose(
+        batch_precision(recommended, relevant, k),
+        [precision(*args) for args in zip(top_k, ground_truth)])
+    np.testing.assert_allclose(
+        batch_recall(recommended, relevant, k),
+        [recall(*args) for args in zip(top_k, ground_truth)])
+    np.testing.assert_allclose(
+        batch_precision_thresholded(recommended, relevant,
+                                    scores_matrix, 4, k),
+        [precision_thresholded(*args, 4)
+         for args in zip(scored_top_k, ground_truth)])
+    np.testing.assert_allclose(
+        batch_recall_thresholded(recommended, relevant,
+                                 scores_matrix, 4, k),
+        [recall_thresholded(*args, 4)
+         for args in zip(scored_top_k, ground_truth)])
+
+
+def test_batch_ranking_metrics():
+    recommended, _ = recommendations_matrix([[0, 1, 2], [3, 4], []], 6)
+    relevant = relevance_matrix([[1, 2, 5], [0], [1]], 6)
+    discounts = 1 / np.log2(np.arange(2, 5))
+
+    np.testing.assert_allclose(
+        batch_ndcg(recommended, relevant, 3),
+        [(discounts[1] + discounts[2]) / discounts.sum(), 0, 0])
+    np.testing.assert_allclose(
+        batch_average_precision(recommended, relevant, 3),
+        [(1 / 2 + 2 / 3) / 3, 0, 0])
+    np.testing.assert_allclose(
+        batch_reciprocal_rank(recommended, relevant), [1 / 2, 0, 0])
+    np.testing.assert_allclose(
+        batch_reciprocal_rank(recommended, relevant, 1), [0, 0, 0])
+    np.testing.assert_allclose(
+        batch_hit_rate(recommended, relevant), [1, 0, 0])
+    assert catalog_coverage(recommended) == 5 / 6
+    assert catalog_coverage(recommended, 1) == 2 / 6
+
+    popularity = np.array([0.5, 0.25, 0.5, 1, 0.125, 1])
+    np.testing.assert_allclose(
+        batch_novelty(recommended, popularity), [4 / 3, 3 / 2, 0])
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from booksuggest.models.mips_index import NormOrderedMipsIndex
+from booksuggest.utils.ranking import top_n_indices
+
+
+def brute_force(item_factors, item_biases, query, n, offset, clip, excluded):
+    scores = np.clip(offset + item_biases + item_factors.dot(query), *clip)
+    scores[excluded] = -np.inf
+    return top_n_indices(scores, n)
+
+
+@pytest.mark.parametrize("n, offset, clip", [
+    (1, 0, (-np.inf, np.inf)),
+    (20, 3.8, (1, 5)),
+    (50, 4.5, (1, 5))
+])
+def test_exact_search(n, offset, clip):
+    random_state = np.random.RandomState(44)
+    item_factors = (random_state.normal(0, 0.1, (2000, 10)) *
+                    random_state.lognormal(0, 0.7, (2000, 1)))
+    item_biases = random_state.normal(0, 0.3, 2000)
+    index = NormOrderedMipsIndex.build(item_factors, item_biases,
+                                       block_size=64)
+
+    for query in random_state.normal(0, 0.5, (20, 10)):
+        excluded = random_state.rand(2000) < 0.05
+        items, _ = index.search(query, n, offset, clip, excluded)
+        expected = brute_force(item_factors, item_biases, query, n, offset,
+                               clip, excluded)
+        assert items.tolist() == expected.tolist()
+
+
+def test_calibrated_search():
+    random_state = np.random.RandomState(44)
+    item_factors = random_state.normal(0, 1, (2000, 10))
+    item_biases = np.zeros(2000)
+    queries = random_state.normal(0, 1, (50, 10))
+    index = NormOrderedMipsIndex.build(item_factors, item_biases,
+                                       block_size=64)
+
+    bound_scale = index.calibrate(queries, 10, 0.9)
+    recall = np.mean([
+        len(set(index.search(query, 10)[0]) &
+            set(brute_force(item_factors, item_biases, query, 10, 0,
+                            (-np.inf, np.inf), np.zeros(2000, bool)))) / 10
+        for query in queries
+    ])
+    assert bound_scale <= 1
+    assert recall >= 0.9
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from langdetect import DetectorFactory
+
+from booksuggest.data.prepare_description import (
+    DescriptionCleaner,
+    clean_description_list,
+    clean_single_description
+)
+
+
+def nltk_data_downloaded():
+    try:
+        DescriptionCleaner(True).clean('The book is written in English.')
+    except LookupError:
+        return False
+
+    return True
+
+
+pytestmark = pytest.mark.skipif(
+    not nltk_data_downloaded(),
+    reason='NLTK data is not downloaded, run make requirements')
+
+descriptions = [
+    'Harry Potter is going back to Hogwarts for his fifth year.',
+    'Le petit prince est un livre pour les enfants et pour les adultes.',
+    'The war against Voldemort is not going well.',
+    'A young wizard is learning magic with his friends in London.',
+    'Harry Potter is going back to Hogwarts for his fifth year.',
+    'Der Krieg gegen den dunklen Lord geht nicht gut und alle haben Angst.',
+    'Valentine Michael Smith is a human being raised on Mars.'
+]
+
+
+@pytest.mark.parametrize("remove_proper_nouns", [False, True])
+def test_clean_description_list(remove_proper_nouns):
+    # language detection is randomized
+    DetectorFactory.seed = 0
+    expected = [clean_single_description(description, remove_proper_nouns)
+                for description in descriptions]
+    result = clean_description_list(descriptions, remove_proper_nouns,
+                                    jobs=2, chunk_size=2)
+
+    assert [isinstance(value, float) and np.isnan(value)
+            for value in expected] == [False, True, False, False, False,
+                                       True, False]
+    assert [value if isinstance(value, str) else 'NaN' for value in result] \
+        == [value if isinstance(value, str) else 'NaN' for value in expected]
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from booksuggest.utils.ranking import grouped_top_n_indices, top_n_indices
+
+
+@pytest.mark.parametrize("n", [0, 1, 3, 10, 100])
+def test_top_n_indices(n):
+    scores = np.random.RandomState(0).randint(0, 5, size=50).astype(float)
+    expected = np.argsort(-scores, kind='mergesort')[:n]
+    np.testing.assert_array_equal(top_n_indices(scores, n), expected)
+
+
+@pytest.mark.parametrize("n", [0, 1, 3, 10])
+def test_grouped_top_n_indices(n):
+    random_state = np.random.RandomState(0)
+    groups = random_state.randint(0, 8, size=200)
+    scores = random_state.randint(0, 5, size=200).astype(float)
+
+    df = pd.DataFrame({'group': groups, 'score': scores})
+    expected = df.sort_values(['group', 'score'], ascending=[True, False],
+                              kind='mergesort').groupby('group').head(n)
+    result = grouped_top_n_indices(groups, scores, n)
+    np.testing.assert_array_equal(result, expected.index.values)
+
+
+def test_grouped_top_n_indices_empty():
+    result = grouped_top_n_indices(np.empty(0), np.empty(0), 5)
+    assert len(result) == 0
@@ -0,0 +1,60 @@
+import os
+
+from booksuggest.data.token_normalizer import (
+    TokenNormalizer,
+    load_vocabulary,
+    save_vocabulary
+)
+
+
+def test_token_normalizer_memoizes_words():
+    calls = list()
+
+    def normalize_word(word):
+        calls.append(word)
+        return word.upper()
+
+    normalizer = TokenNormalizer(normalize_word, vocabulary={'cat': 'CAT'})
+    normalized = [normalizer.normalize(word)
+                  for word in ['cat', 'dog', 'cat', 'dog', 'bird']]
+
+    assert normalized == ['CAT', 'DOG', 'CAT', 'DOG', 'BIRD']
+    assert calls == ['dog', 'bird']
+    assert (normalizer.hits, normalizer.misses) == (3, 2)
+    assert normalizer.hit_rate == 0.6
+    assert normalizer.pop_new_words() == {'dog': 'DOG', 'bird': 'BIRD'}
+    assert normalizer.pop_new_words() == {}
+
+
+def test_token_normalizer_evicts_least_recently_used():
+    normalizer = TokenNormalizer(str.upper, max_size=2)
+    for word in ['a', 'b', 'a', 'c']:
+        normalizer.normalize(word)
+
+    assert normalizer.vocabulary == {'a': 'A', 'c': 'C'}
+
+
+def test_token_normalizer_vocabulary_persisted(tmpdir):
+    path = os.path.join(str(tmpdir), 'words.json')
+    normalizer = TokenNormalizer(str.upper)
+    normalizer.normalize('word')
+    normalizer.save(path, key='upper-1')
+
+    assert load_vocabulary(path, key='upper-1') == {'word': 'WORD'}
+    assert load_vocabulary(path, key='upper-2') == {}
+    assert load_vocabulary(os.path.join(str(tmpdir), 'missing.json')) == {}
+
+
+def test_vocabulary_merged_when_saved(tmpdir):
+    path = os.path.join(str(tmpdir), 'words.json')
+    save_vocabulary(path, {'a': 'A', 'b': 'B'}, key='upper-1')
+    save_vocabulary(path, {'c': 'C'}, key='upper-1')
+    assert load_vocabulary(path, key='upper-1') == {
+        'a': 'A', 'b': 'B', 'c': 'C'}
+
+    save_vocabulary(path, {'d': 'D'}, key='upper-1', max_size=2)
+    assert load_vocabulary(path, key='upper-1') == {'c': 'C', 'd': 'D'}
+
+    save_vocabulary(path, {'e': 'E'}, key='upper-2')
+    assert load_vocabulary(path, key='upper-2') == {'e': 'E'}
+    assert os.listdir(str(tmpdir)) == ['words.json']
@@ -1,47 +1,39 @@
+import io
 import pytest
 import re
+import shutil
 import os
+import zipfile
 
-import booksuggest.data.xml_parser
 import booksuggest.data.clean_book
-import booksuggest.data.prepare_similar_books
+import booksuggest.data.xml_parser
+import booksuggest.data.extract_book_xml
 
 current_path = os.path.dirname(os.path.realpath(__file__))
 simple_file_path = os.path.join(current_path, "data/test-simple.xml")
 full_file_path = os.path.join(current_path, "data/test-full.xml")
 
 
-@pytest.mark.parametrize("file_path", [
-    simple_file_path,
-    full_file_path
-])
-def test_book_element_parsed(file_path):
-    book = booksuggest.data.xml_parser._extract_book_element(file_path)
-    assert book is not None
+simple_book_fields = (41335427, "9780439785969",
+                      "The war against Voldemort is not going well",
+                      [1003876, 946088])
+full_book_fields = (908211, "9780441788385",
+                    "<b>NAME: Valentine Michael Smith<br />ANCESTRY: Human<br />ORIGIN: Mars</b><br /><br />Valentine Michael Smith is a human being raised on Mars, newly returned to Earth. Among his people for the first time, he struggles to understand the social mores and prejudices of human nature that are so alien to him, while teaching them his own fundamental beliefs in grokking, watersharing, and love.",
+                    [858297, 40711, 3171254, 2777504, 1174485, 3590796, 1500323, 924161, 873021, 1247570, 924711, 348798, 3634673, 816647, 1218966, 953721, 820134])
 
 
-@pytest.mark.parametrize("file_path, expected", [
-    (simple_file_path, [(41335427, 1003876), (41335427, 946088)]),
-    (full_file_path,
-     [(908211, 858297), (908211, 40711), (908211, 3171254), (908211, 2777504), (908211, 1174485), (908211, 3590796), (908211, 1500323), (908211, 924161), (908211, 873021), (908211, 1247570), (908211, 924711), (908211, 348798), (908211, 3634673), (908211, 816647), (908211, 1218966), (908211, 953721), (908211, 820134)])
-])
-def test_similar_books_parsed(file_path, expected):
-    book = booksuggest.data.xml_parser._extract_book_element(file_path)
-    similar_books = booksuggest.data.prepare_similar_books._extract_similar_books(
-        book)
-    assert similar_books == expected
+def read_book_fields(file_path):
+    with open(file_path, 'rb') as data_file:
+        return list(
+            booksuggest.data.xml_parser.iter_book_fields(data_file))
 
 
 @pytest.mark.parametrize("file_path, expected", [
-    (simple_file_path, (41335427, "9780439785969",
-                         "The war against Voldemort is not going well")),
-    (full_file_path, (908211, "9780441788385",
-                      "<b>NAME: Valentine Michael Smith<br />ANCESTRY: Human<br />ORIGIN: Mars</b><br /><br />Valentine Michael Smith is a human being raised on Mars, newly returned to Earth. Among his people for the first time, he struggles to understand the social mores and prejudices of human nature that are so alien to him, while teaching them his own fundamental beliefs in grokking, watersharing, and love."))
+    (simple_file_path, [simple_book_fields]),
+    (full_file_path, [full_book_fields])
 ])
-def test_book_info_parsed(file_path, expected):
-    book = booksuggest.data.xml_parser._extract_book_element(file_path)
-    book_info = booksuggest.data.clean_book._extract_book_info(book)
-    assert book_info == expected
+def test_book_fields_parsed(file_path, expected):
+    assert read_book_fields(file_path) == expected
 
 
 @pytest.mark.parametrize("description, expected", [
@@ -56,3 +48,84 @@ def test_book_description_html_tags_stripping(description, expected):
     clean_description = re.sub(
         multiple_whitespaces_regexp, ' ', clean_description)
     assert clean_description == expected
+
+
+def test_all_book_fields_extracted():
+    xmls_dir = os.path.join(current_path, "data")
+    book_fields = list(
+        booksuggest.data.xml_parser.extract_all_book_fields(xmls_dir, 2))
+    assert [fields[:2] for fields in book_fields] == [
+        (908211, "9780441788385"), (41335427, "9780439785969")]
+    assert book_fields[1][3] == [1003876, 946088]
+
+
+def test_book_xml_data_extracted():
+    xmls_dir = os.path.join(current_path, "data")
+    book_extra_info_rows, similar_books_rows = \
+        booksuggest.data.extract_book_xml.extract_book_xml_data(xmls_dir, 2)
+    assert [row[0] for row in book_extra_info_rows] == [908211, 41335427]
+    assert len(similar_books_rows) == 19
+    assert similar_books_rows[-2:] == [(41335427, 1003876),
+                                       (41335427, 946088)]
+
+
+def test_book_extra_info_read_back(tmpdir):
+    filepath = os.path.join(str(tmpdir), "book_extra_info.csv")
+    rows = [(1, None, None), (2, "", ""), (3, "9780439785969", "x")]
+    booksuggest.data.extract_book_xml.save_book_extra_info(rows, filepath)
+
+    read_rows = booksuggest.data.clean_book.read_book_extra_info(filepath)
+    assert read_rows == rows
+    processed = booksuggest.data.clean_book.process_book_extra_info(read_rows)
+    assert processed.description.tolist() == ['None', '', 'x']
+
+
+def test_book_fields_extracted_from_archive(tmpdir):
+    xmls_dir = os.path.join(current_path, "data")
+    archive_path = os.path.join(str(tmpdir), "books_xml.zip")
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for file_path in [simple_file_path, full_file_path]:
+            archive.write(file_path, os.path.join(
+                "books_xml", os.path.basename(file_path)))
+
+    extract = booksuggest.data.xml_parser.extract_all_book_fields
+    assert list(extract(archive_path, 2)) == list(extract(xmls_dir, 2))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 65536])
+def test_book_fields_extracted_from_concatenated_documents(chunk_size):
+    expected = [simple_book_fields, full_book_fields, simple_book_fields]
+    documents = b''
+    for file_path in [simple_file_path, full_file_path, simple_file_path]:
+        with open(file_path, 'rb') as data_file:
+            documents += data_file.read()
+
+    book_fields = booksuggest.data.xml_parser.iter_book_fields(
+        io.BytesIO(documents), chunk_size)
+    assert list(book_fields) == expected
+
+
+def test_book_fields_cache(tmpdir):
+    xmls_dir = str(tmpdir.mkdir("books_xml"))
+    for file_path in [simple_file_path, full_file_path]:
+        shutil.copy(file_path, xmls_dir)
+    cache_path = os.path.join(str(tmpdir), "cache.npz")
+    extract = booksuggest.data.xml_parser.extract_all_book_fields
+
+    expected = list(extract(xmls_dir, 2))
+    assert list(extract(xmls_dir, 2, cache_path)) == expected
+    assert os.path.isfile(cache_path)
+
+    # files with unchanged size and modification time are not parsed again
+    simple_copy_path = os.path.join(xmls_dir, "test-simple.xml")
+    stat = os.stat(simple_copy_path)
+    with open(simple_copy_path, 'r+b') as data_file:
+        data_file.write(b' ' * stat.st_size)
+    os.utime(simple_copy_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert list(extract(xmls_dir, 2, cache_path)) == expected
+
+    # changed and removed files are updated in the cache
+    shutil.copy(full_file_path, simple_copy_path)
+    os.remove(os.path.join(xmls_dir, "test-full.xml"))
+    book_fields = list(extract(xmls_dir, 2, cache_path))
+    assert book_fields == [expected[0]]